@@ -0,0 +1,286 @@
+# batch/study_batch.py
+# Headless checks of image/label pairs, without Qt.
+# Run from the repository root: python main.py batch STUDIES_DIR --report report.csv
+from utils.image_utils.lazy_volume import iter_slabs
+from utils.image_utils.orientation import GRID_TOLERANCE, display_axes, grid_difference, to_display
+from utils.segmentation_utils.convert_matrix_for_save import write_segmentation_nifti
+from utils.segmentation_utils.label_statistics import voxel_volume_mm3
+from utils.segmentation_utils.label_volume import label_dtype
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import nibabel as nib
+import numpy as np
+
+NIFTI_EXTENSIONS = ('.nii.gz', '.nii')
+LABEL_SUFFIXES = ('_seg', '_segmentation', '_label', '_labels', '_mask')  # Label of image X is X<suffix>.nii[.gz]
+MAX_LABEL = np.iinfo(np.uint16).max  # Largest label the viewer can hold
+REPORT_COLUMNS = [
+    'study', 'status', 'image', 'label', 'image_shape', 'label_shape', 'shape_match',
+    'affine_match', 'affine_max_diff', 'image_axcodes', 'label_axcodes', 'reorientable',
+    'label_dtype', 'compact_dtype', 'labels', 'label_voxels', 'label_volumes_mm3',
+    'image_min', 'image_max', 'output', 'seconds', 'error',
+]
+
+def nifti_stem(file_name):
+    """
+    :return: File name without its NIfTI extension, or None if it is not a NIfTI
+    """
+    for extension in NIFTI_EXTENSIONS:
+        if file_name.lower().endswith(extension):
+            return file_name[:-len(extension)]
+    return None
+
+def find_studies(root, label_suffixes=LABEL_SUFFIXES):
+    """
+    Pair every image under a directory with its label file in the same directory.
+    :param root: Directory searched recursively
+    :param label_suffixes: File name suffixes (before the extension) marking label files
+    :return: List of dicts with study (path relative to root), image and label paths, None if missing
+    """
+    studies = []
+    for directory, subdirectories, file_names in os.walk(root):
+        subdirectories.sort()
+        images = {}
+        labels = {}
+        for file_name in sorted(file_names):
+            stem = nifti_stem(file_name)
+            if stem is None:
+                continue
+            suffix = next((suffix for suffix in label_suffixes if stem.lower().endswith(suffix)), None)
+            if suffix is None:
+                images[stem] = os.path.join(directory, file_name)
+            else:
+                labels[stem[:-len(suffix)]] = os.path.join(directory, file_name)
+        for stem in sorted(images.keys() | labels.keys()):
+            studies.append({
+                'study': os.path.relpath(os.path.join(directory, stem), root),
+                'image': images.get(stem),
+                'label': labels.get(stem),
+            })
+    return studies
+
+def scan_labels(label_img, chunk_bytes):
+    """
+    Count every label value of a label file, one slab at a time.
+    :return: Voxel counts indexed by label value
+    """
+    counts = np.zeros(1, dtype=np.int64)
+    for _, slab in iter_slabs(label_img, chunk_bytes):
+        if slab.dtype.kind == 'f':
+            if np.any(np.mod(slab, 1) != 0):
+                raise ValueError("Segmentation contains non-integer label values")
+            slab = slab.astype(np.int64)
+        if slab.size and slab.min() < 0:
+            raise ValueError("Segmentation contains negative label values")
+        if slab.size and slab.max() > MAX_LABEL:
+            raise ValueError(f"Label value {int(slab.max())} does not fit a uint16 label volume")
+        slab_counts = np.bincount(slab.ravel())
+        if len(slab_counts) > len(counts):
+            counts = np.pad(counts, (0, len(slab_counts) - len(counts)))
+        counts[:len(slab_counts)] += slab_counts
+    return counts
+
+def scan_range(image_img, chunk_bytes):
+    """
+    Decode a whole image, one slab at a time, e.g. to find truncated files.
+    :return: (min, max) intensity after header scaling
+    """
+    min_value = max_value = None
+    for _, slab in iter_slabs(image_img, chunk_bytes):
+        slab_min, slab_max = float(np.nanmin(slab)), float(np.nanmax(slab))
+        min_value = slab_min if min_value is None else min(min_value, slab_min)
+        max_value = slab_max if max_value is None else max(max_value, slab_max)
+    return min_value, max_value
+
+def read_compact_labels(label_img, dtype, chunk_bytes):
+    """
+    Read a label file into an array of a smaller label dtype, without a full-size temporary.
+    :return: Numpy array in stored orientation
+    """
+    labels = np.empty(label_img.shape, dtype=dtype, order='F')
+    for start, slab in iter_slabs(label_img, chunk_bytes):
+        labels[..., start:start + slab.shape[-1]] = slab
+    return labels.reshape(label_img.shape[:3], order='F')  # Drops trailing singleton axes, as a view
+
+def output_path(study, label_path, output_dir):
+    """
+    :return: Path of the converted label file, mirroring the study's place under the output directory
+    """
+    directory = os.path.join(output_dir, os.path.dirname(study['study']))
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, nifti_stem(os.path.basename(label_path)) + '.nii.gz')
+
+def check_study(study, options):
+    """
+    Validate one image/label pair and summarize its labels; optionally write the
+    labels in the smallest label dtype, laid out like the image.
+    Runs in a worker process. Only headers are read in full; voxels are streamed.
+    :param study: Dict from find_studies
+    :param options: Dict of the command line options
+    :return: Report row dict, see REPORT_COLUMNS
+    """
+    start = time.perf_counter()
+    row = dict.fromkeys(REPORT_COLUMNS)
+    row.update(study)
+    if study['image'] is None or study['label'] is None:
+        row['status'] = 'missing_image' if study['image'] is None else 'missing_label'
+        return row
+
+    try:
+        image_img = nib.load(study['image'])  # Headers only
+        label_img = nib.load(study['label'])
+        if any(length != 1 for length in label_img.shape[3:]):
+            raise ValueError(f"Segmentation has {len(label_img.shape)} dimensions, labels are 3D")
+        image_shape, label_shape = image_img.shape[:3], label_img.shape[:3]
+        row['image_shape'] = 'x'.join(str(length) for length in image_shape)
+        row['label_shape'] = 'x'.join(str(length) for length in label_shape)
+        row['image_axcodes'] = ''.join(nib.aff2axcodes(image_img.affine))
+        row['label_axcodes'] = ''.join(nib.aff2axcodes(label_img.affine))
+        row['shape_match'] = image_shape == label_shape
+        row['affine_max_diff'] = float(np.abs(image_img.affine - label_img.affine).max())
+        row['affine_match'] = row['affine_max_diff'] <= options['affine_tolerance']
+
+        # Same voxels stored with another axis order or flips can be re-laid out like the image
+        difference = grid_difference(image_img.affine, image_shape, label_img.affine, label_shape)
+        row['reorientable'] = difference is not None and difference <= options['affine_tolerance']
+
+        counts = scan_labels(label_img, options['chunk_bytes'])
+        present = np.flatnonzero(counts[1:]) + 1
+        voxel_volume = voxel_volume_mm3(label_img.header)
+        row['label_dtype'] = str(label_img.get_data_dtype())
+        row['compact_dtype'] = np.dtype(label_dtype(len(counts) - 1)).name
+        row['labels'] = len(present)
+        row['label_voxels'] = {int(label): int(counts[label]) for label in present}
+        row['label_volumes_mm3'] = {int(label): float(counts[label] * voxel_volume) for label in present}
+
+        if options['read_images']:
+            row['image_min'], row['image_max'] = scan_range(image_img, options['chunk_bytes'])
+
+        aligned = row['shape_match'] and row['affine_match']
+        if options['output_dir'] and (aligned or row['reorientable']):
+            # In display orientation the stored layout no longer matters; saving applies the image's
+            labels = read_compact_labels(label_img, label_dtype(len(counts) - 1), options['chunk_bytes'])
+            labels = to_display(labels, display_axes(label_img.affine))
+            row['output'] = write_segmentation_nifti(
+                labels, image_img.affine, image_img.header,
+                output_path(study, study['label'], options['output_dir']),
+                compresslevel=options['compresslevel'], threads=1
+            )
+        row['status'] = 'ok' if aligned else 'reorientable' if row['reorientable'] else 'mismatch'
+    except Exception as error:
+        row['status'] = 'error'
+        row['error'] = f"{type(error).__name__}: {error}"
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+def check_study_task(task):
+    return check_study(*task)
+
+def csv_value(value):
+    if isinstance(value, dict):
+        return ';'.join(f"{key}:{count:g}" if isinstance(count, float) else f"{key}:{count}" for key, count in value.items())
+    return '' if value is None else value
+
+def run_batch(studies, options, workers, on_row=None):
+    """
+    Check studies in a process pool; rows arrive in study order while later ones still run.
+    :param on_row: Optional callable receiving each row, e.g. to write it right away
+    :return: List of report rows
+    """
+    tasks = [(study, options) for study in studies]
+    rows = []
+    if workers == 1:
+        results = map(check_study_task, tasks)  # No pool, e.g. for profiling
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(check_study_task, tasks, chunksize=max(1, min(16, len(tasks) // (workers * 8))))
+    try:
+        for row in results:
+            rows.append(row)
+            if on_row is not None:
+                on_row(row)
+    finally:
+        if workers != 1:
+            executor.shutdown(cancel_futures=True)
+    return rows
+
+def summarize(rows, seconds):
+    """
+    :return: Dict with the number of studies per status and the timings
+    """
+    statuses = {}
+    for row in rows:
+        statuses[row['status']] = statuses.get(row['status'], 0) + 1
+    return {
+        'studies': len(rows),
+        'statuses': statuses,
+        'seconds': seconds,
+        'studies_per_second': len(rows) / seconds if seconds else 0.0,
+    }
+
+def main(argv=None):
+    """
+    :param argv: Command line arguments after the subcommand, defaults to sys.argv[1:]
+    :return: Exit status, 0 if every study is ok
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py batch",
+        description="Check image/label pairs for shape and affine agreement, summarize label volumes "
+                    "and optionally write compact, image-aligned copies of the labels."
+    )
+    parser.add_argument("root", help="Directory of studies, searched recursively")
+    parser.add_argument("--report", help="CSV report, written row by row (default: print a summary only)")
+    parser.add_argument("--json", help="JSON report with every row and a summary")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--label-suffix", action='append', dest='label_suffixes',
+                        help=f"Suffix marking label files, repeatable (default {', '.join(LABEL_SUFFIXES)})")
+    parser.add_argument("--affine-tolerance", type=float, default=GRID_TOLERANCE, help="Largest affine difference still matching")
+    parser.add_argument("--read-images", action='store_true', help="Also decode every image and report its intensity range")
+    parser.add_argument("--output-dir", help="Write the labels in the smallest label dtype, laid out like their image")
+    parser.add_argument("--compresslevel", type=int, default=1, help="gzip level of written labels")
+    parser.add_argument("--chunk-mb", type=float, default=8, help="Size of one streamed slab in MB")
+    args = parser.parse_args(argv)
+
+    options = {
+        'affine_tolerance': args.affine_tolerance,
+        'read_images': args.read_images,
+        'output_dir': os.path.abspath(args.output_dir) if args.output_dir else None,
+        'compresslevel': args.compresslevel,
+        'chunk_bytes': int(args.chunk_mb * 1024 * 1024),
+    }
+    studies = find_studies(args.root, tuple(args.label_suffixes or LABEL_SUFFIXES))
+    print(f"{len(studies)} studies under {args.root}", file=sys.stderr)
+
+    start = time.perf_counter()
+    report_file = open(args.report, 'w', newline='') if args.report else None
+    try:
+        writer = None
+        if report_file is not None:
+            writer = csv.DictWriter(report_file, REPORT_COLUMNS)
+            writer.writeheader()
+
+        def on_row(row):
+            if writer is not None:
+                writer.writerow({key: csv_value(value) for key, value in row.items()})
+            if row['status'] != 'ok':
+                print(f"{row['study']}: {row['status']}{' - ' + row['error'] if row['error'] else ''}", file=sys.stderr)
+
+        rows = run_batch(studies, options, max(1, args.workers), on_row)
+    finally:
+        if report_file is not None:
+            report_file.close()
+
+    summary = summarize(rows, time.perf_counter() - start)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'summary': summary, 'studies': rows}, file, indent=2)
+    print(json.dumps(summary), file=sys.stderr)
+    return 0 if summary['statuses'].get('ok', 0) == len(rows) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# benchmarks/bench_brush_stroke.py
+# Micro-benchmark: vectorized capsule stamping vs the per-point Bresenham path.
+# Run from the repository root: python -m benchmarks.bench_brush_stroke
+from utils.segmentation_utils.brush_stroke import stamp_capsule
+from utils.segmentation_utils.drawing_segmentation import bresenham_line
+import argparse
+import timeit
+import numpy as np
+
+def per_point_stamp(slice_matrix, x0, y0, x1, y1, brush_size, value):
+    """
+    Previous stroke path: one masked write per Bresenham point.
+    """
+    line_points = bresenham_line(x0, y0, x1, y1)
+    brush_radius = brush_size // 2
+    Y, X = np.ogrid[-brush_radius:brush_radius+1, -brush_radius:brush_radius+1]
+    mask = X**2 + Y**2 <= brush_radius**2
+
+    for x_center, y_center in line_points:
+        x_min = max(x_center - brush_radius, 0)
+        x_max = min(x_center + brush_radius + 1, slice_matrix.shape[1])
+        y_min = max(y_center - brush_radius, 0)
+        y_max = min(y_center + brush_radius + 1, slice_matrix.shape[0])
+        sub_matrix = slice_matrix[y_min:y_max, x_min:x_max]
+        mask_x_start = max(0, -x_center + brush_radius)
+        mask_x_end = mask_x_start + (x_max - x_min)
+        mask_y_start = max(0, -y_center + brush_radius)
+        mask_y_end = mask_y_start + (y_max - y_min)
+        sub_matrix[mask[mask_y_start:mask_y_end, mask_x_start:mask_x_end]] = value
+
+def capsule_stamp(slice_matrix, x0, y0, x1, y1, brush_size, value):
+    stamp_capsule(slice_matrix, x0, y0, x1, y1, brush_size // 2, value)
+
+def time_stroke(stamp, slice_shape, stroke, brush_size, repeat):
+    """
+    :return: (best seconds per stroke, labelled mask)
+    """
+    slice_matrix = np.zeros(slice_shape, dtype=np.uint8)
+    stamp(slice_matrix, *stroke, brush_size, 1)
+    timer = timeit.Timer(lambda: stamp(slice_matrix, *stroke, brush_size, 1))
+    number = max(1, repeat)
+    best = min(timer.repeat(repeat=5, number=number)) / number
+    return best, slice_matrix != 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare brush stamping paths.")
+    parser.add_argument("--size", type=int, default=512, help="Slice edge length in voxels")
+    parser.add_argument("--repeat", type=int, default=50, help="Strokes per timing run")
+    args = parser.parse_args()
+
+    slice_shape = (args.size, args.size)
+    center = args.size // 2
+    strokes = {
+        "dot": (center, center, center, center),
+        "8px drag": (center, center, center + 8, center + 3),
+        "32px drag": (center, center, center + 32, center + 12),
+        "128px drag": (center - 64, center - 20, center + 64, center + 20),
+    }
+
+    print(f"{'stroke':>11} {'brush':>5} {'per-point ms':>13} {'capsule ms':>11} {'speedup':>8} {'IoU':>6}")
+    for name, stroke in strokes.items():
+        for brush_size in (1, 2, 4, 8, 16, 32):
+            old_time, old_mask = time_stroke(per_point_stamp, slice_shape, stroke, brush_size, args.repeat)
+            new_time, new_mask = time_stroke(capsule_stamp, slice_shape, stroke, brush_size, args.repeat)
+            iou = (old_mask & new_mask).sum() / (old_mask | new_mask).sum()
+            print(f"{name:>11} {brush_size:>5} {old_time * 1e3:>13.3f} {new_time * 1e3:>11.3f} {old_time / new_time:>7.1f}x {iou:>6.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_display_allocations.py
+# Count full-frame allocations per interaction in the canvas display pipeline.
+# Run from the repository root: python -m benchmarks.bench_display_allocations
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from utils.image_utils.lazy_volume import LazyVolume
+from PyQt5.QtCore import QEvent, QPoint, QPointF, Qt
+from PyQt5.QtGui import QImage, QMouseEvent, QPainter, QPixmap, QWheelEvent
+from PyQt5.QtWidgets import QApplication
+import argparse
+import tempfile
+import time
+import tracemalloc
+import canvas.canvas as canvas_module
+import nibabel as nib
+import numpy as np
+
+class AllocationCounter:
+    """
+    Count QImage / QPixmap / QPainter constructions made by the canvas module.
+    """
+
+    def __init__(self, frame_pixels):
+        self.frame_pixels = frame_pixels
+        self.reset()
+
+    def reset(self):
+        self.images = 0
+        self.full_frame_images = 0
+        self.pixmaps = 0
+        self.painters = 0
+
+    def install(self):
+        counter = self
+
+        class CountingQImage(QImage):
+            def __init__(self, *args):
+                super().__init__(*args)
+                counter.images += 1
+                if self.width() * self.height() >= counter.frame_pixels:
+                    counter.full_frame_images += 1
+
+        class CountingQPixmap(QPixmap):
+            def __init__(self, *args):
+                super().__init__(*args)
+                counter.pixmaps += 1
+
+        class CountingQPainter(QPainter):
+            def __init__(self, *args):
+                super().__init__(*args)
+                counter.painters += 1
+
+        canvas_module.QImage = CountingQImage
+        canvas_module.QPixmap = CountingQPixmap
+        canvas_module.QPainter = CountingQPainter
+
+def make_volume(shape, directory):
+    data = (np.random.default_rng(0).random(shape) * 2000).astype(np.int16)
+    path = os.path.join(directory, 'volume.nii')
+    nib.save(nib.Nifti1Image(data, np.eye(4)), path)
+    return LazyVolume(nib.load(path)).load()
+
+def run(app, canvas, counter, name, events):
+    counter.reset()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    for event in events:
+        app.sendEvent(canvas, event)
+        app.processEvents()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    count = len(events)
+    print(f"{name:>8}: {elapsed / count * 1e3:7.2f} ms/event, "
+          f"QImage {counter.images / count:5.2f} (full-frame {counter.full_frame_images / count:5.2f}), "
+          f"QPixmap {counter.pixmaps / count:5.2f}, QPainter {counter.painters / count:5.2f} per event, "
+          f"traced peak {peak / 1024:8.1f} KiB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Count display allocations per interaction.")
+    parser.add_argument("--size", type=int, default=512, help="Slice edge length in voxels")
+    parser.add_argument("--slices", type=int, default=64, help="Number of slices")
+    parser.add_argument("--widget", type=int, default=1000, help="Canvas edge length in pixels")
+    parser.add_argument("--events", type=int, default=200, help="Events per interaction")
+    args = parser.parse_args()
+
+    app = QApplication([])
+    counter = AllocationCounter(args.widget * args.widget)
+    counter.install()
+
+    with tempfile.TemporaryDirectory() as directory:
+        canvas = canvas_module.Canvas(prefetch_depth=0)  # Keep worker renders out of the counts
+        canvas.resize(args.widget, args.widget)
+        canvas.show()
+        canvas.set_volume(make_volume((args.size, args.size, args.slices), directory))
+        app.processEvents()
+
+        center = QPointF(args.widget / 2, args.widget / 2)
+        canvas.mousePressEvent(QMouseEvent(QEvent.MouseButtonPress, center, Qt.LeftButton, Qt.LeftButton, Qt.NoModifier))
+        moves = [
+            QMouseEvent(QEvent.MouseMove, QPointF(200 + i % 600, 300 + (i * 3) % 400), Qt.NoButton, Qt.LeftButton, Qt.NoModifier)
+            for i in range(args.events)
+        ]
+        run(app, canvas, counter, 'stroke', moves)
+
+        wheel = [
+            QWheelEvent(center, center, QPoint(0, 0), QPoint(0, 120 if (i // 16) % 2 else -120),
+                        Qt.NoButton, Qt.NoModifier, Qt.NoScrollPhase, False)
+            for i in range(args.events)
+        ]
+        canvas.render_cached_slice.cache_clear()
+        canvas.raw_cached_slice.cache_clear()
+        run(app, canvas, counter, 'scroll', wheel)
+
+if __name__ == "__main__":
+    main()
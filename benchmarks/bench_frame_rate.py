@@ -0,0 +1,89 @@
+# benchmarks/bench_frame_rate.py
+# Feed the canvas input faster than the display refreshes and report the frame timing.
+# Run from the repository root: python -m benchmarks.bench_frame_rate
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from canvas.canvas import Canvas
+from utils.image_utils.lazy_volume import LazyVolume
+from PyQt5.QtCore import QEvent, QPoint, QPointF, Qt
+from PyQt5.QtGui import QMouseEvent, QWheelEvent
+from PyQt5.QtWidgets import QApplication
+import argparse
+import tempfile
+import time
+import nibabel as nib
+import numpy as np
+
+def make_volume(shape, directory):
+    data = (np.random.default_rng(0).random(shape) * 2000).astype(np.int16)
+    path = os.path.join(directory, 'volume.nii')
+    nib.save(nib.Nifti1Image(data, np.eye(4)), path)
+    return LazyVolume(nib.load(path)).load()
+
+def feed(app, canvas, events, event_interval):
+    """
+    Send events at a fixed rate, running the event loop in between like a busy GUI would.
+    """
+    canvas.frames.reset_stats()
+    next_time = time.perf_counter()
+    for event in events:
+        app.sendEvent(canvas, event)
+        next_time += event_interval
+        while time.perf_counter() < next_time:
+            app.processEvents()
+    canvas.flush_frame()
+    app.processEvents()
+
+def report(name, canvas, num_events):
+    stats = canvas.frame_stats()
+    print(f"{name:>8}: {num_events} events -> {stats['frames']} frames, "
+          f"{stats['fps']:5.1f} fps, frame {stats['frame_ms_p50']:6.2f} ms p50 / {stats['frame_ms_p95']:6.2f} ms p95 "
+          f"/ {stats['frame_ms_max']:6.2f} ms max, {stats['over_budget']} over budget")
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame rate of the canvas under fast input.")
+    parser.add_argument("--size", type=int, default=512, help="Slice edge length in voxels")
+    parser.add_argument("--slices", type=int, default=200, help="Number of slices")
+    parser.add_argument("--widget", type=int, default=1000, help="Canvas edge length in pixels")
+    parser.add_argument("--events", type=int, default=400, help="Events per interaction")
+    parser.add_argument("--event-rate", type=float, default=500, help="Input events per second")
+    args = parser.parse_args()
+
+    app = QApplication([])
+    event_interval = 1 / args.event_rate
+
+    with tempfile.TemporaryDirectory() as directory:
+        canvas = Canvas()
+        canvas.resize(args.widget, args.widget)
+        canvas.show()
+        canvas.set_volume(make_volume((args.size, args.size, args.slices), directory))
+        app.processEvents()
+
+        center = QPointF(args.widget / 2, args.widget / 2)
+        canvas.mousePressEvent(QMouseEvent(QEvent.MouseButtonPress, center, Qt.LeftButton, Qt.LeftButton, Qt.NoModifier))
+        moves = [
+            QMouseEvent(QEvent.MouseMove, QPointF(200 + i % 600, 300 + (i * 3) % 400), Qt.NoButton, Qt.LeftButton, Qt.NoModifier)
+            for i in range(args.events)
+        ]
+        feed(app, canvas, moves, event_interval)
+        canvas.mouseReleaseEvent(QMouseEvent(QEvent.MouseButtonRelease, center, Qt.LeftButton, Qt.NoButton, Qt.NoModifier))
+        report('stroke', canvas, len(moves))
+
+        canvas.render_cached_slice.cache_clear()
+        canvas.raw_cached_slice.cache_clear()
+        canvas.current_slice_index = 0
+        canvas.update_slice()
+        misses = canvas.render_cached_slice.cache_info()['misses']
+        flick = [
+            QWheelEvent(center, center, QPoint(0, 0), QPoint(0, 120 if (i // (args.slices - 1)) % 2 == 0 else -120),
+                        Qt.NoButton, Qt.NoModifier, Qt.NoScrollPhase, False)
+            for i in range(args.events)
+        ]
+        feed(app, canvas, flick, event_interval)
+        report('flick', canvas, len(flick))
+        print(f"{'':>8}  {canvas.render_cached_slice.cache_info()['misses'] - misses} slices rendered "
+              f"(prefetch included) while passing {len(flick)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# benchmarks/bench_suite.py
+# Headless benchmark of the load, scroll, stroke and save paths on synthetic volumes.
+# Run from the repository root: python -m benchmarks.bench_suite
+# Results are printed and optionally written as JSON; pass a previous result as --baseline
+# to compare against it. Baselines are machine specific, record one on the machine you compare on.
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from canvas.canvas import Canvas
+from utils.image_utils.lazy_volume import LazyVolume
+from utils.segmentation_utils.convert_matrix_for_save import save_segmentation_nifti, write_segmentation_nifti
+from PyQt5.QtCore import QEvent, QPointF, Qt
+from PyQt5.QtGui import QMouseEvent
+from PyQt5.QtWidgets import QApplication
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import math
+import multiprocessing
+import platform
+import resource
+import sys
+import tempfile
+import time
+import nibabel as nib
+import numpy as np
+
+DEFAULT_SIZES = "256x256x256,512x512x300,1024x1024x100"
+DEFAULT_BRUSH_SIZES = "1,5,15,40"
+REGRESSION_TOLERANCE = 0.25  # Relative slowdown (or growth) reported as a regression
+NOISE_FLOOR_MS = 0.5  # Timings below this are too noisy to compare
+UNCOMPARED_METRICS = ('max_ms',)  # Single outliers, reported but not compared
+
+def parse_shape(text):
+    return tuple(int(value) for value in text.lower().split('x'))
+
+def shape_name(shape):
+    return 'x'.join(str(value) for value in shape)
+
+def peak_rss_mb():
+    """
+    :return: Peak resident set size of this process in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024  # Bytes on macOS, kB elsewhere
+
+def summarize(seconds):
+    """
+    :param seconds: List of durations in seconds
+    :return: Dict with count, mean, p50, p95 and max in ms
+    """
+    ms = np.array(seconds) * 1000
+    return {
+        'count': int(ms.size),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'max_ms': float(ms.max()),
+    }
+
+def make_volume_file(shape, directory, extension):
+    """
+    Write a synthetic int16 volume: a smooth ellipsoid phantom with noise, so it
+    compresses about like a scan rather than like pure noise.
+    The file is reused if it already exists.
+    :return: Path of the NIfTI
+    """
+    path = os.path.join(directory, f"volume_{shape_name(shape)}{extension}")
+    if os.path.exists(path):
+        return path
+
+    rng = np.random.default_rng(0)
+    data = np.empty(shape, dtype=np.int16)
+    x, y = np.ogrid[-1:1:shape[0] * 1j, -1:1:shape[1] * 1j]
+    for z in range(shape[2]):
+        depth = 2 * z / max(shape[2] - 1, 1) - 1
+        radius = x ** 2 + y ** 2 + depth ** 2
+        phantom = np.where(radius < 0.8, 1000 - 600 * radius, -1000)
+        data[..., z] = phantom + rng.normal(0, 40, shape[:2])
+    nib.save(nib.Nifti1Image(data, np.eye(4)), path)
+    return path
+
+def stroke_points(widget, num_events):
+    """
+    :return: Widget positions along a spiral around the centre, one per event
+    """
+    center = widget / 2
+    points = []
+    for i in range(num_events):
+        angle = i * 0.05
+        radius = widget * (0.1 + 0.3 * i / max(num_events - 1, 1))
+        points.append(QPointF(center + radius * math.cos(angle), center + radius * math.sin(angle)))
+    return points
+
+def time_scroll(canvas, indices):
+    """
+    :return: Seconds per slice to show each slice, including the repaint
+    """
+    durations = []
+    for index in indices:
+        start = time.perf_counter()
+        canvas.current_slice_index = index
+        canvas.update_slice()
+        canvas.repaint()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def time_render_paths(canvas, indices):
+    """
+    Cold renders of the separate cached slice paths.
+    :return: Dict of path name to list of seconds
+    """
+    durations = {'raw_cached_slice': [], 'render_cached_slice': [], 'render_cached_segmentation': []}
+    for index in indices:
+        for name in durations:
+            start = time.perf_counter()
+            getattr(canvas, name)(index)
+            durations[name].append(time.perf_counter() - start)
+    return durations
+
+def time_stroke(canvas, points):
+    """
+    Draw one stroke with mouse events.
+    :return: (seconds per move event including its frame, seconds for the release)
+    """
+    canvas.mousePressEvent(QMouseEvent(QEvent.MouseButtonPress, points[0], Qt.LeftButton, Qt.LeftButton, Qt.NoModifier))
+    canvas.flush_frame()
+    durations = []
+    for point in points[1:]:
+        event = QMouseEvent(QEvent.MouseMove, point, Qt.NoButton, Qt.LeftButton, Qt.NoModifier)
+        start = time.perf_counter()
+        canvas.mouseMoveEvent(event)
+        canvas.flush_frame()
+        canvas.repaint()
+        durations.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    canvas.mouseReleaseEvent(QMouseEvent(QEvent.MouseButtonRelease, points[-1], Qt.LeftButton, Qt.NoButton, Qt.NoModifier))
+    return durations, time.perf_counter() - start
+
+def run_case(path, options):
+    """
+    Benchmark one volume. Runs in a fresh process, so the peak RSS belongs to this volume.
+    :param options: Dict of the command line options
+    :return: Dict of results
+    """
+    result = {'rss_before_load_mb': peak_rss_mb()}
+
+    start = time.perf_counter()
+    volume = LazyVolume(nib.load(path))  # Same path as NiftiLoadWorker
+    first_slice_index = volume.shape[2] // 2
+    first_slice_s = None
+    for _ in volume.iter_load():
+        if first_slice_s is None and volume.is_slice_loaded(first_slice_index):
+            first_slice_s = time.perf_counter() - start
+    result['load'] = {
+        'first_slice_s': first_slice_s,
+        'total_s': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    app = QApplication.instance() or QApplication([])
+    canvas = Canvas(prefetch_depth=0)  # No background renders racing the timings
+    canvas.resize(options['widget'], options['widget'])
+    canvas.show()
+    canvas.set_volume(volume)
+    app.processEvents()
+    result['tiled'] = canvas.tiled
+
+    num_slices = volume.shape[2]
+    indices = np.linspace(0, num_slices - 1, min(options['scroll_slices'], num_slices)).astype(int).tolist()
+    canvas.clear_image_caches(raw=True)
+    canvas.clear_segmentation_caches()
+    result['scroll_cold'] = summarize(time_scroll(canvas, indices))
+    result['scroll_warm'] = summarize(time_scroll(canvas, indices))
+    if not canvas.tiled:
+        canvas.clear_image_caches(raw=True)
+        canvas.clear_segmentation_caches()
+        result['render'] = {name: summarize(durations) for name, durations in time_render_paths(canvas, indices).items()}
+
+    canvas.current_slice_index = first_slice_index
+    canvas.update_slice()
+    points = stroke_points(options['widget'], options['stroke_events'])
+    result['stroke'] = {}
+    for brush_size in options['brush_sizes']:
+        canvas.set_brush_size(brush_size)
+        move_durations, release_s = time_stroke(canvas, points)
+        result['stroke'][f'brush_{brush_size}'] = dict(summarize(move_durations), release_ms=release_s * 1000)
+
+    labels = canvas.segmentation_matrix
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        write_segmentation_nifti(labels.copy(), canvas.nifti_affine, canvas.nifti_header,
+                                 os.path.join(directory, 'labels_parallel.nii.gz'))  # Snapshot included, as in the app
+        parallel_s = time.perf_counter() - start
+        start = time.perf_counter()
+        save_segmentation_nifti(labels, canvas.nifti_affine, canvas.nifti_header, os.path.join(directory, 'labels.nii.gz'))
+        result['save'] = {'write_segmentation_nifti_s': parallel_s, 'save_segmentation_nifti_s': time.perf_counter() - start}
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    canvas.close()
+    return result
+
+def flatten(results, prefix=''):
+    """
+    :return: Dict of dotted metric name to value, for the compared timing and memory metrics
+    """
+    metrics = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key.endswith(('_ms', '_s', '_mb')) \
+                and key not in UNCOMPARED_METRICS:
+            metrics[name] = value
+    return metrics
+
+def compare(results, baseline, tolerance):
+    """
+    Compare metrics present in both runs; every metric is lower-is-better.
+    :return: Dict with the regressions, improvements and the metrics only in one of the runs
+    """
+    current = flatten(results)
+    previous = flatten(baseline['results'])
+    regressions = {}
+    improvements = {}
+    for name in sorted(current.keys() & previous.keys()):
+        old, new = previous[name], current[name]
+        if old is None or new is None:
+            continue
+        in_ms = old * 1000 if name.endswith('_s') else old
+        if not name.endswith('_mb') and in_ms < NOISE_FLOOR_MS:
+            continue
+        ratio = new / old if old else math.inf
+        entry = {'baseline': old, 'current': new, 'ratio': ratio}
+        if ratio > 1 + tolerance:
+            regressions[name] = entry
+        elif ratio < 1 / (1 + tolerance):
+            improvements[name] = entry
+    return {
+        'tolerance': tolerance,
+        'regressions': regressions,
+        'improvements': improvements,
+        'missing_in_baseline': sorted(current.keys() - previous.keys()),
+        'missing_in_current': sorted(previous.keys() - current.keys()),
+    }
+
+def report(name, result):
+    load = result['load']
+    print(f"{name}: load {load['total_s']:.2f} s (first slice {load['first_slice_s']:.2f} s), "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB{', tiled' if result['tiled'] else ''}")
+    for key in ('scroll_cold', 'scroll_warm'):
+        stats = result[key]
+        print(f"  {key:<12} {stats['p50_ms']:8.2f} ms p50 {stats['p95_ms']:8.2f} ms p95")
+    for key, stats in result.get('render', {}).items():
+        print(f"  {key:<27} {stats['p50_ms']:8.2f} ms p50")
+    for key, stats in result['stroke'].items():
+        print(f"  stroke {key:<9} {stats['p50_ms']:8.2f} ms p50 {stats['p95_ms']:8.2f} ms p95, "
+              f"release {stats['release_ms']:.1f} ms")
+    save = result['save']
+    print(f"  save {save['write_segmentation_nifti_s']:.2f} s parallel, {save['save_segmentation_nifti_s']:.2f} s nib.save")
+
+def report_comparison(comparison):
+    for title, entries in (('Regressions', comparison['regressions']), ('Improvements', comparison['improvements'])):
+        if entries:
+            print(f"{title} (tolerance {comparison['tolerance']:.0%}):")
+            for name, entry in entries.items():
+                print(f"  {name}: {entry['baseline']:.3f} -> {entry['current']:.3f} ({entry['ratio']:.2f}x)")
+    if not comparison['regressions']:
+        print("No regressions against the baseline")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the load, scroll, stroke and save paths.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated volume shapes, e.g. 256x256x256")
+    parser.add_argument("--format", choices=['.nii', '.nii.gz'], default='.nii.gz', help="Format of the synthetic volumes")
+    parser.add_argument("--data-dir", help="Directory to keep the synthetic volumes in and reuse them from")
+    parser.add_argument("--widget", type=int, default=800, help="Canvas edge length in pixels")
+    parser.add_argument("--scroll-slices", type=int, default=50, help="Slices shown per scroll pass")
+    parser.add_argument("--stroke-events", type=int, default=200, help="Mouse move events per stroke")
+    parser.add_argument("--brush-sizes", default=DEFAULT_BRUSH_SIZES, help="Comma-separated brush sizes")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="Relative change reported as a regression")
+    args = parser.parse_args()
+
+    options = {
+        'widget': args.widget,
+        'scroll_slices': args.scroll_slices,
+        'stroke_events': args.stroke_events,
+        'brush_sizes': [int(size) for size in args.brush_sizes.split(',')],
+    }
+    shapes = [parse_shape(text) for text in args.sizes.split(',')]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = args.data_dir or temporary
+        os.makedirs(directory, exist_ok=True)
+        for shape in shapes:
+            path = make_volume_file(shape, directory, args.format)
+            # A fresh process per volume, so each peak RSS is its own
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                result = executor.submit(run_case, path, options).result()
+            results[shape_name(shape)] = result
+            report(shape_name(shape), result)
+
+    output = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count(),
+            'format': args.format,
+            'options': options,
+        },
+        'results': results,
+    }
+    if args.baseline:
+        with open(args.baseline) as file:
+            output['comparison'] = compare(results, json.load(file), args.tolerance)
+        report_comparison(output['comparison'])
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+    if output.get('comparison', {}).get('regressions'):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
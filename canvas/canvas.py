@@ -1,143 +1,979 @@
 # canvas.py
-from functools import lru_cache
+from canvas.frame_scheduler import FrameScheduler
+from canvas.viewport import Viewport
 from utils.cache_utils.cache_decorators import slice_cache
-from utils.image_utils.normalize import return_min_max_value, min_max_normalize 
-from utils.segmentation_utils.drawing_segmentation import update_segmentation_matrix, render_segmentation_from_matrix
-from PyQt5.QtCore import Qt, QPoint, pyqtSignal
-from PyQt5.QtGui import QColor, QDragEnterEvent, QDropEvent, QImage, QPainter, QPixmap
+from utils.image_utils.normalize import return_min_max_value, min_max_normalize
+from utils.image_utils.pyramid import (
+    downsample_slice, label_tile, max_level, tile_bounds, tile_of, tiles_covering
+)
+from utils.image_utils.orientation import display_spacing
+from utils.image_utils.plane_volume import plane_permutation, to_display_box, to_view_box
+from utils.profiling_utils.profiler import profiler
+from utils.image_utils.window_level import (
+    WINDOW_PRESETS, apply_window, auto_window, width_level_to_window, window_lut, window_to_width_level
+)
+from utils.segmentation_utils.interpolation import annotated_slices, interpolation_gaps
+from utils.segmentation_utils.label_statistics import LabelStatistics, voxel_volume_mm3
+from utils.segmentation_utils.label_volume import create_label_volume
+from utils.segmentation_utils.session_volume import SessionVolume
+from utils.segmentation_utils.undo_history import LabelPatch, StrokeRecorder, UndoHistory, fill_patch
+from utils.segmentation_utils.drawing_segmentation import (
+    update_segmentation_matrix, render_segmentation_from_matrix, render_segmentation_region
+)
+from workers.frame_controller import FrameController
+from workers.label_interpolator import LabelInterpolateWorker
+from workers.nifti_loader import NiftiLoadWorker
+from workers.region_grower import RegionGrowWorker
+from workers.segmentation_loader import SegmentationLoadWorker
+from workers.session_flusher import SessionFlushTask
+from workers.slice_prefetcher import SlicePrefetcher
+from workers.worker_thread import start_worker
+from PyQt5.QtCore import Qt, QPoint, QRect, QRectF, QThreadPool, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QDragEnterEvent, QDropEvent, QImage, QPainter
 from PyQt5.QtWidgets import QLabel, QSizePolicy
 import numpy as np
-import nibabel as nib
+
+SLICE_CACHE_BYTES = 256 * 1024 * 1024  # Budget for rendered background slices
+RAW_SLICE_CACHE_BYTES = 256 * 1024 * 1024  # Budget for raw slices, so a new window is only a LUT gather
+SEGMENTATION_CACHE_BYTES = 256 * 1024 * 1024  # Budget for rendered segmentation overlays
+TILED_SLICE_PIXELS = 1024 * 1024  # Larger slices are rendered as pyramid tiles, only where visible
+PYRAMID_CACHE_BYTES = 256 * 1024 * 1024  # Budget for downsampled raw slices
+TILE_CACHE_BYTES = 128 * 1024 * 1024  # Budget for rendered background tiles
+LABEL_TILE_CACHE_BYTES = 128 * 1024 * 1024  # Budget for rendered segmentation tiles
+ZOOM_STEP = 1.25  # Zoom factor per wheel notch
+PAN_CLICK_DISTANCE = 3  # Middle drags shorter than this many pixels are clicks
+PROFILE_OVERLAY_RECT = QRect(4, 4, 300, 40)  # Widget area of the profiling overlay
+PROFILE_OVERLAY_CACHES = [('slice', 'slice'), ('raw', 'raw_slice'), ('seg', 'segmentation'), ('tile', 'tile')]
+UNDO_HISTORY_BYTES = 64 * 1024 * 1024  # Budget for compressed undo/redo patches
+SESSION_FLUSH_INTERVAL_MS = 5000  # How often dirty slices of a session working file are synced
 
 class Canvas(QLabel):
     slice_changed = pyqtSignal(int)
+    volume_ready = pyqtSignal()  # Volume shape known and a first slice is shown
+    volume_loaded = pyqtSignal()  # Every voxel decoded, final contrast applied
+    loading_progress = pyqtSignal(int)
+    loading_failed = pyqtSignal(str)
+    history_changed = pyqtSignal(bool, bool)  # can_undo, can_redo
+    session_status = pyqtSignal(str)  # Working file opened, recovered or failed
+    statistics_changed = pyqtSignal()  # Label counts in self.statistics changed
+    status_message = pyqtSignal(str)
+    interpolation_progress = pyqtSignal(int)
+    interpolation_finished = pyqtSignal()
+    window_changed = pyqtSignal(float, float)  # Intensities shown as black and white
+    labels_changed = pyqtSignal(object)  # Display box (y_min, y_max, x_min, x_max, z_min, z_max) of changed labels, None for all
+    data_replaced = pyqtSignal()  # The volume or the label matrix object was replaced
+    labels_replaced = pyqtSignal(bool)  # Only the label matrix object was replaced; True if the labels changed too
+    point_selected = pyqtSignal(object)  # (row, col, slice) display voxel picked with the middle button
+    frame_changed = pyqtSignal(int)  # Another frame of a 4D series is shown
 
-    def __init__(self):
+    def __init__(self, prefetch_depth=4, undo_max_bytes=UNDO_HISTORY_BYTES):
         super().__init__()
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.setMinimumSize(540, 540)
         self.background_image = None
         self.segmentation_image = None
+        self.scaled_background = None
+        self.combined_image = None
         self.brush_color = QColor(255, 0, 0, 255)
         self.brush_size = 8
         self.brush_color_value = 1
+        self.tool = 'brush'  # 'brush', 'fill_2d' or 'fill_3d'
+        self.fill_tolerance = 0.1  # Fraction of the intensity range a fill may differ from the seed
+        self.filler = None  # Running RegionGrowWorker
+        self.fill_value = 0
+        self.interpolator = None  # Running LabelInterpolateWorker
+        self.window = None  # (low, high) intensity window, None while the volume is loading
+        self.window_lut = None  # Raw value -> uint8 table for the window, see window_lut
+        self.window_drag = None  # (start QPoint, start width, start level) during a right drag
+        self.viewport = Viewport()
+        self.pan_start = None  # Last QPoint of a middle drag
+        self.pan_moved = False
+        self.frames = FrameScheduler(self.render_frame, parent=self)
+        self.pending_slice = False  # Current slice changed since the last frame
+        self.pending_full = False  # Whole widget needs re-compositing at the next frame
+        self.pending_rect = None  # QRect union of the parts that changed since the last frame
+        self.profile_overlay = False  # Draw frame times and cache hit rates over the image
         self.last_point = QPoint()
         self.drawing = False
         self.setAcceptDrops(True)
         self.nifti_data = None
-        self.nifti_display = None
         self.nifti_affine = None
         self.nifti_header = None
         self.current_slice_index = 0
+        self.view_axis = 2  # Display axis this canvas scrolls through
+        self.view_permutation = plane_permutation(self.view_axis)
+        self.crosshair = None  # (row, col) where the other views' slices cross this one
         self.segmentation_matrix = None
+        self.loader = None
+        self.segmentation_loader = None  # Running SegmentationLoadWorker
+        self.prefetcher = SlicePrefetcher(self, depth=prefetch_depth)
+        self.history = UndoHistory(undo_max_bytes)
+        self.stroke = None  # StrokeRecorder of the stroke being drawn
+        self.statistics = LabelStatistics()
+        self.nifti_path = None
+        self.session_mode = False
+        self.session = None  # SessionVolume backing segmentation_matrix in session mode
+        self.flush_pool = QThreadPool()
+        self.flush_pool.setMaxThreadCount(1)  # One flush at a time
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setInterval(SESSION_FLUSH_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self.flush_session)
+        self.frame_controller = FrameController(self)  # Frames of a 4D series
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
+        self.viewport.set_widget_size(self.width(), self.height())
         if self.nifti_data is not None:
-            self.update_slice()
+            self.update_display()  # Cached layers are resolution independent, only re-composite
+
+    def normalize_slice(self, raw_slice, value_range=None):
+        """
+        Map a raw slice to uint8 through the intensity window.
+        While the volume is still streaming in, the slice's own range is used.
+        :param value_range: Optional (min, max) to use instead of the slice's own range while loading
+        """
+        with profiler.span('normalize'):
+            if self.window is not None:
+                low, high = self.window
+                return apply_window(self.nifti_data, raw_slice, self.window_lut, low, high)
 
-    def normalize_nifti(self, nifti_data):
-        min_value, max_value = return_min_max_value(nifti_data)
-        return min_max_normalize(nifti_data, min_value, max_value)
+            slice_data = self.nifti_data.scale(raw_slice)
+            min_value, max_value = return_min_max_value(slice_data) if value_range is None else value_range
+            return min_max_normalize(slice_data, min_value, max_value)
+
+    @property
+    def tiled(self):
+        """
+        True if slices are too large to render whole and are rendered as the visible pyramid tiles.
+        """
+        return self.nifti_data is not None and self.nifti_data.shape[0] * self.nifti_data.shape[1] > TILED_SLICE_PIXELS
+
+    def clear_image_caches(self, raw=False):
+        """
+        Drop the rendered background slices and tiles.
+        :param raw: Also drop the raw slices and their pyramids, e.g. for a new volume
+        """
+        self.render_cached_slice.cache_clear()
+        self.render_cached_tile.cache_clear()
+        if raw:
+            self.raw_cached_slice.cache_clear()
+            self.pyramid_level.cache_clear()
+
+    def clear_segmentation_caches(self):
+        self.render_cached_segmentation.cache_clear()
+        self.render_cached_label_tile.cache_clear()
+
+    def set_window(self, low, high):
+        """
+        Show intensities from low (black) to high (white).
+        Only the table is rebuilt; slices are re-windowed from the raw slice cache when shown.
+        """
+        if self.nifti_data is None or not self.nifti_data.is_loaded:
+            return
+        self.window = (float(low), float(high))
+        self.window_lut = window_lut(self.nifti_data, low, high)
+        self.clear_image_caches()  # Renders racing with this are dropped by the cache
+        self.prefetcher.forget()
+        self.request_slice_update()  # A window drag re-renders once per frame
+        self.window_changed.emit(*self.window)
+
+    def set_window_preset(self, name):
+        """
+        :param name: 'Auto', 'Full Range' or a key of WINDOW_PRESETS
+        """
+        if self.nifti_data is None or not self.nifti_data.is_loaded:
+            return
+        if name == 'Auto':
+            self.set_window(*auto_window(self.nifti_data))
+        elif name == 'Full Range':
+            self.set_window(self.nifti_data.min_value, self.nifti_data.max_value)
+        else:
+            self.set_window(*width_level_to_window(*WINDOW_PRESETS[name]))
 
     def set_background_image_from_nifti(self, file_path):
         """
         Load a NIfTI and set the background.
-        Creates a segmentation matrix of the same size as the background shape.
-        """
-        nifti_img = nib.load(file_path)
-        self.nifti_data = np.rot90(nib.as_closest_canonical(nifti_img).get_fdata(), k=1)[:, ::-1, ::-1]
-        self.nifti_display = self.normalize_nifti(self.nifti_data)
-        self.nifti_affine = nifti_img.affine
-        self.nifti_header = nifti_img.header
-        self.segmentation_matrix = np.zeros_like(self.nifti_data, dtype=np.int32)  # Init segmentation matrix
+        The file is opened and streamed in a worker thread, see NiftiLoadWorker;
+        a load that is still running is cancelled.
+        """
+        if self.loader is not None:
+            self.loader.cancel()
+
+        self.loader = NiftiLoadWorker(file_path)
+        self.loader.first_slice_ready.connect(self.on_first_slice_ready)
+        self.loader.progress.connect(self.on_loading_progress)
+        self.loader.loaded.connect(self.on_volume_loaded)
+        self.loader.failed.connect(self.on_loading_failed)
+        start_worker(self.loader)
+
+    def on_first_slice_ready(self, volume):
+        """
+        Show the middle slice of a volume that is still streaming in.
+        """
+        if self.sender() is not self.loader:
+            return  # Superseded by a newer file
+
+        self.set_volume(volume, self.loader.file_path)
+        self.volume_ready.emit()
+
+    def set_volume(self, volume, file_path=None):
+        """
+        Show a LazyVolume, starting at its middle slice.
+        Creates a segmentation matrix of the same size as the background shape, or
+        reopens the session working file left for this image.
+        :param file_path: Path of the image, needed for session working files
+        """
+        self.close_session()
+        self.cancel_fill()
+        self.cancel_interpolation()
+        self.cancel_segmentation_load()
+        self.frame_controller.reset(volume)
+        self.nifti_data = volume
+        self.nifti_affine = volume.affine
+        self.nifti_header = volume.header
+        self.nifti_path = file_path
+        self.window = auto_window(volume) if volume.is_loaded else None  # Set in on_volume_loaded otherwise
+        self.window_lut = window_lut(volume, *self.window) if volume.is_loaded else None
+        self.segmentation_matrix = self.create_segmentation_volume()
         self.current_slice_index = self.nifti_data.shape[2] // 2
+        self.viewport.set_image_size(self.nifti_data.shape[1], self.nifti_data.shape[0])
+        self.viewport.reset()
+        self.reset_history()
+        self.reset_statistics(recount=self.session is not None)  # A recovered working file holds labels
 
-        self.render_cached_slice.cache_clear()
-        self.render_cached_segmentation.cache_clear()
+        self.prefetcher.cancel_all()
+        self.clear_image_caches(raw=True)
+        self.clear_segmentation_caches()
+        self.update_slice()
+        self.data_replaced.emit()
+
+    def set_segmentation_matrix(self, segmentation_matrix):
+        """
+        Replace the label volume, e.g. with a loaded segmentation, and redraw it.
+        In session mode the labels are copied into the working file.
+        """
+        if self.session is not None:
+            segmentation_matrix = self.move_to_session(segmentation_matrix)
+        self.segmentation_matrix = segmentation_matrix
+        self.reset_history()  # Patches describe the replaced volume
+        self.reset_statistics(recount=True)
+        self.prefetcher.cancel_all()
+        self.clear_segmentation_caches()  # Rendered background slices stay valid
         self.update_slice()
+        self.labels_replaced.emit(True)
 
-    @lru_cache(maxsize=100)
-    def render_cached_slice(self, slice_index, size):
+    def load_segmentation_from_nifti(self, file_path):
         """
-        Render the cached slice image.
+        Load a segmentation NIfTI, reoriented like the image, in a SegmentationLoadWorker.
+        A load that is still running is cancelled.
+        """
+        if self.segmentation_matrix is None:
+            return
+        self.cancel_segmentation_load()
+        self.segmentation_loader = SegmentationLoadWorker(file_path, self.nifti_affine, self.nifti_header.get_data_shape()[:3])
+        self.segmentation_loader.loaded.connect(self.on_segmentation_read)
+        self.segmentation_loader.failed.connect(self.on_segmentation_failed)
+        start_worker(self.segmentation_loader)
+        self.status_message.emit(f"Loading segmentation {file_path}")
+
+    def cancel_segmentation_load(self):
+        if self.segmentation_loader is not None:
+            self.segmentation_loader.cancel()
+            self.segmentation_loader = None
+
+    def on_segmentation_read(self, labels):
+        if self.sender() is not self.segmentation_loader:
+            return  # Cancelled or superseded
+        file_path = self.segmentation_loader.file_path
+        self.segmentation_loader = None
+        self.finish_stroke()
+        self.set_segmentation_matrix(labels)
+        self.status_message.emit(f"Segmentation loaded from {file_path}")
+
+    def on_segmentation_failed(self, message):
+        if self.sender() is self.segmentation_loader:
+            self.segmentation_loader = None
+            self.status_message.emit(message)
+
+    def create_segmentation_volume(self):
+        """
+        :return: Empty label volume, or the recovered / new working file in session mode
+        """
+        shape = self.nifti_data.shape
+        if self.nifti_path is not None:
+            self.session = SessionVolume.recover(self.nifti_path, shape)
+            if self.session is not None:
+                self.session_mode = True
+                self.flush_timer.start()
+                self.session_status.emit(f"Recovered session {self.session.data_path}")
+                return self.session.volume
+
+        if self.session_mode and self.nifti_path is not None:
+            try:
+                self.session = SessionVolume.create(self.nifti_path, shape)
+            except OSError as error:
+                self.session_status.emit(f"Could not create session file: {error}")
+            else:
+                self.flush_timer.start()
+                self.session_status.emit(f"Session file {self.session.data_path}")
+                return self.session.volume
+
+        return create_label_volume(shape)  # Init uint8 segmentation matrix
+
+    def move_to_session(self, segmentation_matrix):
+        """
+        Copy labels into the working file, recreating it if their dtype is wider.
+        :return: The working file's label volume
+        """
+        if segmentation_matrix.dtype.itemsize > self.session.volume.dtype.itemsize:
+            self.close_session()
+            self.session = SessionVolume.create(self.nifti_path, segmentation_matrix.shape, np.iinfo(segmentation_matrix.dtype).max)
+            self.flush_timer.start()
+
+        volume = self.session.volume
+        if volume is not segmentation_matrix:
+            for slice_index in range(volume.shape[2]):
+                volume[:, :, slice_index] = segmentation_matrix[:, :, slice_index]
+        self.session.mark_all_dirty()
+        return volume
+
+    def set_session_mode(self, enabled):
+        """
+        Back the labels by a memory-mapped working file next to the image, or go back
+        to an in-memory volume and delete the working file.
+        """
+        self.session_mode = enabled
+        if self.segmentation_matrix is None or self.nifti_path is None:
+            return  # Applied when the next volume is set
+
+        if enabled and self.session is None:
+            try:
+                self.session = SessionVolume.create(self.nifti_path, self.segmentation_matrix.shape,
+                                                    np.iinfo(self.segmentation_matrix.dtype).max)
+            except OSError as error:
+                self.session_mode = False
+                self.session_status.emit(f"Could not create session file: {error}")
+                return
+            self.flush_timer.start()
+            self.prefetcher.cancel_all()  # Workers may still read the old array
+            self.segmentation_matrix = self.move_to_session(self.segmentation_matrix)
+            self.stroke = None
+            self.labels_replaced.emit(False)
+            self.session_status.emit(f"Session file {self.session.data_path}")
+        elif not enabled and self.session is not None:
+            in_memory = create_label_volume(self.segmentation_matrix.shape, np.iinfo(self.segmentation_matrix.dtype).max)
+            for slice_index in range(in_memory.shape[2]):
+                in_memory[:, :, slice_index] = self.segmentation_matrix[:, :, slice_index]
+            self.prefetcher.cancel_all()
+            self.segmentation_matrix = in_memory
+            self.stroke = None
+            self.flush_timer.stop()
+            self.flush_pool.waitForDone()
+            self.labels_replaced.emit(False)
+            self.session.discard()
+            self.session = None
+            self.session_status.emit("Session file removed")
+
+    def reset_statistics(self, recount):
+        """
+        Start the label statistics for a new label volume.
+        :param recount: Count the labels of the volume, otherwise it is known to be empty
+        """
+        rows, cols, num_slices = self.segmentation_matrix.shape
+        voxel_volume = voxel_volume_mm3(self.nifti_header)
+        if recount:
+            self.statistics.recompute(self.segmentation_matrix, voxel_volume)
+        else:
+            self.statistics.reset(num_slices, rows * cols, voxel_volume)
+        self.statistics_changed.emit()
+
+    def record_brush_write(self, old_values, value):
+        self.statistics.record_write(self.current_slice_index, old_values, value)
+
+    def mark_segmentation_dirty(self, slice_indices):
+        """
+        Note slices whose labels changed, so the session working file syncs them.
+        """
+        if self.session is not None:
+            self.session.mark_dirty(slice_indices)
+
+    def flush_session(self):
+        """
+        Sync the dirty slices of the working file in the background.
+        """
+        if self.session is not None and self.session.has_dirty() and self.flush_pool.activeThreadCount() == 0:
+            self.flush_pool.start(SessionFlushTask(self.session))
+
+    def close_session(self):
+        """
+        Flush and close the working file, it is kept for the next launch.
+        """
+        if self.session is None:
+            return
+        self.flush_timer.stop()
+        self.flush_pool.waitForDone()
+        self.prefetcher.cancel_all()  # Nothing may read the mapping once it is closed
+        self.session.close()
+        self.session = None
+        self.segmentation_matrix = None
+        self.data_replaced.emit()
+
+    def on_loading_progress(self, percent):
+        if self.sender() is self.loader:
+            self.loading_progress.emit(percent)
+
+    def on_volume_loaded(self, volume):
+        if self.sender() is not self.loader:
+            return
+
+        self.loader = None
+        self.prefetcher.cancel_all()
+        self.clear_image_caches(raw=True)  # Drop slices read before their voxels were decoded
+        self.set_window(*auto_window(volume))  # Replaces slices rendered with provisional contrast
+        self.volume_loaded.emit()
+
+    def on_loading_failed(self, message):
+        if self.sender() is not self.loader:
+            return
+
+        self.loader = None
+        self.loading_failed.emit(message)
+
+    @slice_cache(max_bytes=RAW_SLICE_CACHE_BYTES)
+    def raw_cached_slice(self, slice_index):
+        """
+        Read the cached raw slice, in the stored dtype and without header scaling.
+        """
+        return self.nifti_data.get_raw_slice(slice_index)
+
+    @slice_cache(max_bytes=SLICE_CACHE_BYTES)
+    def render_cached_slice(self, slice_index):
+        """
+        Render the cached slice image at native resolution.
+        Scaling to the widget happens when compositing, so resizing never re-renders.
         :return: QImage of the rendered slice
         """
-        slice_data = self.nifti_display[:, :, slice_index]
+        slice_data = self.normalize_slice(self.raw_cached_slice(slice_index))  # C-contiguous uint8
         height, width = slice_data.shape
         bytes_per_line = width
-        qimage = QImage(slice_data.tobytes(), width, height, bytes_per_line, QImage.Format_Grayscale8)
+        qimage = QImage(slice_data.data, width, height, bytes_per_line, QImage.Format_Grayscale8)  # Wraps, no copy
+        qimage.ndarray = slice_data  # The buffer lives as long as the image
 
-        return qimage.scaled(size[0], size[1], Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        return qimage
 
-    @slice_cache(maxsize=100)
-    def render_cached_segmentation(self, slice_index, size):
+    @slice_cache(max_bytes=SEGMENTATION_CACHE_BYTES)
+    def render_cached_segmentation(self, slice_index):
         """
-        Render the cached segmentation image.
+        Render the cached segmentation image at native resolution.
         :return: QImage of the rendered segmentation
         """
-        segmentation_image = QImage(size[0], size[1], QImage.Format_ARGB32)
-        segmentation_image.fill(Qt.transparent)
+        height, width = self.segmentation_matrix.shape[:2]
+        segmentation_image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)  # Every pixel is written by the renderer
+        with profiler.span('render segmentation'):
+            render_segmentation_from_matrix(
+                segmentation_image,
+                self.segmentation_matrix,
+                slice_index,
+            )
 
-        render_segmentation_from_matrix(
-            segmentation_image,
-            self.segmentation_matrix,
-            slice_index,
-        )
+        return segmentation_image
+
+    @slice_cache(max_bytes=PYRAMID_CACHE_BYTES)
+    def pyramid_level(self, slice_index, level):
+        """
+        Read the cached raw slice downsampled to a pyramid level (1 or coarser),
+        built from the next finer level on first use.
+        """
+        finer = self.raw_cached_slice(slice_index) if level == 1 else self.pyramid_level(slice_index, level - 1)
+        return downsample_slice(finer)
+
+    def level_slice(self, slice_index, level):
+        """
+        :return: Raw slice at a pyramid level, level 0 being the raw slice itself
+        """
+        return self.raw_cached_slice(slice_index) if level == 0 else self.pyramid_level(slice_index, level)
+
+    @slice_cache(max_bytes=TILE_CACHE_BYTES)
+    def render_cached_tile(self, slice_index, level, row, col):
+        """
+        Render one cached background tile of a pyramid level.
+        :return: QImage of the tile
+        """
+        value_range = None
+        if self.window is None:  # One provisional contrast per slice, not per tile
+            coarsest = self.level_slice(slice_index, max_level(self.nifti_data.shape[:2]))
+            value_range = return_min_max_value(self.nifti_data.scale(coarsest))
+        tile_data = np.ascontiguousarray(self.normalize_slice(tile_of(self.level_slice(slice_index, level), row, col), value_range))
+        height, width = tile_data.shape
+        qimage = QImage(tile_data.data, width, height, width, QImage.Format_Grayscale8)  # Wraps, no copy
+        qimage.ndarray = tile_data  # The buffer lives as long as the image
+
+        return qimage
+
+    @slice_cache(max_bytes=LABEL_TILE_CACHE_BYTES)
+    def render_cached_label_tile(self, tile):
+        """
+        Render one cached segmentation tile. Keyed by the whole (slice_index, level, row, col),
+        so an edit invalidates only the tiles it touches.
+        :return: QImage of the tile
+        """
+        slice_index, level, row, col = tile
+        labels = label_tile(self.segmentation_matrix[:, :, slice_index], level, row, col)
+        height, width = labels.shape
+        segmentation_image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)  # Every pixel is written by the renderer
+        with profiler.span('render segmentation'):
+            render_segmentation_from_matrix(segmentation_image, labels[:, :, np.newaxis], 0)
 
         return segmentation_image
-    
+
+    def visible_tiles(self):
+        """
+        :return: List of ((level, row, col), widget QRectF, tile source QRectF) of the tiles
+                 covering the viewport, at the level matching the zoom
+        """
+        shape = self.nifti_data.shape[:2]
+        level = self.viewport.level(max_level(shape))
+        step = 2 ** level
+        source = self.viewport.source_rect()
+        tiles = []
+        for row, col in tiles_covering(shape, level, (source.top(), source.bottom(), source.left(), source.right())):
+            top, bottom, left, right = tile_bounds(shape, level, row, col)
+            tiles.append((
+                (level, row, col),
+                self.viewport.image_rect_to_widget(top, bottom, left, right),
+                QRectF(0, 0, (right - left) / step, (bottom - top) / step)
+            ))
+        return tiles
+
+    def invalidate_label_tiles(self, slice_index, voxel_bbox):
+        """
+        Drop the cached segmentation tiles of every level that cover a block of a slice.
+        :param voxel_bbox: (y_min, y_max, x_min, x_max) half-open voxel bounds
+        """
+        shape = self.segmentation_matrix.shape[:2]
+        for level in range(max_level(shape) + 1):
+            for row, col in tiles_covering(shape, level, voxel_bbox):
+                self.render_cached_label_tile.cache_invalidate((slice_index, level, row, col))
+
+    def prefetch_slice(self, slice_index, is_cancelled):
+        """
+        Render a slice into the caches from a prefetch worker: both whole layers, or
+        the tiles the viewport shows for tiled slices.
+        :param is_cancelled: Callable returning True once the work is no longer wanted
+        """
+        if not self.tiled:
+            self.render_cached_slice(slice_index)
+            if not is_cancelled():
+                self.render_cached_segmentation(slice_index)
+            return
+
+        for (level, row, col), _, _ in self.visible_tiles():
+            if is_cancelled():
+                return
+            self.render_cached_tile(slice_index, level, row, col)
+            self.render_cached_label_tile((slice_index, level, row, col))
+
     def update_slice(self):
         """
         Update the current slice display.
         """
-        if self.nifti_data is None:
-            return 
+        if self.nifti_data is None or self.segmentation_matrix is None:
+            return  # E.g. a frame still pending when the session was closed
+
+        self.prefetcher.record_request(self.current_slice_index)
+        self.viewport.set_image_size(self.nifti_data.shape[1], self.nifti_data.shape[0])
+        self.viewport.set_pixel_spacing(*self.pixel_spacing())
+        if self.tiled:
+            self.background_image = None  # Only the visible tiles are rendered, in update_display
+            self.segmentation_image = None
+        else:
+            self.background_image = self.render_cached_slice(self.current_slice_index)
+            self.segmentation_image = self.render_cached_segmentation(self.current_slice_index)
+        self.update_display()
 
-        size_tuple = (self.size().width(), self.size().height())
-        self.background_image = self.render_cached_slice(self.current_slice_index, size_tuple)
-        self.segmentation_image = self.render_cached_segmentation(self.current_slice_index, size_tuple)
-        self.update_display() 
+        if self.nifti_data.is_loaded and self.window_drag is None:  # Provisional slices and drags are not prefetched
+            self.prefetcher.schedule(self.current_slice_index, self.nifti_data.shape[2])
 
-    def update_display(self):
+    def update_display(self, rect=None):
         """
         Combine the background and segmentation and update the canvas display.
+        Both layers are native resolution (whole slices or the visible tiles) and the
+        viewport's part of them is scaled to the widget here.
+        :param rect: Optional QRect of the widget to re-composite, defaults to everything
+        """
+        if self.nifti_data is None or self.segmentation_matrix is None:
+            return  # E.g. a frame or resize still pending when the session was closed
+        tiled = self.tiled
+        if not tiled and (self.background_image is None or self.segmentation_image is None):
+            return
+        self.viewport.set_widget_size(self.width(), self.height())
+        tiles = self.visible_tiles() if tiled else None
+
+        if self.combined_image is None or self.combined_image.size() != self.size():
+            # Persistent surfaces, only reallocated when the widget size changes
+            self.scaled_background = QImage(self.size(), QImage.Format_ARGB32_Premultiplied)  # Fastest raster format
+            self.combined_image = QImage(self.size(), QImage.Format_ARGB32_Premultiplied)  # Combining layers
+            rect = None
+
+        if rect is None:
+            # Scale the background once per slice and widget size, strokes reuse it
+            with profiler.span('scale background'):
+                painter = QPainter(self.scaled_background)
+                painter.setCompositionMode(QPainter.CompositionMode_Source)
+                painter.setRenderHint(QPainter.SmoothPixmapTransform)
+                if tiled:
+                    painter.fillRect(self.rect(), Qt.black)  # No seams between fractional tile rectangles
+                    painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+                    for (level, row, col), target, source in tiles:
+                        painter.drawImage(target, self.render_cached_tile(self.current_slice_index, level, row, col), source)
+                else:
+                    target, source = self.viewport.visible_rects()
+                    if target != QRectF(self.rect()):
+                        painter.fillRect(self.rect(), Qt.black)  # Letterbox
+                    painter.drawImage(target, self.background_image, source)  # Draw scaling background
+                painter.end()
+            rect = self.rect()
+
+        with profiler.span('composite', args={'pixels': rect.width() * rect.height()} if profiler.enabled else None):
+            painter = QPainter(self.combined_image)
+            painter.setClipRect(rect)  # Only rasterize the pixels that changed
+            painter.setCompositionMode(QPainter.CompositionMode_Source)  # Overwrite the stale pixels
+            painter.drawImage(rect, self.scaled_background, rect)
+            painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+            if tiled:
+                dirty = QRectF(rect)
+                for (level, row, col), target, source in tiles:
+                    if target.intersects(dirty):
+                        tile = (self.current_slice_index, level, row, col)
+                        painter.drawImage(target, self.render_cached_label_tile(tile), source)
+            else:
+                target, source = self.viewport.visible_rects()
+                painter.drawImage(target, self.segmentation_image, source)  # Nearest keeps edges crisp
+            painter.end()
+        self.update(rect)
+
+    def request_display(self, rect=None):
+        """
+        Re-composite at the next frame instead of now.
+        :param rect: Optional QRect of the widget that changed, defaults to everything
+        """
+        if rect is None:
+            self.pending_full = True
+        elif self.pending_rect is None:
+            self.pending_rect = QRect(rect)
+        else:
+            self.pending_rect = self.pending_rect.united(rect)
+        self.frames.request()
+
+    def request_slice_update(self):
+        """
+        Render the current slice at the next frame instead of now.
+        """
+        self.pending_slice = True
+        self.frames.request()
+
+    def render_frame(self):
+        """
+        Draw one frame: the latest slice, or everything that changed since the last frame.
+        """
+        pending_slice, pending_full, pending_rect = self.pending_slice, self.pending_full, self.pending_rect
+        self.pending_slice = self.pending_full = False
+        self.pending_rect = None
+        with profiler.span('frame', 'frame', {'slice': self.current_slice_index} if profiler.enabled else None):
+            if pending_slice:
+                self.update_slice()
+            elif pending_full:
+                self.update_display()
+            elif pending_rect is not None:
+                self.update_display(pending_rect)
+        if profiler.enabled:
+            self.record_cache_counters()
+        if self.profile_overlay:
+            self.update(PROFILE_OVERLAY_RECT)  # New frame time
+
+    def flush_frame(self):
+        """
+        Draw a pending frame now, e.g. before grabbing the widget.
+        """
+        self.frames.flush()
+
+    def frame_stats(self):
+        """
+        :return: Dict with frame counts, frame durations and the frame rate, see FrameScheduler.stats
+        """
+        return self.frames.stats()
+
+    def go_to_slice(self, slice_index):
+        """
+        Show another slice at the next frame. Slices passed over before it is drawn,
+        e.g. during a fast flick of the wheel, are never rendered.
+        :return: True if the slice changed
+        """
+        if self.nifti_data is None:
+            return False
+        slice_index = min(max(slice_index, 0), self.nifti_data.shape[2] - 1)
+        if slice_index == self.current_slice_index:
+            return False
+        self.current_slice_index = slice_index
+        self.request_slice_update()
+        return True
+
+    def series(self):
+        """
+        :return: FrameSeries of the shown 4D volume, or None for a 3D volume
+        """
+        return getattr(self.nifti_data, 'series', None)
+
+    def show_frame(self, volume):
+        """
+        Swap the shown frame of the series, keeping the slice, viewport, window and labels.
+        """
+        if volume is self.nifti_data:
+            return
+        if self.drawing:
+            self.drawing = False
+            self.finish_stroke()
+        self.prefetcher.cancel_all()  # Workers may still read the previous frame
+        self.nifti_data = volume
+        self.clear_image_caches(raw=True)
+        self.prefetcher.forget()
+        self.request_slice_update()
+        self.frame_changed.emit(volume.frame_index)
+
+    def annotate_shown_frame(self):
+        """
+        Make the shown frame of a 4D series the one the labels belong to. Labels and
+        undo steps drawn on the previous frame are discarded, they do not describe this one.
         """
-        if self.background_image is None or self.segmentation_image is None:
+        if self.series() is None or self.nifti_data.frame_index == self.labels_frame():
             return
+        self.finish_stroke()
+        if self.statistics.labels():
+            self.segmentation_matrix.fill(0)
+            self.mark_segmentation_dirty(range(self.segmentation_matrix.shape[2]))
+            self.reset_statistics(recount=False)
+            self.prefetcher.cancel_all()
+            self.clear_segmentation_caches()
+            self.labels_changed.emit(None)  # Other views redraw everything
+            self.update_slice()
+        self.reset_history()
+        self.frame_controller.set_annotation_frame(self.nifti_data.frame_index)
+
+    def labels_frame(self):
+        """
+        :return: Frame the labels are drawn on, None for a 3D volume
+        """
+        return self.frame_controller.annotation_frame
 
-        combined_image = QImage(self.size(), QImage.Format_ARGB32)  # Combining layers
-        combined_image.fill(Qt.transparent)
-        painter = QPainter(combined_image)
-        painter.drawImage(self.rect(), self.background_image)  # Draw scaling background
-        painter.drawImage(self.rect(), self.segmentation_image)  # Draw scaling segmentation
-        painter.end()
-        self.setPixmap(QPixmap.fromImage(combined_image))
+    def can_annotate(self):
+        """
+        Labels of a 4D series belong to one frame; edits on any other frame are refused.
+        :return: True if the shown frame may be edited
+        """
+        frame_index = self.nifti_data.frame_index
+        if frame_index is None or frame_index == self.labels_frame():
+            return True
+        self.status_message.emit(f"The labels belong to frame {self.labels_frame() + 1}, "
+                                 f"go there or annotate frame {frame_index + 1} instead")
+        return False
+
+    def annotation_header(self):
+        """
+        :return: Header to save the labels with; for a 4D series it names the annotated frame
+        """
+        if self.labels_frame() is None:
+            return self.nifti_header
+        header = self.nifti_header.copy()
+        header['descrip'] = f"labels of frame index {self.labels_frame()}"  # 0-based, as in the file
+        return header
+
+    def paintEvent(self, event):
+        if self.combined_image is None:
+            super().paintEvent(event)
+            return
+
+        with profiler.span('paint', 'frame'):
+            painter = QPainter(self)
+            painter.drawImage(event.rect(), self.combined_image, event.rect())
+            if self.crosshair is not None and self.nifti_data is not None:
+                row, col = self.crosshair
+                x, y = (int(value) for value in self.viewport.to_widget(col + 0.5, row + 0.5))
+                painter.setPen(QColor(255, 255, 0, 160))
+                painter.drawLine(x, 0, x, self.height())
+                painter.drawLine(0, y, self.width(), y)
+            if self.profile_overlay:
+                self.draw_profile_overlay(painter)
+            painter.end()
+
+    def draw_profile_overlay(self, painter):
+        """
+        Draw the recent frame times and the cache hit rates in the top left corner.
+        """
+        frames = self.frame_stats()
+        caches = self.cache_stats()
+        rates = []
+        for label, name in PROFILE_OVERLAY_CACHES:
+            lookups = caches[name]['hits'] + caches[name]['misses']
+            rates.append(f"{label} {100 * caches[name]['hits'] / lookups:.0f}%" if lookups else f"{label} -")
+        lines = [
+            f"frame {frames['frame_ms_p50']:.1f} ms p50  {frames['frame_ms_p95']:.1f} ms p95  {frames['fps']:.0f} fps",
+            "hits " + "  ".join(rates),
+        ]
+        painter.fillRect(PROFILE_OVERLAY_RECT, QColor(0, 0, 0, 160))
+        painter.setPen(QColor(255, 255, 255))
+        painter.drawText(PROFILE_OVERLAY_RECT.adjusted(6, 2, -6, -2), Qt.AlignLeft | Qt.AlignVCenter, "\n".join(lines))
+
+    def record_cache_counters(self):
+        """
+        Record the size and hit counters of the slice caches as trace counter tracks, one set per view.
+        """
+        caches = self.cache_stats()
+        view = f"axis {self.view_axis}"
+        profiler.counter(f"cache MB ({view})", {
+            label: caches[name]['bytes'] / (1024 * 1024) for label, name in PROFILE_OVERLAY_CACHES
+        })
+        profiler.counter(f"cache hits ({view})", {label: caches[name]['hits'] for label, name in PROFILE_OVERLAY_CACHES})
+        profiler.counter(f"cache misses ({view})", {label: caches[name]['misses'] for label, name in PROFILE_OVERLAY_CACHES})
+
+    def set_profile_overlay(self, enabled):
+        """
+        Show or hide the frame time and cache statistics overlay.
+        """
+        self.profile_overlay = enabled
+        self.update(PROFILE_OVERLAY_RECT)
+
+    def set_crosshair(self, row, col):
+        """
+        Mark where the slices of the other views cross this one.
+        """
+        if self.crosshair != (row, col):
+            self.crosshair = (row, col)
+            self.update()
 
     def mousePressEvent(self, event):
-        if event.button() == Qt.LeftButton:
+        if event.button() == Qt.RightButton and self.window is not None:
+            self.window_drag = (event.pos(), *window_to_width_level(*self.window))
+        elif event.button() == Qt.MiddleButton:
+            self.pan_start = event.pos()  # A drag pans, a click selects the voxel
+            self.pan_moved = False
+        elif event.button() == Qt.LeftButton and (self.nifti_data is None or not self.can_annotate()):
+            return
+        elif event.button() == Qt.LeftButton and self.tool != 'brush':
+            self.start_fill(event.pos())
+        elif event.button() == Qt.LeftButton:
             self.last_point = self.translate_mouse_position(event.pos())  # Store starting point
             self.drawing = True
+            self.stroke = StrokeRecorder(self.segmentation_matrix)
             self.draw_segmentation(event.pos())
             self.last_point = self.translate_mouse_position(event.pos())  # Update last point
 
     def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.RightButton and self.window_drag is not None:
+            self.drag_window(event.pos())
+            return
+        if event.buttons() & Qt.MiddleButton and self.pan_start is not None:
+            delta = event.pos() - self.pan_start
+            if self.pan_moved or delta.manhattanLength() >= PAN_CLICK_DISTANCE:
+                self.pan_moved = True
+                self.pan_start = event.pos()
+                self.pan(delta.x(), delta.y())
+            return
         if event.buttons() & Qt.LeftButton and self.drawing:
             self.draw_segmentation(event.pos())
             self.last_point = self.translate_mouse_position(event.pos())  # Update last point
 
     def mouseReleaseEvent(self, event):
+        if event.button() == Qt.RightButton and self.window_drag is not None:
+            self.window_drag = None
+            self.update_slice()  # Prefetch the neighbours with the final window
+        if event.button() == Qt.MiddleButton and self.pan_start is not None:
+            if not self.pan_moved:
+                self.select_point(event.pos())
+            self.pan_start = None
         if event.button() == Qt.LeftButton:
             self.drawing = False
+            self.finish_stroke()
+
+    def drag_window(self, pos):
+        """
+        Right drag: horizontal motion changes the window width, vertical motion the level.
+        A drag across the whole canvas spans the whole intensity range.
+        """
+        start, start_width, start_level = self.window_drag
+        intensity_per_pixel = (self.nifti_data.max_value - self.nifti_data.min_value) / max(self.width(), 1)
+        width = max(start_width + (pos.x() - start.x()) * intensity_per_pixel, 1e-6)
+        level = start_level + (pos.y() - start.y()) * intensity_per_pixel
+        self.set_window(*width_level_to_window(width, level))
+
+    def select_point(self, pos):
+        """
+        Emit point_selected for the voxel under a widget position.
+        """
+        if self.nifti_data is None:
+            return
+        pos = self.translate_mouse_position(pos)
+        row = min(max(pos.y(), 0), self.viewport.image_height - 1)
+        col = min(max(pos.x(), 0), self.viewport.image_width - 1)
+        self.point_selected.emit(self.display_point(row, col))
+
+    def zoom_by(self, factor, pos=None):
+        """
+        Zoom the viewport, keeping the slice pixel under pos (default: the widget center) in place.
+        """
+        if self.nifti_data is None:
+            return
+        self.viewport.set_widget_size(self.width(), self.height())
+        self.viewport.zoom_at(pos if pos is not None else self.rect().center(), factor)
+        self.on_viewport_changed()
+
+    def pan(self, dx, dy):
+        if self.nifti_data is None or not self.viewport.is_zoomed:
+            return
+        self.viewport.pan(dx, dy)
+        self.on_viewport_changed()
+
+    def reset_view(self):
+        """
+        Show the whole slice again.
+        """
+        self.viewport.reset()
+        self.on_viewport_changed()
+
+    def on_viewport_changed(self):
+        if self.tiled:
+            self.prefetcher.forget()  # Neighbours were prefetched for the tiles visible before
+        self.request_display()
+
+    def pixel_spacing(self):
+        """
+        :return: (x, y) voxel size along the columns and rows of this view's slices
+        """
+        spacing = display_spacing(self.nifti_header.get_zooms(), self.nifti_data.axes)
+        row_axis, col_axis, _ = self.view_permutation
+        return spacing[col_axis], spacing[row_axis]
 
     def translate_mouse_position(self, pos):
-        if self.background_image is None:
+        if self.nifti_data is None:
             return pos
-        
-        x_ratio = self.background_image.width() / self.width()
-        y_ratio = self.background_image.height() / self.height()
 
-        return QPoint(int(pos.x() * x_ratio), int(pos.y() * y_ratio))
+        x, y = self.viewport.to_image(pos)
+        return QPoint(int(np.floor(x)), int(np.floor(y)))
+
+    def display_point(self, row, col):
+        """
+        :return: (row, col, slice) display voxel of a voxel of the current slice
+        """
+        point = [0, 0, 0]
+        for axis, index in zip(self.view_permutation, (row, col, self.current_slice_index)):
+            point[axis] = index
+        return tuple(point)
+
+    def display_box(self, view_box):
+        """
+        :param view_box: (y_min, y_max, x_min, x_max, z_min, z_max) box in this canvas' matrix
+        :return: The same box in display orientation
+        """
+        return to_display_box(view_box, self.view_permutation)
 
     def draw_segmentation(self, pos):
         """
@@ -145,19 +981,291 @@ class Canvas(QLabel):
         :param pos: Current position QPoint
         """
         pos = self.translate_mouse_position(pos)  # Translate position
-        update_segmentation_matrix(  # Update segmentation
+        if self.stroke is not None:
+            self.stroke.before_edit(self.current_slice_index)
+        voxel_bbox = update_segmentation_matrix(  # Update segmentation
             self.segmentation_matrix,
             self.last_point,
             pos,
             self.brush_size,
-            self.background_image,
+            self.viewport.image_size(),  # Positions are in slice pixels already
             self.current_slice_index,
-            self.brush_color_value
+            self.brush_color_value,
+            on_write=self.record_brush_write,
+            spacing=(self.viewport.x_spacing, self.viewport.y_spacing)
         )
-        self.render_cached_segmentation.cache_invalidate(self.current_slice_index)
-        size_tuple = (self.size().width(), self.size().height())
-        self.segmentation_image = self.render_cached_segmentation(self.current_slice_index, size_tuple)
-        self.update_display() 
+        if voxel_bbox is None:
+            return
+
+        if self.stroke is not None:
+            self.stroke.after_edit(self.current_slice_index, voxel_bbox)
+        self.mark_segmentation_dirty((self.current_slice_index,))
+        self.statistics_changed.emit()
+        self.refresh_segmentation_region(voxel_bbox)
+        self.labels_changed.emit(self.display_box((*voxel_bbox, self.current_slice_index, self.current_slice_index + 1)))
+
+    def refresh_segmentation_region(self, voxel_bbox):
+        """
+        Re-render a block of the current slice's overlay after its labels changed.
+        :param voxel_bbox: (y_min, y_max, x_min, x_max) half-open voxel bounds
+        """
+        if self.tiled:
+            self.invalidate_label_tiles(self.current_slice_index, voxel_bbox)
+            self.request_display(self.voxel_rect_to_widget(voxel_bbox))  # Re-renders the visible tiles it covers
+            return
+
+        # Patch the cached overlay in place; bumping the slice version keeps racing prefetches out
+        self.segmentation_image = self.render_cached_segmentation(self.current_slice_index)
+        self.render_cached_segmentation.cache_invalidate(self.current_slice_index, keep=())
+        with profiler.span('render segmentation'):
+            dirty_bounds = render_segmentation_region(
+                self.segmentation_image,
+                self.segmentation_matrix,
+                self.current_slice_index,
+                voxel_bbox
+            )
+        if dirty_bounds is not None:
+            self.request_display(self.voxel_rect_to_widget(dirty_bounds))  # Composited once per frame
+
+    def finish_stroke(self):
+        """
+        Record the stroke being drawn as one undoable edit.
+        """
+        if self.stroke is None:
+            return
+        self.history.push(self.stroke.finish())
+        self.stroke = None
+        self.emit_history_changed()
+
+    def apply_patches(self, patches, new):
+        """
+        Refresh the slices whose labels were changed by undo or redo; untouched slices keep their cache.
+        :param new: True if the patches were applied forward (redo), False for undo
+        """
+        for patch in patches:
+            self.statistics.record_patch(patch, new)
+            self.mark_segmentation_dirty(patch.slice_indices)
+            self.refresh_labels(patch.bounds)
+            self.labels_changed.emit(self.display_box(patch.bounds))
+        if patches:
+            self.statistics_changed.emit()
+
+    def refresh_labels(self, box):
+        """
+        Re-render the current overlay where a box of labels changed and drop the
+        cached overlays of the other slices it spans.
+        :param box: (y_min, y_max, x_min, x_max, z_min, z_max) box in this canvas' matrix
+        """
+        y_min, y_max, x_min, x_max, z_min, z_max = box
+        for slice_index in range(z_min, z_max):
+            if slice_index == self.current_slice_index:
+                self.refresh_segmentation_region((y_min, y_max, x_min, x_max))
+                continue
+            if self.tiled:
+                self.invalidate_label_tiles(slice_index, (y_min, y_max, x_min, x_max))
+            else:
+                self.render_cached_segmentation.cache_invalidate(slice_index)
+            self.prefetcher.forget(slice_index)
+
+    def on_labels_changed(self, box):
+        """
+        Follow label changes made through another view of the same label volume.
+        :param box: Display box of the changed labels, None for all of them
+        """
+        if self.nifti_data is None or self.segmentation_matrix is None:
+            return
+        if box is not None:
+            self.refresh_labels(to_view_box(box, self.view_permutation))
+            return
+        self.clear_segmentation_caches()
+        self.prefetcher.forget()
+        if not self.tiled:
+            self.segmentation_image = self.render_cached_segmentation(self.current_slice_index)
+        self.update_display()
+
+    def record_edit(self, patches):
+        """
+        Record labels that another view already wrote into the volume as one undoable edit.
+        :param patches: List of LabelPatch in this canvas' coordinates
+        """
+        if not patches:
+            return
+        self.finish_stroke()
+        self.history.push(patches)
+        self.apply_patches(patches, new=True)
+        self.emit_history_changed()
+
+    def start_fill(self, pos):
+        """
+        Fill the region connected to the clicked voxel whose intensity is close to it.
+        The region is searched by a RegionGrowWorker; a fill still running is cancelled.
+        :param pos: Clicked position QPoint in widget coordinates
+        """
+        if self.nifti_data is None or self.segmentation_matrix is None:
+            return
+        three_d = self.tool == 'fill_3d'
+        if three_d and not self.nifti_data.is_loaded:
+            self.status_message.emit("3D fill is available once the volume has loaded")
+            return
+
+        pos = self.translate_mouse_position(pos)
+        rows, cols = self.segmentation_matrix.shape[:2]
+        seed = (min(max(pos.y(), 0), rows - 1), min(max(pos.x(), 0), cols - 1), self.current_slice_index)
+
+        self.cancel_fill()
+        self.fill_value = self.brush_color_value
+        self.filler = RegionGrowWorker(self.nifti_data, seed, self.fill_tolerance, three_d)
+        self.filler.grown.connect(self.on_region_grown)
+        self.filler.failed.connect(self.on_fill_failed)
+        start_worker(self.filler)
+
+    def cancel_fill(self):
+        if self.filler is not None:
+            self.filler.cancel()
+            self.filler = None
+
+    def on_region_grown(self, region):
+        """
+        Write the label into a grown region as one undoable patch.
+        :param region: (bounds, mask) from grow_region, or None
+        """
+        if self.sender() is not self.filler:
+            return  # Cancelled or superseded
+        self.filler = None
+        if region is None:
+            return
+
+        bounds, mask = region
+        y_min, y_max, x_min, x_max, z_min, z_max = bounds
+        dtype = self.segmentation_matrix.dtype
+        old_blocks = [self.segmentation_matrix[y_min:y_max, x_min:x_max, k] for k in range(z_min, z_max)]
+        patch = LabelPatch(
+            bounds,
+            dtype,
+            old_blocks,
+            (np.where(mask[:, :, offset], self.fill_value, block).astype(dtype, copy=False)
+             for offset, block in enumerate(old_blocks))
+        )
+        self.finish_stroke()
+        patch.apply(self.segmentation_matrix, new=True)
+        self.history.push([patch])
+        self.apply_patches([patch], new=True)
+        self.emit_history_changed()
+        self.status_message.emit(f"Filled {int(mask.sum()):,} voxels")
+
+    def on_fill_failed(self, message):
+        if self.sender() is self.filler:
+            self.filler = None
+            self.status_message.emit(message)
+
+    def interpolate_labels(self):
+        """
+        Fill the unlabelled slices between annotated key slices by shape-based
+        interpolation, in a LabelInterpolateWorker. The result is one undoable edit.
+        """
+        if self.segmentation_matrix is None or self.interpolator is not None:
+            return
+        self.finish_stroke()
+
+        gaps = interpolation_gaps(annotated_slices(self.segmentation_matrix))
+        if not gaps:
+            self.status_message.emit("Label at least two slices with a gap between them to interpolate")
+            return
+
+        key_slice_indices = {index for gap in gaps for index in gap}
+        key_slices = {index: self.segmentation_matrix[:, :, index].copy() for index in key_slice_indices}
+        self.interpolator = LabelInterpolateWorker(key_slices, gaps)
+        self.interpolator.progress.connect(self.on_interpolation_progress)
+        self.interpolator.interpolated.connect(self.on_labels_interpolated)
+        self.interpolator.failed.connect(self.on_interpolation_failed)
+        self.interpolator.stopped.connect(self.on_interpolator_stopped)
+        start_worker(self.interpolator)
+        self.status_message.emit(f"Interpolating {len(gaps)} gaps")
+
+    def cancel_interpolation(self):
+        if self.interpolator is not None:
+            self.interpolator.cancel()
+            self.interpolator = None
+            self.interpolation_finished.emit()
+
+    def on_interpolation_progress(self, percent):
+        if self.sender() is self.interpolator:
+            self.interpolation_progress.emit(percent)
+
+    def on_labels_interpolated(self, results):
+        """
+        Write interpolated labels into the slices between key slices, keeping any label
+        drawn there meanwhile.
+        :param results: List of (start_index, end_index, (bounds, labels))
+        """
+        if self.sender() is not self.interpolator:
+            return
+        self.finish_stroke()
+
+        patches = []
+        for start, end, ((y_min, y_max, x_min, x_max), labels) in results:
+            old_blocks = [self.segmentation_matrix[y_min:y_max, x_min:x_max, k] for k in range(start + 1, end)]
+            patch = LabelPatch(
+                (y_min, y_max, x_min, x_max, start + 1, end),
+                self.segmentation_matrix.dtype,
+                old_blocks,
+                (np.where(block != 0, block, labels[:, :, offset]) for offset, block in enumerate(old_blocks))
+            )
+            patch.apply(self.segmentation_matrix, new=True)
+            patches.append(patch)
+
+        self.history.push(patches)
+        self.apply_patches(patches, new=True)
+        self.emit_history_changed()
+        self.status_message.emit(f"Interpolated {sum(end - start - 1 for start, end, _ in results)} slices")
+
+    def on_interpolation_failed(self, message):
+        if self.sender() is self.interpolator:
+            self.status_message.emit(message)
+
+    def on_interpolator_stopped(self):
+        if self.sender() is self.interpolator:
+            self.interpolator = None
+            self.interpolation_finished.emit()
+
+    def undo(self):
+        if self.segmentation_matrix is None:
+            return
+        self.finish_stroke()
+        self.apply_patches(self.history.undo(self.segmentation_matrix), new=False)
+        self.emit_history_changed()
+
+    def redo(self):
+        if self.segmentation_matrix is None:
+            return
+        self.finish_stroke()
+        self.apply_patches(self.history.redo(self.segmentation_matrix), new=True)
+        self.emit_history_changed()
+
+    def reset_history(self):
+        self.stroke = None
+        self.history.clear()
+        self.emit_history_changed()
+
+    def emit_history_changed(self):
+        self.history_changed.emit(self.history.can_undo(), self.history.can_redo())
+
+    def set_undo_max_bytes(self, max_bytes):
+        """
+        Set the memory cap of the undo history; the oldest edits are dropped first.
+        """
+        self.history.set_max_bytes(max_bytes)
+        self.emit_history_changed()
+
+    def voxel_rect_to_widget(self, voxel_bounds):
+        """
+        Widget rectangle covering a block of slice pixels, with a one pixel margin.
+        :param voxel_bounds: (top, bottom, left, right) half-open bounds in slice pixels
+        :return: QRect in widget coordinates
+        """
+        top, bottom, left, right = voxel_bounds
+        rect = self.viewport.image_rect_to_widget(top, bottom, left, right).toAlignedRect()
+        return rect.adjusted(-1, -1, 1, 1).intersected(self.rect())
 
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
@@ -178,24 +1286,73 @@ class Canvas(QLabel):
         if self.nifti_data is not None:
             self.update_slice()
 
+    def set_prefetch_depth(self, depth):
+        """
+        Set how many slices ahead of the scroll direction are rendered in the background.
+        """
+        self.prefetcher.set_depth(depth)
+
+    def prefetch_stats(self):
+        return self.prefetcher.stats()
+
+    def cache_stats(self):
+        """
+        :return: Dict with the statistics of the slice and segmentation caches
+        """
+        return {
+            'slice': self.render_cached_slice.cache_info(),
+            'raw_slice': self.raw_cached_slice.cache_info(),
+            'segmentation': self.render_cached_segmentation.cache_info(),
+            'pyramid': self.pyramid_level.cache_info(),
+            'tile': self.render_cached_tile.cache_info(),
+            'label_tile': self.render_cached_label_tile.cache_info(),
+            'undo': self.history.info(),
+            'frames': self.series().frames.info() if self.series() is not None else None,
+        }
+
     def set_brush_color_value(self, color_value):
         self.brush_color_value = color_value
 
+    def set_tool(self, tool):
+        """
+        :param tool: 'brush', 'fill_2d' or 'fill_3d'
+        """
+        self.tool = tool
+
+    def set_fill_tolerance(self, tolerance):
+        self.fill_tolerance = tolerance
+
     def wheelEvent(self, event):
+        if event.modifiers() & Qt.ControlModifier:
+            self.zoom_by(ZOOM_STEP ** (event.angleDelta().y() / 120), event.pos())
+            return
         if self.nifti_data is not None:
             num_slices = self.nifti_data.shape[2]
             delta = event.angleDelta().y() // 120
 
             new_index = self.current_slice_index + delta
             if 0 <= new_index < num_slices:
-                self.current_slice_index = new_index
-                self.update_slice()
+                self.go_to_slice(new_index)
                 self.slice_changed.emit(self.current_slice_index)
 
     def clear_all_segmentations(self):
+        """
+        Clear every label. Undoable like a stroke.
+        """
         if self.segmentation_matrix is not None:
+            self.finish_stroke()
+            patch = fill_patch(self.segmentation_matrix, 0)
+            if patch is not None:
+                self.history.push([patch])
             self.segmentation_matrix.fill(0)
+            self.mark_segmentation_dirty(range(self.segmentation_matrix.shape[2]))
+            self.statistics.record_fill(0)
+            self.statistics_changed.emit()
+            self.emit_history_changed()
 
-        self.render_cached_segmentation.cache_clear()  # Clear cached segmentation
-        self.segmentation_image.fill(Qt.transparent)
-        self.update_display()
\ No newline at end of file
+        self.prefetcher.cancel_all()
+        self.clear_segmentation_caches()  # Clear cached segmentation
+        if self.segmentation_image is not None:
+            self.segmentation_image.fill(Qt.transparent)
+        self.update_display()
+        self.labels_changed.emit(None)
\ No newline at end of file
@@ -0,0 +1,94 @@
+# canvas/frame_scheduler.py
+from PyQt5.QtCore import QObject, Qt, QTimer
+from collections import deque
+import time
+import numpy as np
+
+FRAME_INTERVAL_MS = 16  # At most one frame per interval, about 60 fps
+FRAME_HISTORY = 240  # Frames kept for the timing statistics
+
+class FrameScheduler(QObject):
+    """
+    Coalesce display refreshes into at most one frame per interval.
+
+    Input handlers apply their changes right away and call request(); the frame
+    callback runs once on a timer, however many requests came in meanwhile. A
+    request after an idle period runs on the next event loop iteration, so a single
+    event costs no latency. Timings of recent frames are kept for stats().
+    """
+
+    def __init__(self, callback, interval_ms=FRAME_INTERVAL_MS, parent=None):
+        """
+        :param callback: Callable rendering one frame
+        :param interval_ms: Minimum time between the starts of two frames
+        """
+        super().__init__(parent)
+        self.callback = callback
+        self.interval = interval_ms / 1000
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.run_frame)
+        self.last_start = None
+        self.requests = 0
+        self.frames = 0
+        self.durations = deque(maxlen=FRAME_HISTORY)  # Seconds spent in the callback
+        self.intervals = deque(maxlen=FRAME_HISTORY)  # Seconds between back-to-back frames
+
+    @property
+    def pending(self):
+        return self.timer.isActive()
+
+    def request(self):
+        """
+        Ask for a frame; requests made before it runs are merged into it.
+        """
+        self.requests += 1
+        if self.timer.isActive():
+            return
+        delay = 0.0
+        if self.last_start is not None:
+            delay = max(0.0, self.interval - (time.perf_counter() - self.last_start))
+        self.timer.start(int(round(delay * 1000)))
+
+    def flush(self):
+        """
+        Run a pending frame now, e.g. before reading back what is displayed.
+        """
+        if self.timer.isActive():
+            self.timer.stop()
+            self.run_frame()
+
+    def run_frame(self):
+        start = time.perf_counter()
+        if self.last_start is not None and start - self.last_start < 4 * self.interval:
+            self.intervals.append(start - self.last_start)  # Idle gaps are not frame intervals
+        self.last_start = start
+        self.callback()
+        self.durations.append(time.perf_counter() - start)
+        self.frames += 1
+
+    def stats(self):
+        """
+        :return: Dict with frame and request counts, frame durations in ms and the frame rate
+                 over recent back-to-back frames
+        """
+        durations = np.array(self.durations) * 1000
+        intervals = np.array(self.intervals)
+        return {
+            'frames': self.frames,
+            'requests': self.requests,
+            'coalesced': self.requests - self.frames,
+            'frame_ms_mean': float(durations.mean()) if durations.size else 0.0,
+            'frame_ms_p50': float(np.percentile(durations, 50)) if durations.size else 0.0,
+            'frame_ms_p95': float(np.percentile(durations, 95)) if durations.size else 0.0,
+            'frame_ms_max': float(durations.max()) if durations.size else 0.0,
+            'over_budget': int((durations > self.interval * 1000).sum()),
+            'fps': float(1 / intervals.mean()) if intervals.size else 0.0,
+        }
+
+    def reset_stats(self):
+        self.requests = 0
+        self.frames = 0
+        self.durations.clear()
+        self.intervals.clear()
@@ -0,0 +1,77 @@
+# canvas/multi_planar_view.py
+from canvas.plane_canvas import PlaneCanvas
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QLabel, QVBoxLayout, QWidget
+
+class MultiPlanarView(QWidget):
+    """
+    Coronal and sagittal views linked to the axial canvas.
+
+    The three canvases share one cursor: each view's slice is one of its coordinates
+    and the other views draw a crosshair where that slice crosses them. A middle click
+    in any view moves the other two to the clicked voxel. Labels drawn in one view
+    are refreshed in the others while the stroke is drawn.
+    """
+
+    def __init__(self, axial, prefetch_depth=4):
+        """
+        :param axial: The main Canvas, which owns the volume and the labels
+        """
+        super().__init__()
+        self.axial = axial
+        self.coronal = PlaneCanvas(axial, 0, prefetch_depth)
+        self.sagittal = PlaneCanvas(axial, 1, prefetch_depth)
+        self.canvases = [self.axial, self.coronal, self.sagittal]
+
+        for source in self.canvases:
+            for target in self.canvases:
+                if target is not source:
+                    source.labels_changed.connect(target.on_labels_changed)
+            source.slice_changed.connect(self.sync_crosshairs)
+            source.point_selected.connect(self.go_to_point)
+        for plane in (self.coronal, self.sagittal):
+            plane.status_message.connect(axial.status_message)
+            plane.data_replaced.connect(self.sync_crosshairs)
+        axial.data_replaced.connect(self.sync_crosshairs)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        for name, canvas in [("Coronal", self.coronal), ("Sagittal", self.sagittal)]:
+            layout.addWidget(QLabel(name), alignment=Qt.AlignHCenter)
+            layout.addWidget(canvas)
+        self.setLayout(layout)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.sync_crosshairs()  # The planes attach to the volume when shown
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.axial.crosshair = None
+        self.axial.update()
+
+    def cursor(self):
+        """
+        :return: (row, col, slice) display voxel where the three views cross
+        """
+        return self.coronal.current_slice_index, self.sagittal.current_slice_index, self.axial.current_slice_index
+
+    def sync_crosshairs(self):
+        if not self.isVisible() or self.coronal.nifti_data is None or self.sagittal.nifti_data is None:
+            return
+        point = self.cursor()
+        for canvas in self.canvases:
+            row_axis, col_axis, _ = canvas.view_permutation
+            canvas.set_crosshair(point[row_axis], point[col_axis])
+
+    def go_to_point(self, point):
+        """
+        Show the slices through a display voxel in every view.
+        """
+        if not self.isVisible():
+            return
+        for canvas in self.canvases:
+            slice_index = point[canvas.view_axis]
+            if canvas.go_to_slice(slice_index):
+                canvas.slice_changed.emit(slice_index)
+        self.sync_crosshairs()
@@ -0,0 +1,168 @@
+# canvas/plane_canvas.py
+from canvas.canvas import Canvas
+from utils.image_utils.plane_volume import PlaneVolume, plane_permutation
+from workers.plane_builder import PlaneCopyTask
+from PyQt5.QtCore import QThreadPool
+
+class PlaneCanvas(Canvas):
+    """
+    Coronal or sagittal view of the volume and labels shown by an axial Canvas.
+
+    The canvas renders a PlaneVolume and a transposed view of the owner's label
+    matrix through the usual Canvas pipeline, so it has its own slice caches and
+    prefetcher. Strokes write straight into the shared labels; when a stroke ends its
+    patches are handed to the owner, which keeps the one undo history, the statistics
+    and the session working file. Fills and interpolation run in the axial view.
+    """
+
+    def __init__(self, owner, view_axis, prefetch_depth=4):
+        """
+        :param owner: Canvas whose volume and labels are shown
+        :param view_axis: Display axis to scroll through, 0 (coronal) or 1 (sagittal)
+        """
+        super().__init__(prefetch_depth)
+        self.setMinimumSize(200, 200)
+        self.setAcceptDrops(False)  # Files are opened in the axial view
+        self.owner = owner
+        self.view_axis = view_axis
+        self.view_permutation = plane_permutation(view_axis)
+        self.copy_pool = QThreadPool()
+        self.copy_pool.setMaxThreadCount(1)
+        self.stale = True  # Owner data changed while hidden, attached again when shown
+
+        owner.data_replaced.connect(self.on_owner_replaced)
+        owner.labels_replaced.connect(self.on_owner_labels_replaced)
+        owner.volume_loaded.connect(self.on_owner_replaced)
+        owner.window_changed.connect(self.sync_window)
+        owner.frame_changed.connect(self.on_owner_frame_changed)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.stale:
+            self.attach()
+
+    def on_owner_replaced(self):
+        if self.isVisible():
+            self.attach()
+        else:
+            self.stale = True
+
+    def on_owner_labels_replaced(self, changed):
+        """
+        Show the owner's new label matrix; the volume, its rendered slices and the
+        plane copy stay as they are.
+        :param changed: False if the same labels only moved to another array
+        """
+        if not self.isVisible() or self.stale:
+            self.stale = True
+            return
+        if not isinstance(self.nifti_data, PlaneVolume) or self.nifti_data.volume is not self.owner.nifti_data \
+                or self.owner.segmentation_matrix is None:
+            self.attach()
+            return
+
+        self.prefetcher.cancel_all()  # Workers may still read the old array
+        self.segmentation_matrix = self.owner.segmentation_matrix.transpose(self.view_permutation)
+        self.stroke = None
+        if changed:
+            self.clear_segmentation_caches()
+            self.update_slice()
+
+    def on_owner_frame_changed(self, frame_index):
+        """
+        Show the owner's new frame of a 4D series at the same slice and viewport. No
+        contiguous plane copy is built while the owner plays a cine loop.
+        """
+        if not self.isVisible() or self.stale:
+            self.stale = True
+            return
+        volume = self.owner.nifti_data
+        if not isinstance(self.nifti_data, PlaneVolume) or self.nifti_data.series is not volume.series:
+            self.attach()
+            return
+
+        self.prefetcher.cancel_all()
+        self.nifti_data.cancel()
+        self.nifti_data = PlaneVolume(volume, self.view_axis)
+        self.clear_image_caches(raw=True)
+        self.prefetcher.forget()
+        if not self.owner.frame_controller.is_playing() and volume.is_loaded and self.nifti_data.fits_budget():
+            self.copy_pool.start(PlaneCopyTask(self.nifti_data))
+        self.request_slice_update()
+
+    def attach(self):
+        """
+        Show the owner's current volume and labels, keeping the slice if it still exists.
+        """
+        self.stale = False
+        self.prefetcher.cancel_all()
+        if isinstance(self.nifti_data, PlaneVolume):
+            self.nifti_data.cancel()
+        self.clear_image_caches(raw=True)
+        self.clear_segmentation_caches()
+
+        volume = self.owner.nifti_data
+        if volume is None or self.owner.segmentation_matrix is None:
+            self.nifti_data = None
+            self.segmentation_matrix = None
+            return
+
+        previous = self.nifti_data
+        self.nifti_data = PlaneVolume(volume, self.view_axis)
+        self.nifti_affine = volume.affine
+        self.nifti_header = volume.header
+        self.segmentation_matrix = self.owner.segmentation_matrix.transpose(self.view_permutation)
+        self.stroke = None
+        self.window = self.owner.window
+        self.window_lut = self.owner.window_lut
+
+        num_slices = self.nifti_data.shape[2]
+        same_volume = previous is not None and (previous.volume is volume or
+                                                (volume.series is not None and previous.series is volume.series))
+        if not same_volume or self.current_slice_index >= num_slices:
+            self.current_slice_index = num_slices // 2
+            self.viewport.set_image_size(self.nifti_data.shape[1], self.nifti_data.shape[0])
+            self.viewport.reset()
+        if volume.is_loaded and self.nifti_data.fits_budget():
+            self.copy_pool.start(PlaneCopyTask(self.nifti_data))
+        self.update_slice()
+
+    def sync_window(self, low, high):
+        if self.isVisible() and not self.stale:
+            super().set_window(low, high)
+        else:
+            self.stale = True
+
+    def set_window(self, low, high):
+        self.owner.set_window(low, high)  # One window for every view, applied through sync_window
+
+    def on_labels_changed(self, box):
+        if self.isVisible() and not self.stale:
+            super().on_labels_changed(box)
+        else:
+            self.stale = True
+
+    def record_brush_write(self, old_values, value):
+        pass  # Counted by the owner from the stroke's patches
+
+    def mark_segmentation_dirty(self, slice_indices):
+        pass  # Marked by the owner from the stroke's patches
+
+    def finish_stroke(self):
+        """
+        Hand the stroke to the owner as one undoable edit of the label volume.
+        """
+        if self.stroke is None:
+            return
+        patches = [patch.transposed(self.view_permutation) for patch in self.stroke.finish()]
+        self.stroke = None
+        self.owner.record_edit(patches)
+
+    def labels_frame(self):
+        return self.owner.labels_frame()
+
+    def start_fill(self, pos):
+        self.status_message.emit("Fills run in the axial view")
+
+    def close_session(self):
+        pass  # The owner's working file
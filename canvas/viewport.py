@@ -0,0 +1,161 @@
+# canvas/viewport.py
+from PyQt5.QtCore import QRectF, QSize
+import math
+
+MAX_ZOOM = 64.0  # Widget pixels per slice pixel, relative to fitting the slice
+
+class Viewport:
+    """
+    The part of the slice a canvas shows.
+
+    Slice pixels are drawn with the aspect of their voxel spacing, so a coronal
+    slice of thick axial slices is as tall as the anatomy is. Zoom 1 fits the whole
+    slice in the widget, letterboxed along the other axis; higher zooms show a
+    smaller rectangle around the center. The center is clamped so the shown
+    rectangle never leaves the slice along an axis it fills. Coordinates are in
+    slice pixels (x along columns, y along rows) and widget pixels.
+    """
+
+    def __init__(self):
+        self.image_width = 1
+        self.image_height = 1
+        self.widget_width = 1
+        self.widget_height = 1
+        self.x_spacing = 1.0  # Voxel size along the columns and rows, only their ratio matters
+        self.y_spacing = 1.0
+        self.zoom = 1.0
+        self.center_x = 0.5
+        self.center_y = 0.5
+
+    def set_image_size(self, width, height):
+        """
+        A slice of another size shows fitted again.
+        """
+        if (width, height) != (self.image_width, self.image_height):
+            self.image_width = max(width, 1)
+            self.image_height = max(height, 1)
+            self.reset()
+
+    def set_pixel_spacing(self, x_spacing, y_spacing):
+        """
+        :param x_spacing: Voxel size along the slice columns, e.g. in mm
+        :param y_spacing: Voxel size along the slice rows
+        """
+        if (x_spacing, y_spacing) != (self.x_spacing, self.y_spacing):
+            self.x_spacing = x_spacing
+            self.y_spacing = y_spacing
+            self.clamp()
+
+    def set_widget_size(self, width, height):
+        if (width, height) != (self.widget_width, self.widget_height):
+            self.widget_width = max(width, 1)
+            self.widget_height = max(height, 1)
+            self.clamp()  # The letterboxed axis may change
+
+    def image_size(self):
+        return QSize(self.image_width, self.image_height)
+
+    def reset(self):
+        self.zoom = 1.0
+        self.center_x = self.image_width / 2
+        self.center_y = self.image_height / 2
+
+    @property
+    def is_zoomed(self):
+        return self.zoom > 1.0
+
+    def scale(self):
+        """
+        :return: (x, y) widget pixels per slice pixel
+        """
+        fit = min(self.widget_width / (self.image_width * self.x_spacing),
+                  self.widget_height / (self.image_height * self.y_spacing))  # Widget pixels per mm at zoom 1
+        return fit * self.x_spacing * self.zoom, fit * self.y_spacing * self.zoom
+
+    def source_rect(self):
+        """
+        :return: QRectF of the slice shown over the whole widget, in slice pixels;
+                 it extends past the slice where the slice is letterboxed
+        """
+        x_scale, y_scale = self.scale()
+        width = self.widget_width / x_scale
+        height = self.widget_height / y_scale
+        return QRectF(self.center_x - width / 2, self.center_y - height / 2, width, height)
+
+    def visible_rects(self):
+        """
+        :return: (target QRectF in widget pixels, source QRectF in slice pixels) of the
+                 part of the slice that is shown; outside target the widget is letterbox
+        """
+        source = self.source_rect().intersected(QRectF(0, 0, self.image_width, self.image_height))
+        target = self.image_rect_to_widget(source.top(), source.bottom(), source.left(), source.right())
+        return target, source
+
+    def clamp(self):
+        x_scale, y_scale = self.scale()
+        half_width = self.widget_width / x_scale / 2
+        half_height = self.widget_height / y_scale / 2
+        if 2 * half_width >= self.image_width:
+            self.center_x = self.image_width / 2  # Letterboxed, keep it centered
+        else:
+            self.center_x = min(max(self.center_x, half_width), self.image_width - half_width)
+        if 2 * half_height >= self.image_height:
+            self.center_y = self.image_height / 2
+        else:
+            self.center_y = min(max(self.center_y, half_height), self.image_height - half_height)
+
+    def to_image(self, pos):
+        """
+        :param pos: QPoint in widget pixels
+        :return: (x, y) in slice pixels
+        """
+        source = self.source_rect()
+        x_scale, y_scale = self.scale()
+        return source.left() + pos.x() / x_scale, source.top() + pos.y() / y_scale
+
+    def to_widget(self, x, y):
+        """
+        :return: (x, y) in widget pixels of a position in slice pixels
+        """
+        source = self.source_rect()
+        x_scale, y_scale = self.scale()
+        return (x - source.left()) * x_scale, (y - source.top()) * y_scale
+
+    def image_rect_to_widget(self, top, bottom, left, right):
+        """
+        :return: QRectF in widget pixels of half-open bounds in slice pixels
+        """
+        x0, y0 = self.to_widget(left, top)
+        x1, y1 = self.to_widget(right, bottom)
+        return QRectF(x0, y0, x1 - x0, y1 - y0)
+
+    def zoom_at(self, pos, factor):
+        """
+        Zoom by a factor, keeping the slice pixel under pos in place.
+        :param pos: QPoint in widget pixels
+        """
+        x, y = self.to_image(pos)
+        self.zoom = min(max(self.zoom * factor, 1.0), MAX_ZOOM)
+        x_scale, y_scale = self.scale()
+        self.center_x = x + (self.widget_width / 2 - pos.x()) / x_scale
+        self.center_y = y + (self.widget_height / 2 - pos.y()) / y_scale
+        self.clamp()
+
+    def pan(self, dx, dy):
+        """
+        Move the slice along with a drag of (dx, dy) widget pixels.
+        """
+        x_scale, y_scale = self.scale()
+        self.center_x -= dx / x_scale
+        self.center_y -= dy / y_scale
+        self.clamp()
+
+    def level(self, coarsest):
+        """
+        :param coarsest: Coarsest pyramid level available
+        :return: Pyramid level whose pixels are closest to, but not smaller than, one widget pixel
+        """
+        pixels_per_widget_pixel = 1 / min(self.scale())
+        if pixels_per_widget_pixel < 2:
+            return 0
+        return min(int(math.floor(math.log2(pixels_per_widget_pixel))), coarsest)
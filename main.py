@@ -1,11 +1,30 @@
 # main.py
-from windows.main_window import MainWindow
-from windows.init_window import InitWindow
-from PyQt5.QtWidgets import QApplication
+from utils.profiling_utils.profiler import DEFAULT_TRACE_PATH, profiler
+import argparse
 import sys
 
-def main():
-    app = QApplication(sys.argv)  # Init QApplication
+def run_gui(argv):
+    """
+    Start the segmentation GUI.
+    :param argv: Command line arguments, unknown ones are passed to Qt
+    """
+    # Imported here, so the batch command runs without Qt
+    from windows.main_window import MainWindow
+    from windows.init_window import InitWindow
+    from workers.worker_thread import shutdown_workers
+    from PyQt5.QtWidgets import QApplication
+
+    parser = argparse.ArgumentParser(description="NIfTI Segmentation", epilog="Run 'main.py batch --help' for the headless batch checks.")
+    parser.add_argument("--session", action="store_true", help="Keep the labels in a memory-mapped working file next to the image")
+    parser.add_argument("--profile", nargs='?', const=DEFAULT_TRACE_PATH, metavar="TRACE",
+                        help=f"Record profiling spans and write them as a Chrome trace at exit (default {DEFAULT_TRACE_PATH})")
+    args, qt_args = parser.parse_known_args(argv)
+    if args.profile:
+        profiler.enable(args.profile)
+
+    app = QApplication(sys.argv[:1] + qt_args)  # Init QApplication
+    app.aboutToQuit.connect(shutdown_workers)  # Stop background loads before Qt tears down
+    app.aboutToQuit.connect(profiler.export_at_exit)
     init_window = InitWindow()  # InitWindow instance
     main_window = None
 
@@ -15,7 +34,7 @@ def main():
         """
         global main_window
         init_window.close()
-        main_window = MainWindow(nifti_file_path)
+        main_window = MainWindow(nifti_file_path, session_mode=args.session)
         main_window.show()
 
     init_window.nifti_loaded.connect(launch_main_window)
@@ -23,5 +42,11 @@ def main():
 
     sys.exit(app.exec_())  # Start the event loop
 
+def main():
+    if sys.argv[1:2] == ['batch']:
+        from batch.study_batch import main as run_batch
+        sys.exit(run_batch(sys.argv[2:]))
+    run_gui(sys.argv[1:])
+
 if __name__ == "__main__":
     main()
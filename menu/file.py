@@ -1,7 +1,5 @@
 # menu/file.py
 from PyQt5.QtWidgets import QFileDialog
-from utils.segmentation_utils.convert_matrix_for_save import save_segmentation_nifti
-import nibabel as nib
 
 def load_nifti(main_window):
     options = QFileDialog.Options()
@@ -24,13 +22,10 @@ def load_segmentation(main_window):
         "NIfTI Files (*.nii *.nii.gz)",
         options=options
     )
-    if file_path:
-        nifti_img = nib.load(file_path)
-        return nifti_img.get_fdata()
-    
-    return None
 
-def save_segmentation(main_window, segmentation_matrix, affine, header):
+    return file_path
+
+def save_segmentation(main_window):
     options = QFileDialog.Options()
     file_path, _ = QFileDialog.getSaveFileName(
         main_window,
@@ -39,10 +34,17 @@ def save_segmentation(main_window, segmentation_matrix, affine, header):
         "NIfTI Files (*.nii.gz)",
         options=options
     )
-    if file_path:
-        save_segmentation_nifti(
-            segmentation_matrix,
-            affine,
-            header,
-            file_path
-        )
+
+    return file_path
+
+def save_trace(main_window):
+    options = QFileDialog.Options()
+    file_path, _ = QFileDialog.getSaveFileName(
+        main_window,
+        "Export Profiling Trace",
+        "",
+        "Chrome Trace Files (*.json)",
+        options=options
+    )
+
+    return file_path
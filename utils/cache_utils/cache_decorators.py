@@ -1,32 +1,190 @@
 # utils/cache_utils/cache_decorators.py
-from functools import wraps
+from utils.profiling_utils.profiler import profiler
+from collections import OrderedDict
+from functools import update_wrapper
+import sys
+import threading
 
-def slice_cache(maxsize=100):
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def estimate_nbytes(value):
+    """
+    Memory held by a cached value: numpy arrays, QImages or anything else.
+    """
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if hasattr(value, 'sizeInBytes'):
+        return int(value.sizeInBytes())
+    if hasattr(value, 'byteCount'):
+        return int(value.byteCount())
+    return sys.getsizeof(value)
+
+class SliceCache:
+    """
+    Thread-safe LRU cache of per-slice values bounded by their total size in bytes.
+
+    Keys are (slice_index, args). Every clear() starts a new generation and every
+    invalidate() bumps the version of that slice; a value computed under an older
+    generation or slice version is returned to its caller but never stored, so a
+    render that races with an edit or a new volume cannot bring back stale data.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, sizeof=estimate_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (value, nbytes), least recently used first
+        self.slice_keys = {}  # slice_index -> set of keys
+        self.slice_versions = {}  # slice_index -> number of invalidations
+        self.generation = 0
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def token(self, slice_index):
+        """
+        :return: Token to pass to put() for a value computed from the current data
+        """
+        with self.lock:
+            return self.generation, self.slice_versions.get(slice_index, 0)
+
+    def get(self, key):
+        """
+        :return: (found, value)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, value, token):
+        """
+        Store a value unless its token is stale or it exceeds the whole budget.
+        :return: The cached value for key (an equal entry stored meanwhile wins)
+        """
+        nbytes = self.sizeof(value)
+        with self.lock:
+            if token != (self.generation, self.slice_versions.get(key[0], 0)) or nbytes > self.max_bytes:
+                return value
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]  # Another thread computed it first
+
+            self.entries[key] = (value, nbytes)
+            self.slice_keys.setdefault(key[0], set()).add(key)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+            return value
+
+    def _remove(self, key):
+        _, nbytes = self.entries.pop(key)
+        self.total_bytes -= nbytes
+        keys = self.slice_keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.slice_keys[key[0]]
+
+    def invalidate(self, slice_index, keep=None):
+        """
+        Drop every cached entry of a slice, whatever its size or other args.
+        :param keep: Optional args tuple of one entry to keep, e.g. one updated in place
+        """
+        with self.lock:
+            for key in list(self.slice_keys.get(slice_index, ())):
+                if key[1] != keep:
+                    self._remove(key)
+            self.slice_versions[slice_index] = self.slice_versions.get(slice_index, 0) + 1
+
+    def clear(self):
+        """
+        Drop everything and start a new generation, e.g. for a newly loaded volume.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.slice_keys.clear()
+            self.slice_versions.clear()
+            self.total_bytes = 0
+            self.generation += 1
+
+    def info(self):
+        """
+        :return: Dict with hit, miss and eviction counters and the current footprint
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'generation': self.generation,
+            }
+
+class BoundSliceCache:
+    """
+    A slice_cache method bound to one instance, with its cache controls.
+    """
+
+    def __init__(self, func, instance, cache):
+        self.func = func
+        self.instance = instance
+        self.cache = cache
+        update_wrapper(self, func)
+
+    def __call__(self, slice_index, *args):
+        key = (slice_index, args)
+        found, value = self.cache.get(key)
+        if found:
+            if profiler.enabled:
+                profiler.instant(self.func.__name__, 'cache hit', {'key': repr(key)})
+            return value
+
+        token = self.cache.token(slice_index)
+        with profiler.span(self.func.__name__, 'cache miss', {'key': repr(key)} if profiler.enabled else None):
+            value = self.func(self.instance, slice_index, *args)  # Runs outside the lock
+        return self.cache.put(key, value, token)
+
+    def cache_clear(self):
+        self.cache.clear()
+
+    def cache_invalidate(self, slice_index, keep=None):
+        self.cache.invalidate(slice_index, keep)
+
+    def cache_info(self):
+        return self.cache.info()
+
+class slice_cache:
     """
     Decorator to create a cache for each slice.
+    Each instance gets its own SliceCache, so cached values never outlive their
+    owner the way functools.lru_cache on a method keeps `self` alive. Safe to call
+    from prefetch threads; the wrapped method runs outside the lock.
     """
-    def decorator(func):
-        cache = {}
-        
-        @wraps(func)
-        def wrapper(self, slice_index, *args):
-            key = (slice_index, args)
-            if key not in cache:
-                if len(cache) >= maxsize:
-                    cache.pop(next(iter(cache)))
-                cache[key] = func(self, slice_index, *args)
-            return cache[key]
-
-        def cache_clear():
-            cache.clear()
-
-        def cache_invalidate(slice_index):
-            keys_to_remove = [key for key in cache if key[0] == slice_index]
-            for key in keys_to_remove:
-                del cache[key]
-
-        wrapper.cache_clear = cache_clear
-        wrapper.cache_invalidate = cache_invalidate
-        return wrapper
-
-    return decorator
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, sizeof=estimate_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.lock = threading.Lock()
+
+    def __call__(self, func):
+        self.func = func
+        self.attribute_name = '_slice_cache_' + func.__name__
+        return self
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        cache = instance.__dict__.get(self.attribute_name)
+        if cache is None:
+            with self.lock:
+                cache = instance.__dict__.setdefault(self.attribute_name, SliceCache(self.max_bytes, self.sizeof))
+        return BoundSliceCache(self.func, instance, cache)
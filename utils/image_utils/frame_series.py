@@ -0,0 +1,227 @@
+# utils/image_utils/frame_series.py
+from utils.cache_utils.cache_decorators import SliceCache
+from utils.image_utils.lazy_volume import LazyVolume, is_compressed_file, read_exactly
+from utils.profiling_utils.profiler import profiler
+from nibabel.openers import ImageOpener
+import threading
+import zlib
+import numpy as np
+
+FRAME_CACHE_BYTES = 512 * 1024 * 1024  # Budget for decoded frames
+MIN_CACHED_FRAMES = 3  # Kept whatever the budget: the shown frame and its neighbours
+CHECKPOINT_BYTES = 32 * 1024 * 1024  # Uncompressed distance between gzip restart points
+INPUT_CHUNK_BYTES = 256 * 1024  # Compressed bytes read at a time
+
+def is_series(nifti_img):
+    """
+    :return: True if the image has more than three dimensions, e.g. a time series or multi-echo scan
+    """
+    return len(nifti_img.shape) > 3
+
+class InflateState:
+    """
+    Position in a gzip stream: the inflater, where its input continues in the file
+    and how many uncompressed bytes it has produced.
+    """
+    __slots__ = ('decompressor', 'file_offset', 'position', 'pending')
+
+    def __init__(self, decompressor, file_offset, position, pending):
+        self.decompressor = decompressor
+        self.file_offset = file_offset
+        self.position = position
+        self.pending = pending  # Input read from the file but not consumed yet
+
+    def copy(self):
+        return InflateState(self.decompressor.copy(), self.file_offset, self.position, self.pending)
+
+class GzipFrameReader:
+    """
+    Random reads of the uncompressed bytes of a gzip file.
+
+    Reads going forward continue the live stream. Going back (or far ahead) restarts
+    from the nearest checkpoint, a copy of the inflater state taken every
+    checkpoint_bytes of output on the way, so no read decodes more than that before
+    its data. Concatenated gzip members, as written by write_segmentation_nifti, are followed.
+    """
+
+    def __init__(self, file_path, checkpoint_bytes=CHECKPOINT_BYTES):
+        self.file = open(file_path, 'rb')
+        self.checkpoint_bytes = checkpoint_bytes
+        self.lock = threading.Lock()
+        self.checkpoints = [InflateState(zlib.decompressobj(31), 0, 0, b'')]  # wbits 31: gzip container
+        self.state = self.checkpoints[0].copy()
+
+    def close(self):
+        self.file.close()
+
+    def read_into(self, position, buffer):
+        """
+        Fill a writable uint8 buffer with the uncompressed bytes starting at position.
+        """
+        with self.lock:
+            if position < self.state.position or position - self.state.position > self.checkpoint_bytes:
+                checkpoint = max((state for state in self.checkpoints if state.position <= position), key=lambda state: state.position)
+                if position < self.state.position or checkpoint.position > self.state.position:
+                    self.state = checkpoint.copy()
+            while self.state.position < position:
+                if not self.inflate(min(position - self.state.position, INPUT_CHUNK_BYTES * 4)):
+                    raise EOFError("NIfTI data ended before the frame")
+            filled = 0
+            while filled < len(buffer):
+                data = self.inflate(len(buffer) - filled)
+                if not data:
+                    raise EOFError("NIfTI data ended before the frame was complete")
+                buffer[filled:filled + len(data)] = np.frombuffer(data, dtype=np.uint8)
+                filled += len(data)
+
+    def inflate(self, max_length):
+        """
+        Decode up to max_length bytes at the current position, taking checkpoints on the way.
+        :return: The bytes, empty at the end of the file
+        """
+        state = self.state
+        while True:
+            if not state.pending:
+                self.file.seek(state.file_offset)
+                state.pending = self.file.read(INPUT_CHUNK_BYTES)
+                state.file_offset += len(state.pending)
+                if not state.pending:
+                    return b''
+            data = state.decompressor.decompress(state.pending, max_length)
+            if state.decompressor.eof:
+                state.pending = state.decompressor.unused_data
+                state.decompressor = zlib.decompressobj(31)  # Next gzip member
+            else:
+                state.pending = state.decompressor.unconsumed_tail
+            if data:
+                state.position += len(data)
+                if state.position >= self.checkpoints[-1].position + self.checkpoint_bytes:
+                    self.checkpoints.append(state.copy())
+                return data
+
+class StreamFrameReader:
+    """
+    Reads of the uncompressed bytes of other compressed files (bz2, zstd) through
+    nibabel's opener. Going back reopens the file and decodes from its start.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.opener = None
+        self.position = 0
+
+    def close(self):
+        if self.opener is not None:
+            self.opener.close()
+
+    def read_into(self, position, buffer):
+        with self.lock:
+            if self.opener is None or position < self.position:
+                self.close()
+                self.opener = ImageOpener(self.file_path, 'rb')
+                self.position = 0
+            self.opener.seek(position)  # Forward seeks decode and drop
+            read_exactly(self.opener, buffer)
+            self.position = position + len(buffer)
+
+class FrameSeries:
+    """
+    A 4D NIfTI (time series, multi-echo) whose 3D frames are decoded on demand.
+
+    Every axis past the third is flattened into one frame index. An uncompressed
+    .nii is memory-mapped and a frame is a view of it; a compressed file is read
+    through a seekable reader, one frame at a time. Decoded frames are kept in an
+    LRU bounded by FRAME_CACHE_BYTES, so memory depends on the frames cached, not
+    on the length of the series. Frames are LazyVolumes sharing the intensity
+    statistics of a reference frame, so one window applies to the whole series.
+    """
+
+    def __init__(self, nifti_img, max_cached_bytes=FRAME_CACHE_BYTES):
+        """
+        :param nifti_img: Loaded nibabel image, its data is not read yet
+        """
+        dataobj = nifti_img.dataobj
+        self.affine = nifti_img.affine
+        self.header = nifti_img.header
+        self.file_path = getattr(dataobj, 'file_like', None)
+        self.offset = getattr(dataobj, 'offset', 0)
+        self.slope = float(getattr(dataobj, 'slope', 1.0))
+        self.inter = float(getattr(dataobj, 'inter', 0.0))
+        self.dtype = np.dtype(dataobj.dtype)
+        self.frame_shape = tuple(int(length) for length in dataobj.shape[:3])
+        self.num_frames = int(np.prod(dataobj.shape[3:]))
+        self.frame_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+
+        self.reader = None
+        self.raw_data = None  # (x, y, z, frames) array or memory map when frames are views
+        if is_compressed_file(self.file_path):
+            if self.file_path.lower().endswith('.gz'):
+                self.reader = GzipFrameReader(self.file_path)
+            else:
+                self.reader = StreamFrameReader(self.file_path)
+        elif hasattr(dataobj, 'get_unscaled'):
+            self.raw_data = dataobj.get_unscaled().reshape(self.frame_shape + (self.num_frames,), order='F')
+        else:
+            self.raw_data = np.asanyarray(dataobj).reshape(self.frame_shape + (self.num_frames,), order='F')
+            self.dtype = self.raw_data.dtype
+            self.slope, self.inter = 1.0, 0.0  # In-memory data is scaled already
+
+        self.frames = SliceCache(max(max_cached_bytes, MIN_CACHED_FRAMES * self.frame_bytes), sizeof=self.frame_nbytes)
+        self.reference = None  # Frame whose intensity statistics the others share
+
+    @staticmethod
+    def frame_nbytes(volume):
+        if isinstance(volume.raw_data, np.memmap):
+            return 0  # Pages of the mapped file, not heap memory
+        return volume.raw_data.nbytes
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+
+    def set_reference(self, volume):
+        """
+        Use the intensity range and histogram of a loaded frame for every frame.
+        """
+        self.reference = volume
+        self.frames.clear()  # Frames decoded before have no statistics
+        self.frames.put((volume.frame_index, ()), volume, self.frames.token(volume.frame_index))
+
+    def cached_frame(self, frame_index):
+        """
+        :return: The decoded frame, or None if it is not in the cache
+        """
+        found, volume = self.frames.get((frame_index, ()))
+        return volume if found else None
+
+    def frame(self, frame_index):
+        """
+        Decode a frame, or return it from the cache. Safe to call from worker threads.
+        :return: LazyVolume of the frame
+        """
+        key = (frame_index, ())
+        found, volume = self.frames.get(key)
+        if found:
+            return volume
+
+        token = self.frames.token(frame_index)
+        with profiler.span('decode frame', 'decode', {'frame': frame_index} if profiler.enabled else None):
+            volume = self.decode_frame(frame_index)
+        return self.frames.put(key, volume, token)
+
+    def decode_frame(self, frame_index):
+        if self.raw_data is not None:
+            raw_frame = self.raw_data[..., frame_index]  # A view
+        else:
+            raw_frame = np.empty(self.frame_shape, dtype=self.dtype, order='F')
+            self.reader.read_into(self.offset + frame_index * self.frame_bytes, raw_frame.reshape(-1, order='F').view(np.uint8))
+
+        volume = LazyVolume.from_array(raw_frame, self.affine, self.header, self.slope, self.inter)
+        volume.series = self
+        volume.frame_index = frame_index
+        if self.reference is not None:
+            volume.min_value = self.reference.min_value
+            volume.max_value = self.reference.max_value
+            volume.histogram = self.reference.histogram
+        return volume
@@ -0,0 +1,82 @@
+# utils/image_utils/histogram.py
+import numpy as np
+
+BINNED_BINS = 65536  # Bins over the value range of float and 32/64-bit volumes, as fine as 16-bit data
+
+def unsigned_view_dtype(dtype):
+    """
+    Unsigned integer dtype of the same size and byte order, to index tables by raw bytes.
+    """
+    return np.dtype(f'u{dtype.itemsize}').newbyteorder(dtype.byteorder)
+
+class IntensityHistogram:
+    """
+    Voxel counts over raw (stored, unscaled) values, accumulated chunk by chunk.
+
+    Integer volumes of up to 16 bits get one bin per possible value, indexed by the
+    unsigned view of the raw bytes, so counting is a single bincount and exact. Other
+    dtypes are binned evenly over their value range.
+    """
+
+    def __init__(self, counts, bin_values):
+        """
+        :param counts: int64 numpy array of voxel counts per bin
+        :param bin_values: Raw value represented by each bin
+        """
+        self.counts = counts
+        self.bin_values = bin_values
+        self.order = np.argsort(bin_values, kind='stable')  # Unsigned-view bins are not sorted for signed dtypes
+
+    @staticmethod
+    def is_exact(dtype):
+        return dtype.kind in 'iu' and dtype.itemsize <= 2
+
+    @classmethod
+    def exact(cls, dtype):
+        """
+        Empty histogram with one bin per value of a small integer dtype.
+        """
+        size = 1 << (8 * dtype.itemsize)
+        bin_values = np.arange(size).astype(unsigned_view_dtype(dtype)).view(dtype).astype(np.float64)
+        return cls(np.zeros(size, dtype=np.int64), bin_values)
+
+    @classmethod
+    def binned(cls, min_value, max_value, bins=BINNED_BINS):
+        """
+        Empty histogram of evenly spaced bins covering [min_value, max_value].
+        """
+        if max_value <= min_value:
+            max_value = min_value + 1
+        edges = np.linspace(min_value, max_value, bins + 1)
+        histogram = cls(np.zeros(bins, dtype=np.int64), (edges[:-1] + edges[1:]) / 2)
+        histogram.range = (float(min_value), float(max_value))
+        return histogram
+
+    def add_exact(self, chunk):
+        """
+        Count a chunk of an exact histogram's dtype.
+        """
+        values = chunk.reshape(-1, order='A').view(unsigned_view_dtype(chunk.dtype))
+        self.counts += np.bincount(values, minlength=len(self.counts))
+
+    def add_binned(self, chunk):
+        """
+        Count a chunk into evenly spaced bins, ignoring NaN and infinite values.
+        """
+        values = chunk.reshape(-1, order='A')
+        if values.dtype.kind == 'f':
+            values = values[np.isfinite(values)]
+        counts, _ = np.histogram(values, bins=len(self.counts), range=self.range)
+        self.counts += counts
+
+    def percentile(self, q):
+        """
+        :param q: Percentile in [0, 100]
+        :return: Raw value below which q percent of the voxels lie
+        """
+        sorted_counts = np.cumsum(self.counts[self.order])
+        total = sorted_counts[-1]
+        if total == 0:
+            return 0.0
+        index = min(np.searchsorted(sorted_counts, q / 100 * total), len(sorted_counts) - 1)
+        return float(self.bin_values[self.order[index]])
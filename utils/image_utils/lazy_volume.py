@@ -0,0 +1,253 @@
+# utils/image_utils/lazy_volume.py
+from utils.image_utils.histogram import IntensityHistogram
+from utils.image_utils.orientation import display_axes, display_shape
+from utils.profiling_utils.profiler import profiler
+from nibabel.openers import ImageOpener
+from nibabel.volumeutils import apply_read_scaling
+import numpy as np
+
+CHUNK_BYTES = 8 * 1024 * 1024  # Upper bound for one streamed block while loading the volume
+
+def is_compressed_file(file_like):
+    """
+    :param file_like: File name (or None for in-memory images)
+    :return: True if nibabel would open the file through a decompressor
+    """
+    if not isinstance(file_like, str):
+        return False
+    return any(file_like.lower().endswith(ext) for ext in ImageOpener.compress_ext_map if ext)
+
+def read_exactly(opener, buffer):
+    """
+    Fill a writable uint8 buffer from a (possibly compressed) stream.
+    """
+    filled = 0
+    while filled < len(buffer):
+        count = opener.readinto(buffer[filled:])
+        if not count:
+            raise EOFError("NIfTI data ended before the volume was complete")
+        filled += count
+
+def iter_slabs(nifti_img, chunk_bytes=CHUNK_BYTES):
+    """
+    Stream the voxels of a NIfTI in slabs along the last stored axis, which is
+    contiguous on disk, without ever holding the whole volume. A compressed file is
+    decoded once, in order.
+    :param nifti_img: Loaded nibabel image, its data is not read yet
+    :param chunk_bytes: Approximate size of one slab
+    :return: Generator of (start, slab), the slab in stored orientation and dtype
+             (float only when the header scales)
+    """
+    dataobj = nifti_img.dataobj
+    shape = dataobj.shape
+    slope = float(getattr(dataobj, 'slope', 1.0))
+    inter = float(getattr(dataobj, 'inter', 0.0))
+    file_like = getattr(dataobj, 'file_like', None)
+    slice_bytes = max(1, int(np.prod(shape[:-1])) * np.dtype(dataobj.dtype).itemsize)
+    step = max(1, chunk_bytes // slice_bytes)
+
+    if not isinstance(file_like, str) or getattr(dataobj, 'order', 'F') != 'F':
+        data = np.asanyarray(dataobj)  # In-memory image, nothing to stream
+        for start in range(0, shape[-1], step):
+            yield start, data[..., start:start + step]
+        return
+
+    with ImageOpener(file_like, 'rb') as opener:
+        opener.seek(dataobj.offset)
+        for start in range(0, shape[-1], step):
+            slab = np.empty(shape[:-1] + (min(step, shape[-1] - start),), dtype=dataobj.dtype, order='F')
+            read_exactly(opener, slab.reshape(-1, order='F').view(np.uint8))  # F-ordered slab is one run of bytes
+            if slope != 1.0 or inter != 0.0:
+                slab = apply_read_scaling(slab, slope, inter)
+            yield start, slab
+
+class LazyVolume:
+    """
+    Read-only NIfTI volume in display orientation that decodes slices on demand.
+
+    The voxels stay in their stored dtype and orientation. For an uncompressed .nii
+    the raw array is a memory map, so only the pages of the requested slice are read
+    and peak memory is one slice in native dtype plus its normalized copy. Compressed
+    files cannot be read at random offsets, so a .nii.gz is streamed once, in order,
+    into a native-dtype array (no float64 copy). Scaling from scl_slope/scl_inter is
+    applied per slice.
+
+    Creating the object only parses the header; iter_load() does the I/O.
+    """
+
+    def __init__(self, nifti_img):
+        """
+        :param nifti_img: Loaded nibabel image, its data is not read yet
+        """
+        dataobj = nifti_img.dataobj
+        self.affine = nifti_img.affine
+        self.header = nifti_img.header
+        self.slope = float(getattr(dataobj, 'slope', 1.0))
+        self.inter = float(getattr(dataobj, 'inter', 0.0))
+        self.file_like = getattr(dataobj, 'file_like', None)
+        self.offset = getattr(dataobj, 'offset', 0)
+
+        if is_compressed_file(self.file_like):
+            # Filled in order by iter_load, zero pages cost nothing until written
+            self.raw_data = np.zeros(dataobj.shape, dtype=dataobj.dtype, order='F')
+            self.loaded_length = 0
+        elif hasattr(dataobj, 'get_unscaled'):
+            self.raw_data = dataobj.get_unscaled()  # Memory map for an uncompressed .nii
+            self.loaded_length = self.raw_data.shape[-1]
+        else:
+            self.raw_data = np.asanyarray(dataobj)
+            self.slope = self.inter = None
+            self.loaded_length = self.raw_data.shape[-1]
+
+        self.init_display()
+
+    @classmethod
+    def from_array(cls, raw_data, affine, header, slope=1.0, inter=0.0):
+        """
+        Wrap voxels that are already in memory (or memory-mapped), e.g. one decoded
+        frame of a FrameSeries. iter_load() then only scans the intensities.
+        :param raw_data: 3D numpy array in stored orientation and dtype, without header scaling
+        """
+        volume = cls.__new__(cls)
+        volume.affine = affine
+        volume.header = header
+        volume.slope = slope
+        volume.inter = inter
+        volume.file_like = None
+        volume.offset = 0
+        volume.raw_data = raw_data
+        volume.loaded_length = raw_data.shape[-1]
+        volume.init_display()
+        return volume
+
+    def init_display(self):
+        self.axes = display_axes(self.affine)
+        self.shape = display_shape(self.raw_data.shape, self.axes)
+        self.min_value = None  # Known once iter_load has seen every voxel
+        self.max_value = None
+        self.histogram = None  # IntensityHistogram of the raw values, also known once loaded
+        self.series = None  # FrameSeries this volume is a frame of, if any
+        self.frame_index = None
+
+    @property
+    def is_scaled(self):
+        return self.slope is not None and (self.slope != 1.0 or self.inter != 0.0)
+
+    @property
+    def is_loaded(self):
+        return self.min_value is not None
+
+    def scale(self, raw_values):
+        """
+        Apply the header scaling to raw voxel values.
+        """
+        if not self.is_scaled:
+            return raw_values
+        return apply_read_scaling(raw_values, self.slope, self.inter)
+
+    def iter_load(self, chunk_bytes=CHUNK_BYTES):
+        """
+        Decode (compressed files) and scan the intensity range and histogram in slabs
+        along the last stored axis, which is contiguous on disk. Peak extra memory is
+        one slab. Small integer dtypes are counted exactly while streaming; others are
+        binned in a second pass over the decoded data once the range is known.
+        :param chunk_bytes: Approximate size of one slab
+        :return: Generator yielding the loaded fraction after every slab
+        """
+        last_axis_length = self.raw_data.shape[-1]
+        slice_bytes = max(1, self.raw_data[..., :1].nbytes)
+        step = max(1, chunk_bytes // slice_bytes)
+        min_value = None
+        max_value = None
+        exact = IntensityHistogram.is_exact(self.raw_data.dtype)
+        histogram = IntensityHistogram.exact(self.raw_data.dtype) if exact else None
+
+        opener = None
+        if self.loaded_length < last_axis_length:
+            opener = ImageOpener(self.file_like, 'rb')
+            opener.seek(self.offset)
+
+        try:
+            for start in range(0, last_axis_length, step):
+                chunk = self.raw_data[..., start:start + step]
+                if opener is not None:
+                    with profiler.span('decode slab', 'load', {'start': start}):
+                        read_exactly(opener, chunk.reshape(-1, order='F').view(np.uint8))  # F-ordered slab is one run of bytes
+                    self.loaded_length = start + chunk.shape[-1]
+
+                if exact:
+                    histogram.add_exact(chunk)
+                chunk_min = np.nanmin(chunk)
+                chunk_max = np.nanmax(chunk)
+                min_value = chunk_min if min_value is None else min(min_value, chunk_min)
+                max_value = chunk_max if max_value is None else max(max_value, chunk_max)
+                yield (start + chunk.shape[-1]) / last_axis_length
+        finally:
+            if opener is not None:
+                opener.close()
+
+        if not exact:
+            histogram = IntensityHistogram.binned(float(min_value), float(max_value))
+            for start in range(0, last_axis_length, step):
+                histogram.add_binned(self.raw_data[..., start:start + step])
+
+        self.histogram = histogram
+        scaled = self.scale(np.array([min_value, max_value], dtype=np.float64))
+        self.min_value, self.max_value = float(np.min(scaled)), float(np.max(scaled))
+
+    def load(self):
+        """
+        Run iter_load to completion.
+        :return: self
+        """
+        for _ in self.iter_load():
+            pass
+        return self
+
+    def is_slice_loaded(self, slice_index):
+        """
+        :param slice_index: Index along display axis 2
+        :return: True if the voxels of the slice have been decoded
+        """
+        if self.loaded_length == self.raw_data.shape[-1]:
+            return True
+
+        source_axis, flipped = self.axes[2]
+        if source_axis != self.raw_data.ndim - 1:
+            return False  # The slice spans every slab
+        if flipped:
+            slice_index = self.raw_data.shape[source_axis] - 1 - slice_index
+        return slice_index < self.loaded_length
+
+    def get_slice(self, slice_index):
+        """
+        Read one axial slice in display orientation.
+        :param slice_index: Index along display axis 2
+        :return: C-contiguous 2D numpy array in native dtype (float only when the header scales)
+        """
+        return self.scale(self.get_raw_slice(slice_index))
+
+    def get_raw_slice(self, slice_index):
+        """
+        Read one axial slice in display orientation, without header scaling.
+        :param slice_index: Index along display axis 2
+        :return: C-contiguous 2D numpy array in the stored dtype
+        """
+        source_axis, flipped = self.axes[2]
+        if flipped:
+            slice_index = self.raw_data.shape[source_axis] - 1 - slice_index
+
+        slicer = [slice(None)] * self.raw_data.ndim
+        slicer[source_axis] = slice_index
+        plane = self.raw_data[tuple(slicer)]  # Remaining source axes, in stored order
+
+        (row_axis, row_flipped), (col_axis, col_flipped) = self.axes[0], self.axes[1]
+        if row_axis > col_axis:
+            plane = plane.T
+        if row_flipped:
+            plane = plane[::-1]
+        if col_flipped:
+            plane = plane[:, ::-1]
+
+        with profiler.span('read slice', 'decode'):
+            return np.ascontiguousarray(plane)  # Only this slice is read from disk
@@ -16,6 +16,9 @@ def min_max_normalize(image_data, min_value, max_value):
     if max_value == min_value:
         return np.zeros_like(image_data, dtype=np.uint8) # Prevent division by zero if the image is flat
  
-    normalized_data = 255 * (image_data - min_value) / (max_value - min_value)
+    # One float32 temporary, scaled in place
+    normalized_data = np.subtract(image_data, min_value, dtype=np.float32)
+    normalized_data *= 255
+    normalized_data /= max_value - min_value
 
     return normalized_data.astype(np.uint8)
@@ -0,0 +1,95 @@
+# utils/image_utils/orientation.py
+from nibabel.orientations import inv_ornt_aff, io_orientation
+import numpy as np
+
+GRID_TOLERANCE = 1e-3  # Largest affine difference (mm) of two voxel grids still counted as the same
+
+def display_axes(affine):
+    """
+    Describe the viewer's display orientation in terms of the stored array axes.
+    The viewer shows np.rot90(as_closest_canonical(img), k=1)[:, ::-1, ::-1];
+    this composes those steps without touching any voxel data.
+    :param affine: Affine matrix of the NIfTI
+    :return: Tuple of (source_axis, flipped) for display axes 0, 1 and 2
+    """
+    ornt = io_orientation(affine)
+
+    # as_closest_canonical: flip source axes, then transpose them into RAS order
+    order = np.argsort(ornt[:, 0])
+    canonical = [(int(order[axis]), bool(ornt[order[axis], 1] == -1)) for axis in range(3)]
+
+    # rot90(k=1) over axes (0, 1): new axis 0 is the flipped axis 1, new axis 1 is axis 0
+    rotated = [(canonical[1][0], not canonical[1][1]), canonical[0], canonical[2]]
+
+    # [:, ::-1, ::-1]
+    return (
+        rotated[0],
+        (rotated[1][0], not rotated[1][1]),
+        (rotated[2][0], not rotated[2][1]),
+    )
+
+def display_shape(shape, axes):
+    """
+    :param shape: Shape of the stored array
+    :param axes: Result of display_axes
+    :return: Shape of the volume in display orientation
+    """
+    return tuple(shape[source_axis] for source_axis, _ in axes)
+
+def display_spacing(zooms, axes):
+    """
+    :param zooms: Voxel sizes of the stored axes, e.g. header.get_zooms()
+    :param axes: Result of display_axes
+    :return: Voxel size along display axes 0, 1 and 2; 1 where the header has none
+    """
+    zooms = tuple(zooms[:3]) + (1.0,) * (3 - len(zooms[:3]))
+    return tuple(float(zooms[source_axis]) if zooms[source_axis] > 0 else 1.0 for source_axis, _ in axes)
+
+def to_display(array, axes):
+    """
+    Reorient a stored array into display orientation as a view, without copying.
+    :param array: Numpy array in stored orientation
+    :param axes: Result of display_axes
+    :return: Numpy view in display orientation
+    """
+    view = np.transpose(array, [source_axis for source_axis, _ in axes] + list(range(3, array.ndim)))
+    flips = tuple(slice(None, None, -1) if flipped else slice(None) for _, flipped in axes)
+    return view[flips]
+
+def from_display(array, axes):
+    """
+    Inverse of to_display: bring a display-oriented array back to stored orientation as a view.
+    :param array: Numpy array in display orientation
+    :param axes: Result of display_axes
+    :return: Numpy view in stored orientation
+    """
+    flips = tuple(slice(None, None, -1) if flipped else slice(None) for _, flipped in axes)
+    inverse = np.argsort([source_axis for source_axis, _ in axes])
+    return np.transpose(array[flips], list(inverse) + list(range(3, array.ndim)))
+
+def canonical_grid(affine, shape):
+    """
+    Voxel grid of a volume after reorienting it to the closest canonical (RAS+) orientation.
+    Two volumes with equal canonical grids cover the same voxels, even when they are
+    stored with different axis orders or flips.
+    :param affine: Affine matrix of the NIfTI
+    :param shape: Shape of the stored array (only the first three axes are used)
+    :return: (canonical shape, canonical affine)
+    """
+    ornt = io_orientation(affine)
+    canonical_shape = [0, 0, 0]
+    for source_axis, (target_axis, _) in enumerate(ornt):
+        canonical_shape[int(target_axis)] = int(shape[source_axis])
+    return tuple(canonical_shape), affine @ inv_ornt_aff(ornt, shape[:3])
+
+def grid_difference(affine, shape, other_affine, other_shape):
+    """
+    Compare the voxel grids of two volumes, whatever orientation each is stored in.
+    :param shape: Shape of the stored array (only the first three axes are used)
+    :return: Largest difference between the canonical affines, or None if the grids differ in shape
+    """
+    grid_shape, grid_affine = canonical_grid(affine, shape)
+    other_grid_shape, other_grid_affine = canonical_grid(other_affine, other_shape)
+    if grid_shape != other_grid_shape:
+        return None
+    return float(np.abs(grid_affine - other_grid_affine).max())
@@ -0,0 +1,120 @@
+# utils/image_utils/plane_volume.py
+from utils.image_utils.orientation import to_display
+import threading
+import numpy as np
+
+# Display axis a view scrolls through -> (row axis, col axis) of its planes, superior up
+PLANE_AXES = {
+    2: (0, 1),  # Axial
+    0: (2, 1),  # Coronal
+    1: (2, 0),  # Sagittal
+}
+TRANSPOSED_COPY_BYTES = 512 * 1024 * 1024  # Largest volume given a contiguous copy per view axis
+COPY_BLOCK_SLICES = 16  # Slices transposed per block while building the copy
+
+def plane_permutation(view_axis):
+    """
+    :param view_axis: Display axis the view scrolls through
+    :return: Display axes of the view's (rows, cols, slices)
+    """
+    row_axis, col_axis = PLANE_AXES[view_axis]
+    return row_axis, col_axis, view_axis
+
+def to_view_box(box, permutation):
+    """
+    :param box: (y_min, y_max, x_min, x_max, z_min, z_max) half-open box in display orientation
+    :param permutation: Result of plane_permutation
+    :return: The same box in the view's (rows, cols, slices)
+    """
+    return tuple(bound for axis in permutation for bound in box[2 * axis:2 * axis + 2])
+
+def to_display_box(view_box, permutation):
+    """
+    Inverse of to_view_box.
+    """
+    box = [0] * 6
+    for view_axis, axis in enumerate(permutation):
+        box[2 * axis:2 * axis + 2] = view_box[2 * view_axis:2 * view_axis + 2]
+    return tuple(box)
+
+class PlaneVolume:
+    """
+    A LazyVolume seen through another display axis, e.g. as coronal slices.
+
+    Shape and get_slice follow the view, (rows, cols, slices), so a Canvas shows it
+    like an axial volume; everything else is the wrapped volume's. Slices across the
+    stored layout are strided gathers through the whole file. Once the volume has
+    loaded, build_slices() makes a contiguous copy with the view's slices outermost,
+    if it fits the memory budget, and slices are served from it from then on.
+    """
+
+    def __init__(self, volume, view_axis, copy_budget=TRANSPOSED_COPY_BYTES):
+        """
+        :param volume: LazyVolume in display orientation
+        :param view_axis: Display axis the view scrolls through
+        :param copy_budget: Largest contiguous copy build_slices may make, in bytes
+        """
+        self.volume = volume
+        self.view_axis = view_axis
+        self.permutation = plane_permutation(view_axis)
+        self.shape = tuple(volume.shape[axis] for axis in self.permutation)
+        self.copy_budget = copy_budget
+        self.slices = None  # (slices, rows, cols) contiguous copy once built
+        self.cancelled = threading.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.volume, name)  # Header, affine, scaling, range and histogram
+
+    def view_data(self):
+        """
+        :return: (rows, cols, slices) view of the stored voxels, without copying
+        """
+        return to_display(self.volume.raw_data, self.volume.axes).transpose(self.permutation)
+
+    def fits_budget(self):
+        return self.volume.raw_data.nbytes <= self.copy_budget
+
+    def is_slice_loaded(self, slice_index):
+        return self.volume.is_loaded  # Every view slice crosses every slab of the file
+
+    def get_slice(self, slice_index):
+        """
+        :return: C-contiguous 2D numpy array in native dtype (float only when the header scales)
+        """
+        return self.volume.scale(self.get_raw_slice(slice_index))
+
+    def get_raw_slice(self, slice_index):
+        """
+        :return: C-contiguous 2D numpy array in the stored dtype, without header scaling
+        """
+        slices = self.slices
+        if slices is not None:
+            return slices[slice_index]
+        return np.ascontiguousarray(self.view_data()[:, :, slice_index])
+
+    def build_slices(self):
+        """
+        Copy the volume into the view's slice-major layout, a block of slices at a time
+        so the source is read in runs. Call from a worker once the volume has loaded;
+        cancel() stops it between blocks.
+        :return: True if the copy is in use
+        """
+        if self.slices is not None:
+            return True
+        if not self.volume.is_loaded or not self.fits_budget():
+            return False
+
+        source = self.view_data()
+        rows, cols, num_slices = source.shape
+        slices = np.empty((num_slices, rows, cols), dtype=source.dtype)
+        for start in range(0, num_slices, COPY_BLOCK_SLICES):
+            if self.cancelled.is_set():
+                return False
+            stop = min(start + COPY_BLOCK_SLICES, num_slices)
+            slices[start:stop] = source[:, :, start:stop].transpose(2, 0, 1)
+
+        self.slices = slices  # Same values as the strided reads, so cached slices stay valid
+        return True
+
+    def cancel(self):
+        self.cancelled.set()
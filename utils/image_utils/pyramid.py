@@ -0,0 +1,69 @@
+# utils/image_utils/pyramid.py
+import math
+import numpy as np
+
+TILE_SIZE = 256  # Edge of one rendered tile, in pixels of its pyramid level
+
+def max_level(shape):
+    """
+    :param shape: (rows, cols) of the full-resolution slice
+    :return: Coarsest pyramid level worth building, where the slice fits one tile
+    """
+    if max(shape) <= TILE_SIZE:
+        return 0
+    return math.ceil(math.log2(max(shape) / TILE_SIZE))
+
+def downsample_slice(data):
+    """
+    Halve a slice by averaging 2x2 blocks, one pyramid level down.
+    Odd edges repeat their last row or column. Integer slices stay in their dtype,
+    so the window lookup tables still apply.
+    :param data: 2D numpy array
+    :return: 2D numpy array of shape ceil(rows / 2), ceil(cols / 2)
+    """
+    rows, cols = data.shape
+    if rows % 2 or cols % 2:
+        data = np.pad(data, ((0, rows % 2), (0, cols % 2)), mode='edge')
+    work_dtype = np.float64 if data.dtype.itemsize > 2 else np.float32
+    blocks = data.reshape(data.shape[0] // 2, 2, data.shape[1] // 2, 2)
+    mean = blocks.mean(axis=(1, 3), dtype=work_dtype)
+    if data.dtype.kind in 'iu':
+        np.rint(mean, out=mean)
+    return mean.astype(data.dtype)
+
+def tile_bounds(shape, level, row, col):
+    """
+    :param shape: (rows, cols) of the full-resolution slice
+    :return: (top, bottom, left, right) half-open bounds of a tile in full-resolution pixels
+    """
+    size = TILE_SIZE * 2 ** level
+    return row * size, min((row + 1) * size, shape[0]), col * size, min((col + 1) * size, shape[1])
+
+def tiles_covering(shape, level, bounds):
+    """
+    :param shape: (rows, cols) of the full-resolution slice
+    :param bounds: (top, bottom, left, right) in full-resolution pixels, may be fractional
+    :return: List of (row, col) of the tiles at a level overlapping the bounds
+    """
+    size = TILE_SIZE * 2 ** level
+    top, bottom, left, right = bounds
+    rows = range(max(int(top // size), 0), min(math.ceil(bottom / size), math.ceil(shape[0] / size)))
+    cols = range(max(int(left // size), 0), min(math.ceil(right / size), math.ceil(shape[1] / size)))
+    return [(row, col) for row in rows for col in cols]
+
+def tile_of(data, row, col):
+    """
+    :param data: 2D array of a whole pyramid level
+    :return: View of one tile of it
+    """
+    return data[row * TILE_SIZE:(row + 1) * TILE_SIZE, col * TILE_SIZE:(col + 1) * TILE_SIZE]
+
+def label_tile(labels, level, row, col):
+    """
+    Labels are not averaged; a coarse level samples every 2**level-th voxel.
+    :param labels: 2D label slice at full resolution
+    :return: Strided view of one tile at a level
+    """
+    step = 2 ** level
+    size = TILE_SIZE * step
+    return labels[row * size:(row + 1) * size:step, col * size:(col + 1) * size:step]
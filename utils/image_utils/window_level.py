@@ -0,0 +1,71 @@
+# utils/image_utils/window_level.py
+from utils.image_utils.histogram import IntensityHistogram, unsigned_view_dtype
+import numpy as np
+
+AUTO_PERCENTILES = (0.5, 99.5)  # Outliers outside these percentiles do not stretch the contrast
+WINDOW_PRESETS = {  # name -> (width, level) in scaled intensity, Hounsfield units for CT
+    'Brain': (80, 40),
+    'Soft Tissue': (400, 40),
+    'Lung': (1500, -600),
+    'Bone': (1800, 400),
+}
+
+def width_level_to_window(width, level):
+    """
+    :return: (low, high) intensities mapped to black and white
+    """
+    return level - width / 2, level + width / 2
+
+def window_to_width_level(low, high):
+    return high - low, (low + high) / 2
+
+def auto_window(volume, percentiles=AUTO_PERCENTILES):
+    """
+    Window between two percentiles of the volume's histogram.
+    :param volume: Loaded LazyVolume
+    :return: (low, high) in scaled intensity
+    """
+    if volume.histogram is None:
+        return volume.min_value, volume.max_value
+    raw_low, raw_high = (volume.histogram.percentile(q) for q in percentiles)
+    low, high = sorted(float(value) for value in volume.scale(np.array([raw_low, raw_high], dtype=np.float64)))
+    if high <= low:
+        return volume.min_value, volume.max_value
+    return low, high
+
+def window_values(values, low, high):
+    """
+    Map intensities to uint8, low to 0 and high to 255, clipped.
+    """
+    if high <= low:
+        return np.where(values > low, 255, 0).astype(np.uint8)
+
+    # One float32 temporary, scaled and clipped in place
+    windowed = np.subtract(values, low, dtype=np.float32)
+    windowed *= 255 / (high - low)
+    np.clip(windowed, 0, 255, out=windowed)
+    return windowed.astype(np.uint8)
+
+def window_lut(volume, low, high):
+    """
+    Table from every raw value of a small integer volume to its windowed uint8 value,
+    header scaling included, indexed by the unsigned view of the raw bytes.
+    :return: uint8 numpy array of 256 or 65536 entries, or None for other dtypes
+    """
+    dtype = volume.raw_data.dtype
+    if not IntensityHistogram.is_exact(dtype):
+        return None
+    raw_values = np.arange(1 << (8 * dtype.itemsize)).astype(unsigned_view_dtype(dtype)).view(dtype)
+    return window_values(volume.scale(raw_values.astype(np.float64)), low, high)
+
+def apply_window(volume, raw_slice, lut, low, high):
+    """
+    Window one raw slice for display.
+    :param volume: LazyVolume the slice comes from
+    :param raw_slice: C-contiguous raw slice from get_raw_slice
+    :param lut: Table from window_lut, or None to compute in float
+    :return: C-contiguous uint8 numpy array
+    """
+    if lut is not None:
+        return np.take(lut, raw_slice.view(unsigned_view_dtype(raw_slice.dtype)))  # One gather per voxel
+    return window_values(volume.scale(raw_slice), low, high)
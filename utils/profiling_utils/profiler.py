@@ -0,0 +1,163 @@
+# utils/profiling_utils/profiler.py
+from collections import deque
+import json
+import os
+import threading
+import time
+
+PROFILE_ENV = 'PASCAL_PROFILE'  # 1 enables profiling, any other value is also the trace file written at exit
+DEFAULT_TRACE_PATH = 'pascal_trace.json'
+RING_BUFFER_EVENTS = 200000  # Most recent events kept, older ones are dropped
+
+class NullSpan:
+    """
+    Span used while profiling is off; entering and leaving it does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    """
+    Times a with-block and records it as a complete trace event.
+    """
+    __slots__ = ('profiler', 'name', 'category', 'args', 'start')
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        self.profiler.record('X', self.name, self.category, self.start, end - self.start, self.args)
+        return False
+
+class Profiler:
+    """
+    Low-overhead recorder of timing spans, instant events and counters.
+
+    Events are kept as tuples in a bounded ring buffer (appends are thread safe) and
+    only converted when exported as Chrome trace-event JSON, which chrome://tracing
+    and Perfetto open. While disabled, span() returns a shared no-op span and the
+    other calls return at the first check.
+    """
+
+    def __init__(self, enabled=False, capacity=RING_BUFFER_EVENTS):
+        self.enabled = enabled
+        self.events = deque(maxlen=capacity)  # (phase, name, category, start, duration, thread id, args)
+        self.thread_names = {}
+        self.origin = time.perf_counter()
+        self.trace_path = None  # Written by export_at_exit, if set
+
+    def enable(self, trace_path=None):
+        """
+        :param trace_path: Optional file the trace is written to by export_at_exit
+        """
+        self.enabled = True
+        if trace_path is not None:
+            self.trace_path = trace_path
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events.clear()
+
+    def record(self, phase, name, category, start, duration, args):
+        thread = threading.current_thread()
+        if thread.ident not in self.thread_names:
+            self.thread_names[thread.ident] = thread.name
+        self.events.append((phase, name, category, start, duration, thread.ident, args))
+
+    def span(self, name, category='render', args=None):
+        """
+        :return: Context manager timing its block, or a no-op one while disabled
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def instant(self, name, category, args=None):
+        if self.enabled:
+            self.record('i', name, category, time.perf_counter(), 0.0, args)
+
+    def counter(self, name, values):
+        """
+        :param values: Dict of series name to number, drawn as a stacked counter track
+        """
+        if self.enabled:
+            self.record('C', name, 'counter', time.perf_counter(), 0.0, values)
+
+    def summary(self):
+        """
+        :return: Dict of span name to count, total and mean duration in ms, over the buffered events
+        """
+        totals = {}
+        for phase, name, _, _, duration, _, _ in list(self.events):
+            if phase == 'X':
+                count, total = totals.get(name, (0, 0.0))
+                totals[name] = (count + 1, total + duration)
+        return {
+            name: {'count': count, 'total_ms': total * 1000, 'mean_ms': total * 1000 / count}
+            for name, (count, total) in totals.items()
+        }
+
+    def trace_events(self):
+        """
+        :return: List of Chrome trace events, timestamps in microseconds since the profiler started
+        """
+        pid = os.getpid()
+        trace = [
+            {'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in list(self.thread_names.items())
+        ]
+        for phase, name, category, start, duration, tid, args in list(self.events):
+            event = {'ph': phase, 'name': name, 'cat': category, 'pid': pid, 'tid': tid,
+                     'ts': (start - self.origin) * 1e6}
+            if phase == 'X':
+                event['dur'] = duration * 1e6
+            elif phase == 'i':
+                event['s'] = 't'  # Thread scoped
+            if args:
+                event['args'] = args
+            trace.append(event)
+        return trace
+
+    def export_chrome_trace(self, file_path):
+        """
+        Write the buffered events as a Chrome trace-event JSON file.
+        """
+        with open(file_path, 'w') as file:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, file)
+
+    def export_at_exit(self):
+        """
+        Write the trace to the path given when profiling was enabled, if any.
+        """
+        if self.enabled and self.trace_path:
+            self.export_chrome_trace(self.trace_path)
+
+def profiler_from_env():
+    """
+    :return: Profiler configured from the PASCAL_PROFILE environment variable
+    """
+    value = os.environ.get(PROFILE_ENV, '')
+    profiler = Profiler()
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        profiler.enable()
+    elif value and value.lower() not in ('0', 'false', 'no', 'off'):
+        profiler.enable(value)
+    return profiler
+
+profiler = profiler_from_env()  # Shared by the whole application
@@ -0,0 +1,59 @@
+# utils/segmentation_utils/brush_stroke.py
+import numpy as np
+
+def stamp_capsule(slice_matrix, x0, y0, x1, y1, radius, value, on_write=None, spacing=(1.0, 1.0)):
+    """
+    Label the whole area swept by a round brush moving from (x0, y0) to (x1, y1).
+    The swept area is a capsule: every voxel whose center lies within radius of the
+    segment, measured in units of the finer voxel spacing so the brush stays round
+    on anisotropic slices. It is computed over the segment's bounding box in one
+    vectorized pass and applied with a single masked write.
+    :param slice_matrix: 2D numpy view of the slice to update (rows = y, cols = x)
+    :param x0: x-coord of the start point, may be fractional
+    :param y0: y-coord of the start point, may be fractional
+    :param x1: x-coord of the end point, may be fractional
+    :param y1: y-coord of the end point, may be fractional
+    :param radius: Brush radius in voxels, may be fractional
+    :param value: Label value to write, 0 erases
+    :param on_write: Optional callable receiving (old_values, value) right before the write
+    :param spacing: (x, y) voxel size along the columns and rows, e.g. in mm
+    :return: (y_min, y_max, x_min, x_max) half-open voxel bounds of the stroke, or None
+    """
+    height, width = slice_matrix.shape
+    radius = max(radius, 0.5)  # Thinnest brush still covers one voxel per row/column like a line
+    x_weight = spacing[0] / min(spacing)  # Voxels along the coarser axis count for more
+    y_weight = spacing[1] / min(spacing)
+
+    # Bounding box of the capsule, clipped to the slice
+    y_min = max(int(np.ceil(min(y0, y1) - radius / y_weight)), 0)
+    y_max = min(int(np.floor(max(y0, y1) + radius / y_weight)) + 1, height)
+    x_min = max(int(np.ceil(min(x0, x1) - radius / x_weight)), 0)
+    x_max = min(int(np.floor(max(x0, x1) + radius / x_weight)) + 1, width)
+    if y_min >= y_max or x_min >= x_max:
+        return None
+
+    # Work in units of the finer voxel spacing, where the brush is round
+    Y, X = np.ogrid[y_min:y_max, x_min:x_max]
+    if x_weight != 1.0 or y_weight != 1.0:
+        X = X * x_weight
+        Y = Y * y_weight
+        x0, x1 = x0 * x_weight, x1 * x_weight
+        y0, y1 = y0 * y_weight, y1 * y_weight
+    dx = x1 - x0
+    dy = y1 - y0
+    length_sq = dx * dx + dy * dy
+
+    # Project every voxel onto the segment and measure the distance to the closest point
+    if length_sq == 0:
+        dist_sq = (X - x0) ** 2 + (Y - y0) ** 2
+    else:
+        t = np.clip(((X - x0) * dx + (Y - y0) * dy) / length_sq, 0.0, 1.0)
+        dist_sq = (X - (x0 + t * dx)) ** 2 + (Y - (y0 + t * dy)) ** 2
+
+    mask = dist_sq <= radius * radius
+    region = slice_matrix[y_min:y_max, x_min:x_max]
+    if on_write is not None:
+        on_write(region[mask], value)
+    region[mask] = value
+
+    return y_min, y_max, x_min, x_max
@@ -1,12 +1,41 @@
 # utils/segmentation_utils/convert_for_save.py
-from nibabel.orientations import io_orientation, ornt_transform, inv_ornt_aff
+from utils.image_utils.orientation import display_axes, from_display
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from nibabel.openers import Opener
+import io
+import os
+import stat
+import tempfile
+import zlib
 import nibabel as nib
-import numpy as np
+
+DEFAULT_COMPRESSLEVEL = Opener.default_compresslevel  # Same trade-off as nib.save
+BLOCK_BYTES = 4 * 1024 * 1024  # Uncompressed size of one independently compressed gzip member
+
+def build_segmentation_image(segmentation_matrix, original_affine, original_header):
+    """
+    Wrap the segmentation as a NIfTI in the original stored orientation.
+    Labels keep their own integer dtype (no float round-trip, no scaling), and the
+    data is a view, so the original affine applies as is.
+    :param segmentation_matrix: numpy segmentation matrix in display orientation
+    :param original_affine: Affine matrix from the original NIfTI
+    :param original_header: Header information from the original NIfTI
+    :return: nibabel Nifti1Image
+    """
+    # Back to original orientation, as a view
+    stored_data = from_display(segmentation_matrix, display_axes(original_affine))
+
+    header = original_header.copy()
+    header.set_data_dtype(stored_data.dtype)
+    header.set_slope_inter(1, 0)  # Labels are stored as is
+
+    return nib.Nifti1Image(stored_data, original_affine, header)
 
 def save_segmentation_nifti(segmentation_matrix, original_affine, original_header, file_path):
     """
     Save the segmentation matrix.
-    :param segmentation_matrix: numpy segmentation matrix
+    :param segmentation_matrix: numpy segmentation matrix in display orientation
     :param original_affine: Affine matrix from the original NIfTI 
     :param original_header: Header information from the original NIfTI
     :param file_path: Path where the NIfTI should be saved
@@ -14,16 +43,105 @@ def save_segmentation_nifti(segmentation_matrix, original_affine, original_heade
     if not file_path.endswith('.nii.gz'):
         file_path += '.nii.gz'
 
-    canonical_img = nib.Nifti1Image(segmentation_matrix, np.eye(4)) # Create a NIfTI image in RAS orientation
-    rotated_data = np.rot90(canonical_img.get_fdata(), k=1, axes=(0, 1))  # Rotate 90-degrees counterclockwise
-    transformed_data = rotated_data[:, ::-1, ::-1]  # Left-right flip
+    new_img = build_segmentation_image(segmentation_matrix, original_affine, original_header)
+    nib.save(new_img, file_path)
+
+def gzip_member(data, compresslevel):
+    """
+    Compress bytes into one complete gzip member. Concatenated members form a valid
+    gzip file, so blocks can be compressed independently and in parallel.
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return compressor.compress(data) + compressor.flush()
 
-    # Back to original orientation
-    ras_ornt = io_orientation(np.eye(4))
-    original_ornt = io_orientation(original_affine)
-    transform = ornt_transform(ras_ornt, original_ornt)
-    transformed_data = nib.orientations.apply_orientation(transformed_data, transform)
-    new_affine = original_affine @ inv_ornt_aff(transform, segmentation_matrix.shape)  # New affine
+def file_mode(file_path):
+    """
+    :return: Permission bits a replacement of file_path should get: those of the
+             existing file, or what a new file gets under the current umask
+    """
+    try:
+        return stat.S_IMODE(os.stat(file_path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)  # Only readable by setting it
+        os.umask(umask)
+        return 0o666 & ~umask
 
-    new_img = nib.Nifti1Image(transformed_data, new_affine, original_header)
-    nib.save(new_img, file_path)
+def write_segmentation_nifti(segmentation_matrix, original_affine, original_header, file_path,
+                             compresslevel=DEFAULT_COMPRESSLEVEL, threads=None,
+                             progress_callback=None, is_cancelled=None):
+    """
+    Save the segmentation matrix as .nii.gz with block-parallel compression.
+    The file is written to a temporary file next to the target and renamed over it
+    only when complete, so a crash never leaves a truncated segmentation behind.
+    :param segmentation_matrix: numpy segmentation matrix in display orientation (a private snapshot)
+    :param original_affine: Affine matrix from the original NIfTI
+    :param original_header: Header information from the original NIfTI
+    :param file_path: Path where the NIfTI should be saved
+    :param compresslevel: gzip level, 1 is fastest, 9 smallest
+    :param threads: Number of compression threads, defaults to the CPU count
+    :param progress_callback: Optional callable receiving the written fraction
+    :param is_cancelled: Optional callable, returning True aborts the save
+    :return: The saved file path, or None if cancelled
+    """
+    if not file_path.endswith('.nii.gz'):
+        file_path += '.nii.gz'
+
+    new_img = build_segmentation_image(segmentation_matrix, original_affine, original_header)
+    new_img.update_header()
+    header = new_img.header
+    stored_data = new_img.dataobj
+
+    # Header, extensions and padding up to the data offset
+    header_bytes = io.BytesIO()
+    header.write_to(header_bytes)
+    header_bytes.write(b'\0' * (header.get_data_offset() - header_bytes.tell()))
+
+    # NIfTI data is Fortran ordered, so slabs along the last axis are consecutive runs of bytes
+    last_axis_length = stored_data.shape[-1]
+    slice_bytes = max(1, stored_data[..., :1].nbytes)
+    step = max(1, BLOCK_BYTES // slice_bytes)
+    starts = range(0, last_axis_length, step)
+
+    def compress_block(start):
+        return gzip_member(stored_data[..., start:start + step].tobytes(order='F'), compresslevel)
+
+    threads = threads or os.cpu_count() or 1
+    directory = os.path.dirname(os.path.abspath(file_path))
+    handle, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(file_path), suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as temp_file, ThreadPoolExecutor(threads) as pool:
+            temp_file.write(gzip_member(header_bytes.getvalue(), compresslevel))
+
+            in_flight = deque()  # Bounded, so memory stays at a few blocks
+            written = 0
+            for start in starts:
+                in_flight.append(pool.submit(compress_block, start))
+                if len(in_flight) < threads * 2:
+                    continue
+                temp_file.write(in_flight.popleft().result())
+                written += 1
+                if is_cancelled is not None and is_cancelled():
+                    raise InterruptedError
+                if progress_callback is not None:
+                    progress_callback(written / len(starts))
+
+            while in_flight:
+                temp_file.write(in_flight.popleft().result())
+                written += 1
+                if progress_callback is not None:
+                    progress_callback(written / len(starts))
+
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        os.chmod(temp_path, file_mode(file_path))  # mkstemp creates 0600, nib.save honoured the umask
+
+        os.replace(temp_path, file_path)  # Atomic on the same file system
+    except InterruptedError:
+        os.remove(temp_path)
+        return None
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    return file_path
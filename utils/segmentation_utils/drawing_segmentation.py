@@ -1,8 +1,19 @@
 # utils/segmentation_utils/drawing_segmentation.py
-from PyQt5.QtCore import Qt
-from scipy.ndimage import zoom
+from utils.segmentation_utils.brush_stroke import stamp_capsule
+from functools import lru_cache
 import numpy as np
 
+# Label value -> color as BGRA tuple.
+# R and B channels are inverted because ARGB32 pixels are stored as B, G, R, A.
+LABEL_COLORS = {
+    1: (0, 0, 255, 255),  # Red
+    2: (0, 255, 0, 255),  # Green
+    3: (255, 0, 0, 255),  # Blue
+    4: (255, 255, 0, 255),  # Sky Blue
+    5: (135, 206, 235, 255),  # Yellow
+    6: (128, 0, 128, 255)  # Purple
+}
+
 def bresenham_line(x0, y0, x1, y1):
     """
     Generate points between two coordinates using Bresenham's line algorithm.
@@ -33,101 +44,169 @@ def bresenham_line(x0, y0, x1, y1):
     
     return points
 
-def render_segmentation_from_matrix(segmentation_image, segmentation_matrix, current_slice_index):
+@lru_cache(maxsize=64)
+def nearest_index_map(source_length, target_length):
+    """
+    Map every target pixel along one axis to its nearest source pixel.
+    Cached per (source, target) pair so a slice change does not recompute it.
+    :param source_length: Number of pixels along the axis in the label slice
+    :param target_length: Number of pixels along the axis in the image
+    :return: Read-only integer array of source indices, one per target pixel
+    """
+    indices = ((np.arange(target_length) + 0.5) * (source_length / target_length)).astype(np.intp)
+    np.minimum(indices, source_length - 1, out=indices)  # Guard against float rounding at the edge
+    indices.flags.writeable = False
+    return indices
+
+def build_label_lut(label_colors=None, size=256):
+    """
+    Build the lookup table used to turn label values into pixels.
+    :param label_colors: Dict mapping label value to a BGRA tuple, defaults to LABEL_COLORS
+    :param size: Number of entries, i.e. the highest representable label + 1
+    :return: (size,) uint32 array of packed ARGB32_Premultiplied pixels, transparent for undefined labels
+    """
+    if label_colors is None:
+        label_colors = LABEL_COLORS
+
+    lut = np.zeros((size, 4), dtype=np.uint8)
+    for label_value, color in label_colors.items():
+        if 0 <= label_value < size:
+            alpha = color[3]
+            lut[label_value, :3] = [channel * alpha // 255 for channel in color[:3]]  # Premultiply
+            lut[label_value, 3] = alpha
+
+    return lut.view(np.uint32).ravel()
+
+LABEL_LUT = build_label_lut()
+
+@lru_cache(maxsize=1)
+def wide_label_lut():
+    """
+    Lookup table covering every uint16 label, built on first use.
+    """
+    return build_label_lut(size=np.iinfo(np.uint16).max + 1)
+
+def default_label_lut(segmentation_matrix):
+    """
+    :return: LABEL_LUT for uint8 label volumes, the uint16 table otherwise
+    """
+    if segmentation_matrix.dtype.itemsize == 1:
+        return LABEL_LUT
+    return wide_label_lut()
+
+def _segmentation_image_array(segmentation_image):
+    """
+    Wrap the QImage bits as one packed 32-bit pixel per element.
+    """
+    buffer = segmentation_image.bits()
+    buffer.setsize(segmentation_image.byteCount())
+    return np.frombuffer(buffer, np.uint32).reshape((segmentation_image.height(), segmentation_image.width()))
+
+def render_segmentation_from_matrix(segmentation_image, segmentation_matrix, current_slice_index, label_lut=None):
     """
     Render the segmentations for faster performance.
-    :param segmentation_image: QImage object to draw the segmentation
+    The label slice is resampled once with nearest-neighbour index maps and the
+    colors are gathered from the lookup table straight into the QImage buffer,
+    so the cost does not depend on the number of labels.
+    :param segmentation_image: QImage object (Format_ARGB32_Premultiplied) to draw the segmentation
     :param segmentation_matrix: Numpy array containing segmentation
     :param current_slice_index: Index for current slice to render
+    :param label_lut: Optional lookup table from build_label_lut, defaults to default_label_lut
     """
-    if segmentation_matrix is not None:
-        segmentation_image.fill(Qt.transparent)
-        slice_segmentation = segmentation_matrix[:, :, current_slice_index]
-        height, width = slice_segmentation.shape
-
-        # Define color mapping using RGBA tuples
-        # R and B channels are inverted.
-        color_map = {
-            1: (0, 0, 255, 255),  # Red
-            2: (0, 255, 0, 255),  # Green
-            3: (255, 0, 0, 255),  # Blue 
-            4: (255, 255, 0, 255),  # Sky Blue
-            5: (135, 206, 235, 255),  # Yellow
-            6: (128, 0, 128, 255)  # Purple
-        }
-
-        # Access the QImage bits and manipulate them directly
-        buffer = segmentation_image.bits()
-        buffer.setsize(segmentation_image.byteCount())
-        img_array = np.frombuffer(buffer, np.uint8).reshape((segmentation_image.height(), segmentation_image.width(), 4))
-
-        # Compute scale factors for resizing based on the image size and segmentation size
-        scale_x = segmentation_image.width() / width
-        scale_y = segmentation_image.height() / height
-
-        # Create an empty array for faster assignment
-        for color_value, color in color_map.items():
-            # Get the positions for this color value
-            positions = np.argwhere(slice_segmentation == color_value)
-            # Map to image coordinates and apply linear interpolation scaling
-            if len(positions) > 0:
-                # # Compute scaled coordinates using linear interpolation
-                # screen_x = np.clip(np.round(positions[:, 1] * scale_x).astype(int), 0, segmentation_image.width() - 1)
-                # screen_y = np.clip(np.round(positions[:, 0] * scale_y).astype(int), 0, segmentation_image.height() - 1)
-                # Create an empty mask for the color and set it in the zoomed image
-                mask = np.zeros((height, width), dtype=np.uint8)
-                mask[positions[:, 0], positions[:, 1]] = 1
-                # Use zoom for linear interpolation to scale mask up to the image size
-                zoomed_mask = zoom(mask, (scale_y, scale_x), order=1)  # Linear interpolation
-                # Fill the img_array based on zoomed_mask positions
-                img_array[zoomed_mask > 0.5] = color  # Assign color where zoomed mask is present
-
-def update_segmentation_matrix(segmentation_matrix, last_pos, pos, brush_size, background_image, current_slice_index, brush_color_value):
-    """
-    Update the segmentation matrix by drawing a line between points.
+    if segmentation_matrix is None:
+        return
+
+    height, width = segmentation_matrix.shape[:2]
+    render_segmentation_region(
+        segmentation_image,
+        segmentation_matrix,
+        current_slice_index,
+        (0, height, 0, width),
+        label_lut
+    )
+
+def render_segmentation_region(segmentation_image, segmentation_matrix, current_slice_index, voxel_bbox, label_lut=None):
+    """
+    Re-rasterize only the image pixels whose nearest voxel lies in voxel_bbox.
+    :param segmentation_image: QImage object (Format_ARGB32_Premultiplied) holding the rendered slice
+    :param segmentation_matrix: Numpy array containing segmentation
+    :param current_slice_index: Index for current slice to render
+    :param voxel_bbox: (y_min, y_max, x_min, x_max) half-open voxel bounds that changed
+    :param label_lut: Optional lookup table from build_label_lut, defaults to default_label_lut
+    :return: (top, bottom, left, right) half-open image bounds that were rewritten, or None
+    """
+    if segmentation_matrix is None or voxel_bbox is None:
+        return None
+
+    if label_lut is None:
+        label_lut = default_label_lut(segmentation_matrix)
+
+    height, width = segmentation_matrix.shape[:2]
+    img_array = _segmentation_image_array(segmentation_image)
+    rows = nearest_index_map(height, img_array.shape[0])
+    cols = nearest_index_map(width, img_array.shape[1])
+
+    # Index maps are monotonic, so the affected image pixels form one rectangle
+    y_min, y_max, x_min, x_max = voxel_bbox
+    top, bottom = np.searchsorted(rows, (y_min, y_max))
+    left, right = np.searchsorted(cols, (x_min, x_max))
+    if top >= bottom or left >= right:
+        return None
+
+    # Color at label resolution first, then expand to image resolution
+    slice_segmentation = segmentation_matrix[y_min:y_max, x_min:x_max, current_slice_index]
+    colors = label_lut.take(slice_segmentation, mode='clip')
+    np.take(
+        colors.take(rows[top:bottom] - y_min, axis=0),
+        cols[left:right] - x_min,
+        axis=1,
+        out=img_array[top:bottom, left:right]
+    )
+
+    return int(top), int(bottom), int(left), int(right)
+
+def update_segmentation_matrix(segmentation_matrix, last_pos, pos, brush_size, image_size, current_slice_index, brush_color_value, sub_voxel=False, on_write=None, spacing=(1.0, 1.0)):
+    """
+    Update the segmentation matrix by stamping the brush along the line between points.
     :param segmentation_matrix: Numpy array to update with segmentation
     :param last_pos: QPoint for the starting point
     :param pos: QPoint for the ending point
     :param brush_size: Brush size in pixels
-    :param background_image: QImage object for the background image
+    :param image_size: QSize of the image the positions are in, e.g. the slice shown
     :param current_slice_index: Index for current slice to update
     :param brush_color_value: Integer for the color value of the brush
+    :param sub_voxel: Keep fractional positions and use brush_size / 2 as the radius
+    :param on_write: Optional callable receiving (old_values, value) of the voxels about to be written
+    :param spacing: (x, y) voxel size along the columns and rows; the brush is round in these units
+    :return: (y_min, y_max, x_min, x_max) half-open voxel bounds touched by the stroke, or None
     """
     if segmentation_matrix is None:
-        return
+        return None
+
+    height, width = segmentation_matrix.shape[:2]
+    x_scale = width / image_size.width()
+    y_scale = height / image_size.height()
+
+    if sub_voxel:
+        # Voxel centers sit at integer coordinates, so shift by half a voxel
+        x0 = float(np.clip(last_pos.x() * x_scale - 0.5, 0, width - 1))
+        y0 = float(np.clip(last_pos.y() * y_scale - 0.5, 0, height - 1))
+        x1 = float(np.clip(pos.x() * x_scale - 0.5, 0, width - 1))
+        y1 = float(np.clip(pos.y() * y_scale - 0.5, 0, height - 1))
+        brush_radius = brush_size / 2
+    else:
+        # Convert positions to matrix coordinates
+        x0 = int(np.clip(last_pos.x() * x_scale, 0, width - 1))
+        y0 = int(np.clip(last_pos.y() * y_scale, 0, height - 1))
+        x1 = int(np.clip(pos.x() * x_scale, 0, width - 1))
+        y1 = int(np.clip(pos.y() * y_scale, 0, height - 1))
+        brush_radius = brush_size // 2
 
-    # Convert positions to matrix coordinates
-    x0 = int(np.clip(last_pos.x() * segmentation_matrix.shape[1] / background_image.width(), 0, segmentation_matrix.shape[1] - 1))
-    y0 = int(np.clip(last_pos.y() * segmentation_matrix.shape[0] / background_image.height(), 0, segmentation_matrix.shape[0] - 1))
-    x1 = int(np.clip(pos.x() * segmentation_matrix.shape[1] / background_image.width(), 0, segmentation_matrix.shape[1] - 1))
-    y1 = int(np.clip(pos.y() * segmentation_matrix.shape[0] / background_image.height(), 0, segmentation_matrix.shape[0] - 1))
-
-    # Generate points using Bresenham's algorithm
-    line_points = bresenham_line(x0, y0, x1, y1)
-
-    # Prepare a mask to define brush effect area
-    brush_radius = brush_size // 2
-    Y, X = np.ogrid[-brush_radius:brush_radius+1, -brush_radius:brush_radius+1]
-    mask = X**2 + Y**2 <= brush_radius**2  # Create a circular mask
-
-    # Update the segmentation matrix
-    for x_center, y_center in line_points:
-        x_min = max(x_center - brush_radius, 0)
-        x_max = min(x_center + brush_radius + 1, segmentation_matrix.shape[1])
-        y_min = max(y_center - brush_radius, 0)
-        y_max = min(y_center + brush_radius + 1, segmentation_matrix.shape[0])
-
-        # Extract the relevant sub-matrix to apply the brush
-        sub_matrix = segmentation_matrix[y_min:y_max, x_min:x_max, current_slice_index]
-
-        # Apply mask within bounds
-        mask_x_start = max(0, -x_center + brush_radius)
-        mask_x_end = mask_x_start + (x_max - x_min)
-        mask_y_start = max(0, -y_center + brush_radius)
-        mask_y_end = mask_y_start + (y_max - y_min)
-
-        # Update the sub_matrix with the brush color value or clear
-        if brush_color_value == 0:
-            sub_matrix[mask[mask_y_start:mask_y_end, mask_x_start:mask_x_end]] = 0
-        else:
-            sub_matrix[mask[mask_y_start:mask_y_end, mask_x_start:mask_x_end]] = int(brush_color_value)
\ No newline at end of file
+    return stamp_capsule(
+        segmentation_matrix[:, :, current_slice_index],
+        x0, y0, x1, y1,
+        brush_radius,
+        int(brush_color_value),
+        on_write,
+        spacing
+    )
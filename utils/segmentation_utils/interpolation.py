@@ -0,0 +1,81 @@
+# utils/segmentation_utils/interpolation.py
+from scipy import ndimage
+import numpy as np
+
+def annotated_slices(segmentation_matrix):
+    """
+    :return: Indices of the slices holding any label, in order
+    """
+    return [k for k in range(segmentation_matrix.shape[2]) if segmentation_matrix[:, :, k].any()]
+
+def interpolation_gaps(key_slice_indices):
+    """
+    :return: (start, end) pairs of consecutive key slices with unlabelled slices between them
+    """
+    return [(start, end) for start, end in zip(key_slice_indices, key_slice_indices[1:]) if end - start > 1]
+
+def signed_distance(mask):
+    """
+    Signed Euclidean distance to the mask boundary, negative inside.
+    The mask must have a background border, as edt treats the array edge as foreground.
+    """
+    return ndimage.distance_transform_edt(~mask) - ndimage.distance_transform_edt(mask)
+
+def interpolate_gap(start_slice, end_slice, num_between):
+    """
+    Shape-based interpolation of the slices between two key slices.
+
+    Every label present on both key slices gets a signed distance map per key slice,
+    computed on the box around both masks only. The maps are blended linearly for each
+    intermediate slice and the label is kept where the blend is inside (<= 0); where
+    labels compete, the one deepest inside wins.
+    :param start_slice: 2D label array of the first key slice
+    :param end_slice: 2D label array of the last key slice
+    :param num_between: Number of slices between the two
+    :return: ((y_min, y_max, x_min, x_max), labels of shape (rows, cols, num_between)), or None
+    """
+    labels = np.intersect1d(np.unique(start_slice), np.unique(end_slice))
+    labels = labels[labels != 0]
+    if labels.size == 0:
+        return None
+
+    rows, cols = start_slice.shape
+    present = np.isin(start_slice, labels) | np.isin(end_slice, labels)
+    row_indices = np.flatnonzero(present.any(axis=1))
+    col_indices = np.flatnonzero(present.any(axis=0))
+    y_min, y_max = max(row_indices[0] - 1, 0), min(row_indices[-1] + 2, rows)  # Same margin as the label boxes
+    x_min, x_max = max(col_indices[0] - 1, 0), min(col_indices[-1] + 2, cols)
+
+    weights = np.arange(1, num_between + 1, dtype=np.float32) / (num_between + 1)
+    best_distance = np.full((y_max - y_min, x_max - x_min, num_between), np.inf, dtype=np.float32)
+    result = np.zeros(best_distance.shape, dtype=start_slice.dtype)
+
+    for label in labels:
+        start_mask = start_slice == label
+        end_mask = end_slice == label
+        both = start_mask | end_mask
+        label_rows = np.flatnonzero(both.any(axis=1))
+        label_cols = np.flatnonzero(both.any(axis=0))
+
+        # One voxel of background around the label, clipped to the slice
+        top, bottom = max(label_rows[0] - 1, 0), min(label_rows[-1] + 2, rows)
+        left, right = max(label_cols[0] - 1, 0), min(label_cols[-1] + 2, cols)
+        crop = (slice(top, bottom), slice(left, right))
+        start_distance = signed_distance(np.pad(start_mask[crop], 1))[1:-1, 1:-1].astype(np.float32)
+        end_distance = signed_distance(np.pad(end_mask[crop], 1))[1:-1, 1:-1].astype(np.float32)
+
+        # Blend for all intermediate slices at once, (rows, cols, num_between)
+        blended = start_distance[:, :, None] * (1 - weights) + end_distance[:, :, None] * weights
+        target = (slice(top - y_min, bottom - y_min), slice(left - x_min, right - x_min))
+        wins = (blended <= 0) & (blended < best_distance[target])
+        best_distance[target][wins] = blended[wins]
+        result[target][wins] = label
+
+    return (int(y_min), int(y_max), int(x_min), int(x_max)), result
+
+def interpolate_gap_task(start_index, end_index, start_slice, end_slice):
+    """
+    Process pool entry point for one gap.
+    :return: (start_index, end_index, interpolate_gap result)
+    """
+    return start_index, end_index, interpolate_gap(start_slice, end_slice, end_index - start_index - 1)
@@ -0,0 +1,122 @@
+# utils/segmentation_utils/label_statistics.py
+import numpy as np
+
+class LabelStatistics:
+    """
+    Voxel counts per label, kept per slice and for the whole volume.
+
+    Edits report the values they overwrite and the value they write, so keeping
+    the counts current costs O(edited voxels); only recompute() reads the whole volume.
+    """
+
+    def __init__(self, num_slices=0, slice_size=0, voxel_volume=1.0):
+        self.reset(num_slices, slice_size, voxel_volume)
+
+    def reset(self, num_slices, slice_size, voxel_volume=1.0):
+        """
+        Start over with an empty (all background) label volume.
+        :param num_slices: Number of slices
+        :param slice_size: Number of voxels per slice
+        :param voxel_volume: Volume of one voxel in mm³
+        """
+        self.slice_size = slice_size
+        self.voxel_volume = voxel_volume
+        self.slice_counts = np.zeros((num_slices, 256), dtype=np.int64)  # [slice, label]
+        self.slice_counts[:, 0] = slice_size
+        self.totals = self.slice_counts.sum(axis=0)
+
+    def grow(self, num_labels):
+        if num_labels > self.slice_counts.shape[1]:
+            padding = num_labels - self.slice_counts.shape[1]
+            self.slice_counts = np.pad(self.slice_counts, ((0, 0), (0, padding)))
+            self.totals = np.pad(self.totals, (0, padding))
+
+    def recompute(self, segmentation_matrix, voxel_volume=None):
+        """
+        Count every label of a volume, e.g. a loaded segmentation.
+        """
+        rows, cols, num_slices = segmentation_matrix.shape
+        self.reset(num_slices, rows * cols, self.voxel_volume if voxel_volume is None else voxel_volume)
+        self.slice_counts[:, 0] = 0
+        for slice_index in range(num_slices):
+            counts = np.bincount(segmentation_matrix[:, :, slice_index].ravel())
+            self.grow(len(counts))
+            self.slice_counts[slice_index, :len(counts)] = counts
+        self.totals = self.slice_counts.sum(axis=0)
+
+    def record_write(self, slice_index, old_values, new_value):
+        """
+        Account for one write of a single label value.
+        :param old_values: Numpy array of the overwritten labels
+        :param new_value: Label value written to all of them
+        """
+        old_counts = np.bincount(old_values.ravel())
+        self.grow(max(len(old_counts), new_value + 1))
+        self.slice_counts[slice_index, :len(old_counts)] -= old_counts
+        self.totals[:len(old_counts)] -= old_counts
+        self.slice_counts[slice_index, new_value] += old_values.size
+        self.totals[new_value] += old_values.size
+
+    def record_change(self, slice_index, old_values, new_values):
+        """
+        Account for a block of labels replaced by another, e.g. an undo patch.
+        """
+        old_counts = np.bincount(old_values.ravel())
+        new_counts = np.bincount(new_values.ravel())
+        self.grow(max(len(old_counts), len(new_counts)))
+        self.slice_counts[slice_index, :len(old_counts)] -= old_counts
+        self.totals[:len(old_counts)] -= old_counts
+        self.slice_counts[slice_index, :len(new_counts)] += new_counts
+        self.totals[:len(new_counts)] += new_counts
+
+    def record_patch(self, patch, new=True):
+        """
+        Account for a LabelPatch applied forward (new=True) or backward.
+        """
+        old_labels = patch.labels(not new)
+        new_labels = patch.labels(new)
+        for offset, slice_index in enumerate(patch.slice_indices):
+            self.record_change(slice_index, old_labels[:, :, offset], new_labels[:, :, offset])
+
+    def record_fill(self, value=0):
+        """
+        Account for the whole volume being filled with one label.
+        """
+        self.grow(value + 1)
+        self.slice_counts[:] = 0
+        self.slice_counts[:, value] = self.slice_size
+        self.totals = self.slice_counts.sum(axis=0)
+
+    def labels(self):
+        """
+        :return: Label values present in the volume, background excluded
+        """
+        return [int(label) for label in np.flatnonzero(self.totals) if label != 0]
+
+    def summary(self, slice_index=None):
+        """
+        :param slice_index: Optional slice to report counts for as well
+        :return: List of dicts with label, voxels, volume_mm3 and slice_voxels
+        """
+        rows = []
+        for label in self.labels():
+            rows.append({
+                'label': label,
+                'voxels': int(self.totals[label]),
+                'volume_mm3': float(self.totals[label] * self.voxel_volume),
+                'slice_voxels': int(self.slice_counts[slice_index, label]) if slice_index is not None else None,
+            })
+        return rows
+
+def voxel_volume_mm3(header):
+    """
+    Volume of one voxel from the NIfTI zooms, converted to mm³ when the header names a unit.
+    """
+    zooms = header.get_zooms()[:3]
+    volume = float(np.prod(zooms)) if len(zooms) == 3 else 1.0
+    spatial_unit = header.get_xyzt_units()[0] if hasattr(header, 'get_xyzt_units') else 'unknown'
+    if spatial_unit == 'meter':
+        return volume * 1e9
+    if spatial_unit == 'micron':
+        return volume * 1e-9
+    return volume  # mm, or unknown which is mm by convention
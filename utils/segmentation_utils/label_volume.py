@@ -0,0 +1,77 @@
+# utils/segmentation_utils/label_volume.py
+from utils.image_utils.orientation import GRID_TOLERANCE, display_axes, grid_difference, to_display
+import numpy as np
+
+def label_dtype(max_label):
+    """
+    Smallest unsigned dtype that holds every label up to max_label.
+    :param max_label: Highest label value that must be representable
+    :return: np.uint8 up to 255 labels, np.uint16 up to 65535
+    """
+    if max_label <= np.iinfo(np.uint8).max:
+        return np.uint8
+    if max_label <= np.iinfo(np.uint16).max:
+        return np.uint16
+    raise ValueError(f"Label value {max_label} does not fit a uint16 label volume")
+
+def create_label_volume(shape, max_label=255):
+    """
+    Create an empty label volume in display orientation (rows, cols, slices).
+    Memory is laid out slice-major, so every [:, :, k] slice is one contiguous block
+    that strokes, rendering and saving can touch without strided access.
+    :param shape: (rows, cols, slices)
+    :param max_label: Highest label value the volume must hold
+    :return: Zeroed numpy array of shape `shape` and dtype label_dtype(max_label)
+    """
+    rows, cols, num_slices = shape
+    return np.zeros((num_slices, rows, cols), dtype=label_dtype(max_label)).transpose(1, 2, 0)
+
+def as_label_volume(data):
+    """
+    Copy label data of any numeric dtype into a compact label volume.
+    Values are checked slice by slice, so no full-size temporary is created.
+    :param data: 3D numpy array (or memory map) of label values in display orientation
+    :return: Label volume from create_label_volume holding the same labels
+    """
+    max_label = 0
+    for slice_index in range(data.shape[2]):
+        slice_data = data[:, :, slice_index]
+        if slice_data.dtype.kind == 'f' and np.any(np.mod(slice_data, 1) != 0):
+            raise ValueError("Segmentation contains non-integer label values")
+        if slice_data.size and slice_data.min() < 0:
+            raise ValueError("Segmentation contains negative label values")
+        if slice_data.size:
+            max_label = max(max_label, int(slice_data.max()))
+
+    volume = create_label_volume(data.shape, max_label)
+    for slice_index in range(data.shape[2]):
+        volume[:, :, slice_index] = data[:, :, slice_index]
+
+    return volume
+
+def read_label_volume(nifti_img, image_affine, image_shape, tolerance=GRID_TOLERANCE):
+    """
+    Read a label NIfTI into a label volume in the display orientation of its image.
+    Voxels are read from dataobj in their stored dtype (a memory map for an uncompressed
+    file) and reoriented through views with the same transform as the image, so labels
+    stored in another orientation line up and the only full-size copy is the result.
+    :param nifti_img: Loaded nibabel image of the labels, its data is not read yet
+    :param image_affine: Affine matrix of the image the labels belong to
+    :param image_shape: Stored shape of that image
+    :return: Label volume from as_label_volume
+    :raises ValueError: If the labels are not 3D or do not cover the image's voxel grid
+    """
+    label_shape = nifti_img.shape
+    if len(label_shape) < 3 or any(length != 1 for length in label_shape[3:]):
+        raise ValueError(f"Segmentation has shape {label_shape}, labels are 3D")
+
+    difference = grid_difference(nifti_img.affine, label_shape, image_affine, image_shape)
+    if difference is None:
+        raise ValueError("The dimensions of the segmentation file do not match the current NIfTI image")
+    if difference > tolerance:
+        raise ValueError(f"The segmentation is not aligned with the current NIfTI image "
+                         f"(affines differ by up to {difference:.3g} mm)")
+
+    data = np.asanyarray(nifti_img.dataobj)  # Stored dtype unless the header scales
+    data = data.reshape(label_shape[:3], order='F' if np.isfortran(data) else 'C')  # Trailing singleton axes, as a view
+    return as_label_volume(to_display(data, display_axes(nifti_img.affine)))
@@ -0,0 +1,91 @@
+# utils/segmentation_utils/region_growing.py
+from scipy import ndimage
+import numpy as np
+
+INITIAL_WINDOW = 64  # Edge length of the first window around the seed
+FACE_CONNECTIVITY_2D = ndimage.generate_binary_structure(2, 1)
+FACE_CONNECTIVITY_3D = ndimage.generate_binary_structure(3, 1)
+
+def intensity_limits(volume, seed, tolerance):
+    """
+    Intensity range around the seed voxel's value.
+    :param volume: LazyVolume
+    :param seed: (row, col, slice) voxel in display orientation
+    :param tolerance: Allowed difference as a fraction of the volume's intensity range
+    :return: (lower, upper)
+    """
+    row, col, slice_index = seed
+    slice_data = volume.get_slice(slice_index)
+    value = float(slice_data[row, col])
+    if volume.is_loaded:
+        intensity_range = float(volume.max_value) - float(volume.min_value)
+    else:
+        intensity_range = float(slice_data.max()) - float(slice_data.min())
+    return value - tolerance * intensity_range, value + tolerance * intensity_range
+
+def grow_region(volume, seed, lower, upper, three_d=False, is_cancelled=None, initial_window=INITIAL_WINDOW):
+    """
+    Find the face-connected voxels around a seed whose intensity lies within [lower, upper].
+
+    The region is labelled with scipy.ndimage.label in a window around the seed. Every
+    side of the window that the region reaches, and that is not a side of the volume,
+    is moved twice as far out and the window is labelled again, so the cost follows
+    the size of the region, not of the volume.
+    :param volume: LazyVolume to read intensities from
+    :param seed: (row, col, slice) voxel in display orientation
+    :param lower: Lowest intensity included
+    :param upper: Highest intensity included
+    :param three_d: Grow across slices, otherwise stay within the seed's slice
+    :param is_cancelled: Optional callable, returning True aborts the search
+    :param initial_window: Edge length of the first window
+    :return: ((y_min, y_max, x_min, x_max, z_min, z_max), boolean mask of that box), or None
+             if the seed is outside the limits or the search was cancelled
+    """
+    rows, cols, num_slices = volume.shape
+    row, col, slice_index = seed
+    half = max(1, initial_window // 2)
+    reach = [half] * 6 if three_d else [half] * 4 + [0, 0]  # Distance of each side from the seed
+
+    while True:
+        y_min, y_max = max(0, row - reach[0]), min(rows, row + reach[1] + 1)
+        x_min, x_max = max(0, col - reach[2]), min(cols, col + reach[3] + 1)
+        z_min, z_max = max(0, slice_index - reach[4]), min(num_slices, slice_index + reach[5] + 1)
+
+        inside = np.empty((y_max - y_min, x_max - x_min, z_max - z_min), dtype=bool)
+        for offset, k in enumerate(range(z_min, z_max)):
+            if is_cancelled is not None and is_cancelled():
+                return None
+            window = volume.get_slice(k)[y_min:y_max, x_min:x_max]
+            np.logical_and(window >= lower, window <= upper, out=inside[:, :, offset])
+
+        seed_in_window = (row - y_min, col - x_min, slice_index - z_min)
+        if not inside[seed_in_window]:
+            return None
+
+        if three_d:
+            components, _ = ndimage.label(inside, structure=FACE_CONNECTIVITY_3D)
+            region = components == components[seed_in_window]
+        else:
+            components, _ = ndimage.label(inside[:, :, 0], structure=FACE_CONNECTIVITY_2D)
+            region = (components == components[seed_in_window[:2]])[:, :, None]
+
+        # Sides of the window that cut through the volume and are reached by the region
+        clipped = [
+            y_min > 0 and region[0].any(), y_max < rows and region[-1].any(),
+            x_min > 0 and region[:, 0].any(), x_max < cols and region[:, -1].any(),
+            three_d and z_min > 0 and region[:, :, 0].any(),
+            three_d and z_max < num_slices and region[:, :, -1].any(),
+        ]
+        if not any(clipped):
+            break
+        reach = [side * 2 if side_clipped else side for side, side_clipped in zip(reach, clipped)]
+
+    # Crop to the region itself
+    bounds = []
+    for axis, start in enumerate((y_min, x_min, z_min)):
+        other_axes = tuple(a for a in range(3) if a != axis)
+        present = np.flatnonzero(region.any(axis=other_axes))
+        bounds += [start + present[0], start + present[-1] + 1]
+    y0, y1, x0, x1, z0, z1 = bounds
+    mask = region[y0 - y_min:y1 - y_min, x0 - x_min:x1 - x_min, z0 - z_min:z1 - z_min]
+    return tuple(int(bound) for bound in bounds), mask
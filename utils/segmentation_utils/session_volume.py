@@ -0,0 +1,184 @@
+# utils/segmentation_utils/session_volume.py
+from utils.segmentation_utils.label_volume import label_dtype
+import json
+import mmap
+import os
+import threading
+import numpy as np
+
+SESSION_SUFFIX = '.seg.npy'  # Working file next to the image
+META_SUFFIX = '.seg.json'  # Which image the working file belongs to
+
+def session_paths(image_path):
+    """
+    :param image_path: Path of the NIfTI image being annotated
+    :return: (working file path, metadata path)
+    """
+    return image_path + SESSION_SUFFIX, image_path + META_SUFFIX
+
+def image_signature(image_path):
+    """
+    Identify the image a working file was made for, without reading its voxels.
+    """
+    stat = os.stat(image_path)
+    return {'image': os.path.abspath(image_path), 'image_size': stat.st_size, 'image_mtime': stat.st_mtime}
+
+class SessionVolume:
+    """
+    Label volume backed by a memory-mapped .npy working file next to the image.
+
+    Strokes write straight into the mapped pages, so the labels survive a crash of
+    the application without any save. Slices are marked dirty as they change and
+    flush_dirty() syncs only their byte ranges to disk, to survive a crash of the
+    system as well. The file is stored (slices, rows, cols), so the array handed
+    out has the same slice-major layout as create_label_volume.
+    """
+
+    def __init__(self, image_path, data_path, file, mapping, data_offset, volume):
+        self.image_path = image_path
+        self.data_path = data_path
+        self.file = file
+        self.mapping = mapping
+        self.data_offset = data_offset  # Bytes of .npy header before the labels
+        self.volume = volume  # (rows, cols, slices) view of the mapping
+        self.lock = threading.Lock()
+        self.dirty = set()
+        self.flushes = 0
+
+    @classmethod
+    def map_file(cls, image_path, data_path):
+        """
+        Map an existing working file.
+        """
+        file = open(data_path, 'r+b')
+        try:
+            if np.lib.format.read_magic(file) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            if fortran_order or len(shape) != 3:
+                raise ValueError(f"{data_path} is not a label working file")
+            offset = file.tell()
+            mapping = mmap.mmap(file.fileno(), 0)
+        except Exception:
+            file.close()
+            raise
+
+        stored = np.ndarray(shape, dtype=dtype, buffer=mapping, offset=offset)
+        return cls(image_path, data_path, file, mapping, offset, stored.transpose(1, 2, 0))
+
+    @classmethod
+    def create(cls, image_path, shape, max_label=255):
+        """
+        Create an empty working file for an image, replacing any previous one.
+        :param image_path: Path of the NIfTI image being annotated
+        :param shape: (rows, cols, slices) of the label volume
+        :param max_label: Highest label value the volume must hold
+        :return: SessionVolume
+        """
+        data_path, meta_path = session_paths(image_path)
+        rows, cols, num_slices = shape
+        stored = np.lib.format.open_memmap(data_path, mode='w+', dtype=label_dtype(max_label), shape=(num_slices, rows, cols))
+        del stored  # Zero filled sparse file, mapped again below with ranged flushing
+
+        meta = image_signature(image_path)
+        meta['shape'] = [rows, cols, num_slices]
+        with open(meta_path, 'w') as meta_file:
+            json.dump(meta, meta_file)
+
+        return cls.map_file(image_path, data_path)
+
+    @classmethod
+    def recover(cls, image_path, shape):
+        """
+        Reopen the working file left by an earlier session on the same, unchanged image.
+        :return: SessionVolume, or None if there is no matching working file
+        """
+        data_path, meta_path = session_paths(image_path)
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            signature = image_signature(image_path)
+            if any(meta.get(key) != value for key, value in signature.items()) or meta.get('shape') != list(shape):
+                return None
+            session = cls.map_file(image_path, data_path)
+        except (OSError, ValueError):
+            return None
+
+        if session.volume.shape != tuple(shape):
+            session.close()
+            return None
+        return session
+
+    @staticmethod
+    def exists(image_path):
+        return all(os.path.exists(path) for path in session_paths(image_path))
+
+    def mark_dirty(self, slice_indices):
+        """
+        :param slice_indices: Iterable of slice indices whose labels changed
+        """
+        with self.lock:
+            self.dirty.update(slice_indices)
+
+    def mark_all_dirty(self):
+        self.mark_dirty(range(self.volume.shape[2]))
+
+    def has_dirty(self):
+        with self.lock:
+            return bool(self.dirty)
+
+    def flush_dirty(self):
+        """
+        Sync the pages of the dirty slices to disk. Safe to call from a worker thread.
+        :return: Number of slices flushed
+        """
+        with self.lock:
+            dirty = sorted(self.dirty)
+            self.dirty.clear()
+        if not dirty or self.mapping is None:
+            return 0
+
+        rows, cols = self.volume.shape[:2]
+        slice_bytes = rows * cols * self.volume.dtype.itemsize
+
+        # Merge consecutive slices into one range, msync wants page aligned offsets
+        run_start = previous = dirty[0]
+        for slice_index in dirty[1:] + [None]:
+            if slice_index == previous + 1:
+                previous = slice_index
+                continue
+            start = self.data_offset + run_start * slice_bytes
+            end = self.data_offset + (previous + 1) * slice_bytes
+            aligned_start = start - start % mmap.PAGESIZE
+            self.mapping.flush(aligned_start, end - aligned_start)
+            if slice_index is not None:
+                run_start = previous = slice_index
+
+        self.flushes += 1
+        return len(dirty)
+
+    def close(self):
+        """
+        Flush everything and release the file. The working file stays for the next launch.
+        """
+        if self.mapping is None:
+            return
+        self.flush_dirty()
+        self.mapping.flush()
+        self.volume = None
+        try:
+            self.mapping.close()
+        except BufferError:
+            pass  # Still referenced by a view, closed when that is collected
+        self.mapping = None
+        self.file.close()
+
+    def discard(self):
+        """
+        Close and delete the working file and its metadata.
+        """
+        self.close()
+        for path in session_paths(self.image_path):
+            if os.path.exists(path):
+                os.remove(path)
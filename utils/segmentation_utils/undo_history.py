@@ -0,0 +1,260 @@
+# utils/segmentation_utils/undo_history.py
+from utils.image_utils.plane_volume import to_display_box
+from collections import deque
+import zlib
+import numpy as np
+
+DEFAULT_HISTORY_BYTES = 64 * 1024 * 1024
+PATCH_COMPRESSLEVEL = 1  # Label blocks are highly redundant, the fastest level already shrinks them well
+
+def compress_slices(slices):
+    """
+    Compress a block of label slices into one zlib stream, one slice at a time,
+    so no full-size copy of the block is made.
+    :param slices: Iterable of 2D numpy arrays of equal shape and dtype
+    :return: Compressed bytes
+    """
+    compressor = zlib.compressobj(PATCH_COMPRESSLEVEL)
+    chunks = [compressor.compress(np.ascontiguousarray(slice_data)) for slice_data in slices]
+    chunks.append(compressor.flush())
+    return b''.join(chunks)
+
+def changed_bounds(old_slice, new_slice):
+    """
+    :return: (y_min, y_max, x_min, x_max) half-open bounds of the differing voxels, or None
+    """
+    changed = old_slice != new_slice
+    rows = np.flatnonzero(changed.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(changed.any(axis=0))
+    return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+class LabelPatch:
+    """
+    The old and new labels of one box of the label volume, compressed.
+    Applying a patch writes one side back into the box, so undo and redo cost
+    O(patch size) regardless of the volume size.
+    """
+
+    def __init__(self, bounds, dtype, old_slices, new_slices):
+        """
+        :param bounds: (y_min, y_max, x_min, x_max, z_min, z_max) half-open box in the label volume
+        :param dtype: Label dtype of the volume
+        :param old_slices: Iterable of the 2D label blocks before the edit, one per slice
+        :param new_slices: Iterable of the 2D label blocks after the edit, one per slice
+        """
+        self.bounds = tuple(int(bound) for bound in bounds)
+        self.dtype = np.dtype(dtype)
+        self.old_data = compress_slices(old_slices)
+        self.new_data = compress_slices(new_slices)
+
+    @property
+    def nbytes(self):
+        return len(self.old_data) + len(self.new_data)
+
+    @property
+    def slice_indices(self):
+        return range(self.bounds[4], self.bounds[5])
+
+    def labels(self, new=True):
+        """
+        :return: (rows, cols, slices) numpy array holding one side of the patch
+        """
+        y_min, y_max, x_min, x_max, z_min, z_max = self.bounds
+        data = zlib.decompress(self.new_data if new else self.old_data)
+        return np.frombuffer(data, dtype=self.dtype).reshape(z_max - z_min, y_max - y_min, x_max - x_min).transpose(1, 2, 0)
+
+    def apply(self, segmentation_matrix, new=True):
+        """
+        Write the new (redo) or old (undo) labels into the segmentation matrix.
+        """
+        y_min, y_max, x_min, x_max, z_min, z_max = self.bounds
+        segmentation_matrix[y_min:y_max, x_min:x_max, z_min:z_max] = self.labels(new)
+
+    def transposed(self, permutation):
+        """
+        The same edit for the label volume seen through other axes, e.g. a patch recorded
+        on a coronal view of the volume as a patch of the volume itself.
+        :param permutation: Axis of the target volume for each of this patch's (rows, cols, slices)
+        :return: LabelPatch
+        """
+        inverse = np.argsort(permutation)
+        old = self.labels(False).transpose(inverse)
+        new = self.labels(True).transpose(inverse)
+        return LabelPatch(
+            to_display_box(self.bounds, permutation),
+            self.dtype,
+            (old[:, :, k] for k in range(old.shape[2])),
+            (new[:, :, k] for k in range(new.shape[2]))
+        )
+
+class StrokeRecorder:
+    """
+    Collect the edits of one stroke into patches.
+    The first time a stroke touches a slice its labels are backed up, and the stamped
+    boxes are merged; finish() keeps only the voxels that actually changed.
+    """
+
+    def __init__(self, segmentation_matrix):
+        self.segmentation_matrix = segmentation_matrix
+        self.backups = {}  # slice_index -> copy of the slice before the stroke
+        self.bounds = {}  # slice_index -> (y_min, y_max, x_min, x_max) touched so far
+
+    def before_edit(self, slice_index):
+        if slice_index not in self.backups:
+            self.backups[slice_index] = self.segmentation_matrix[:, :, slice_index].copy()
+
+    def after_edit(self, slice_index, voxel_bbox):
+        if voxel_bbox is None:
+            return
+        bounds = self.bounds.get(slice_index)
+        if bounds is not None:
+            voxel_bbox = (
+                min(bounds[0], voxel_bbox[0]), max(bounds[1], voxel_bbox[1]),
+                min(bounds[2], voxel_bbox[2]), max(bounds[3], voxel_bbox[3])
+            )
+        self.bounds[slice_index] = voxel_bbox
+
+    def finish(self):
+        """
+        :return: List of LabelPatch, one per changed slice, empty if nothing changed
+        """
+        patches = []
+        for slice_index, (y_min, y_max, x_min, x_max) in sorted(self.bounds.items()):
+            old_block = self.backups[slice_index][y_min:y_max, x_min:x_max]
+            new_block = self.segmentation_matrix[y_min:y_max, x_min:x_max, slice_index]
+            changed = changed_bounds(old_block, new_block)
+            if changed is None:
+                continue
+            top, bottom, left, right = changed
+            patches.append(LabelPatch(
+                (y_min + top, y_min + bottom, x_min + left, x_min + right, slice_index, slice_index + 1),
+                self.segmentation_matrix.dtype,
+                [old_block[top:bottom, left:right]],
+                [new_block[top:bottom, left:right]]
+            ))
+        self.backups.clear()
+        self.bounds.clear()
+        return patches
+
+def fill_patch(segmentation_matrix, value=0):
+    """
+    Patch for filling the whole label volume with one value, e.g. clearing it.
+    Only the box around the voxels that differ from value is stored.
+    :return: LabelPatch, or None if the volume already holds only value
+    """
+    y_min = x_min = z_min = None
+    for slice_index in range(segmentation_matrix.shape[2]):
+        slice_data = segmentation_matrix[:, :, slice_index]
+        rows = np.flatnonzero((slice_data != value).any(axis=1))
+        if rows.size == 0:
+            continue
+        cols = np.flatnonzero((slice_data != value).any(axis=0))
+        if z_min is None:
+            y_min, y_max, x_min, x_max, z_min = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1, slice_index
+        else:
+            y_min, y_max = min(y_min, rows[0]), max(y_max, rows[-1] + 1)
+            x_min, x_max = min(x_min, cols[0]), max(x_max, cols[-1] + 1)
+        z_max = slice_index + 1
+    if z_min is None:
+        return None
+
+    block_shape = (y_max - y_min, x_max - x_min)
+    return LabelPatch(
+        (y_min, y_max, x_min, x_max, z_min, z_max),
+        segmentation_matrix.dtype,
+        (segmentation_matrix[y_min:y_max, x_min:x_max, k] for k in range(z_min, z_max)),
+        (np.full(block_shape, value, dtype=segmentation_matrix.dtype) for _ in range(z_min, z_max))
+    )
+
+class UndoHistory:
+    """
+    Undo and redo stacks of edits, each edit being a list of LabelPatch.
+    The compressed size of all edits is capped; the oldest edits are dropped first,
+    but the newest edit is always kept.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_HISTORY_BYTES):
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.total_bytes = 0
+        self.dropped = 0
+
+    @staticmethod
+    def edit_nbytes(patches):
+        return sum(patch.nbytes for patch in patches)
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def push(self, patches):
+        """
+        Record a new edit. Clears the redo stack.
+        :param patches: List of LabelPatch, an empty list is ignored
+        """
+        if not patches:
+            return
+        for edit in self.redo_stack:
+            self.total_bytes -= self.edit_nbytes(edit)
+        self.redo_stack.clear()
+
+        self.undo_stack.append(patches)
+        self.total_bytes += self.edit_nbytes(patches)
+        self.trim()
+
+    def trim(self):
+        while self.total_bytes > self.max_bytes and len(self.undo_stack) > 1:
+            self.total_bytes -= self.edit_nbytes(self.undo_stack.popleft())
+            self.dropped += 1
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.trim()
+
+    def undo(self, segmentation_matrix):
+        """
+        Restore the labels before the last edit.
+        :return: The patches that were applied, or an empty list
+        """
+        if not self.undo_stack:
+            return []
+        patches = self.undo_stack.pop()
+        for patch in reversed(patches):
+            patch.apply(segmentation_matrix, new=False)
+        self.redo_stack.append(patches)
+        return patches
+
+    def redo(self, segmentation_matrix):
+        """
+        Re-apply the last undone edit.
+        :return: The patches that were applied, or an empty list
+        """
+        if not self.redo_stack:
+            return []
+        patches = self.redo_stack.pop()
+        for patch in patches:
+            patch.apply(segmentation_matrix, new=True)
+        self.undo_stack.append(patches)
+        return patches
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.total_bytes = 0
+
+    def info(self):
+        """
+        :return: Dict with the number of edits and their compressed size
+        """
+        return {
+            'undo': len(self.undo_stack),
+            'redo': len(self.redo_stack),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'dropped': self.dropped,
+        }
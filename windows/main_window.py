@@ -1,16 +1,25 @@
 # windows/main_window.py
-from canvas.canvas import Canvas
-from menu.file import load_nifti, load_segmentation, save_segmentation
-from PyQt5.QtCore import Qt
+from canvas.canvas import Canvas, ZOOM_STEP
+from canvas.multi_planar_view import MultiPlanarView
+from utils.image_utils.window_level import WINDOW_PRESETS, window_to_width_level
+from menu.file import load_nifti, load_segmentation, save_segmentation, save_trace
+from utils.segmentation_utils.convert_matrix_for_save import DEFAULT_COMPRESSLEVEL
+from utils.profiling_utils.profiler import profiler
+from workers.frame_controller import DEFAULT_CINE_FPS
+from workers.segmentation_saver import SegmentationSaveWorker
+from workers.worker_thread import start_worker
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import (
-    QAction, QComboBox, QHBoxLayout, QLabel, QMainWindow,
-    QPushButton, QScrollBar, QSizePolicy, QVBoxLayout,
-    QWidget
+    QAction, QActionGroup, QComboBox, QHBoxLayout, QHeaderView, QLabel, QMainWindow,
+    QMessageBox, QProgressBar, QPushButton, QScrollBar, QSizePolicy, QSlider, QSpinBox,
+    QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget
 )
-import numpy as np
+
+STATISTICS_REFRESH_MS = 100  # Coalesce statistics table updates while drawing
 
 class MainWindow(QMainWindow):
-    def __init__(self, nifti_file_path=None):
+    def __init__(self, nifti_file_path=None, session_mode=False):
         super().__init__()
 
         self.setWindowTitle("NIfTI Segmentation")
@@ -20,9 +29,27 @@ class MainWindow(QMainWindow):
         self.canvas.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.canvas.setMinimumSize(540, 540)  # Canvas init-size
 
-        if nifti_file_path:
-            self.canvas.set_background_image_from_nifti(nifti_file_path)
         self.canvas.slice_changed.connect(self.update_scroll_bar)
+        self.canvas.volume_ready.connect(self.on_volume_ready)
+        self.canvas.volume_loaded.connect(self.on_volume_loaded)
+        self.canvas.loading_progress.connect(self.on_loading_progress)
+        self.canvas.loading_failed.connect(self.on_loading_failed)
+        self.canvas.history_changed.connect(self.on_history_changed)
+        self.canvas.session_status.connect(self.on_session_status)
+        self.canvas.statistics_changed.connect(self.schedule_statistics_update)
+        self.canvas.status_message.connect(self.statusBar().showMessage)
+        self.canvas.interpolation_progress.connect(self.on_loading_progress)
+        self.canvas.interpolation_finished.connect(self.on_interpolation_finished)
+        self.canvas.window_changed.connect(self.on_window_changed)
+        self.canvas.frame_changed.connect(self.update_frame_controls)
+        self.canvas.set_session_mode(session_mode)
+
+        # Coronal and sagittal views, hidden until enabled in the View menu
+        self.multi_planar_view = MultiPlanarView(self.canvas)
+        self.multi_planar_view.hide()
+
+        self.saver = None
+        self.compresslevel = DEFAULT_COMPRESSLEVEL
 
         # Menu bar
         self.menu_bar = self.menuBar()
@@ -41,9 +68,30 @@ class MainWindow(QMainWindow):
         brush_color_dropdown = QComboBox()
         brush_colors = ['Clear', 'Red', 'Green', 'Blue', 'Yellow', 'Sky Blue', 'Purple']
         brush_color_dropdown.addItems(brush_colors)
+        self.label_names = brush_colors  # Index = label value
         brush_color_dropdown.setCurrentIndex(1)  # Default: 'Red'
         brush_color_dropdown.currentIndexChanged.connect(self.change_brush_color)
 
+        # Dropdown: Tool
+        tool_label = QLabel("Tool:")
+        tool_dropdown = QComboBox()
+        tool_dropdown.addItems(['Brush', 'Fill 2D', 'Fill 3D'])
+        tool_dropdown.currentIndexChanged.connect(self.change_tool)
+
+        # Dropdown: Fill tolerance
+        fill_tolerance_dropdown = QComboBox()
+        fill_tolerances = ['±5%', '±10%', '±20%', '±30%']
+        fill_tolerance_dropdown.addItems(fill_tolerances)
+        fill_tolerance_dropdown.setCurrentIndex(1)  # Default: '±10%'
+        fill_tolerance_dropdown.setToolTip("Fill intensity tolerance, relative to the volume's intensity range")
+        fill_tolerance_dropdown.currentIndexChanged.connect(self.change_fill_tolerance)
+
+        # Dropdown: Window preset, right drag on the canvas fine-tunes it
+        self.window_dropdown = QComboBox()
+        self.window_dropdown.addItems(['Auto', 'Full Range'] + list(WINDOW_PRESETS))
+        self.window_dropdown.setToolTip("Intensity window; right-drag on the image to adjust width and level")
+        self.window_dropdown.activated[str].connect(self.canvas.set_window_preset)
+
         # Button: Clear all
         clear_all_button = QPushButton("Clear All")
         clear_all_button.clicked.connect(self.clear_all_segmentations)
@@ -54,9 +102,6 @@ class MainWindow(QMainWindow):
         self.scroll_bar.setMinimumWidth(20)
         self.scroll_bar.valueChanged.connect(self.scroll_to_slice)
         self.scroll_bar.setMinimum(0)
-        if self.canvas.nifti_data is not None:
-            self.scroll_bar.setMaximum(self.canvas.nifti_data.shape[2] - 1)
-            self.scroll_bar.setValue(self.canvas.current_slice_index)  # Init scroll value to current slice
 
         # Layout for buttons
         button_layout = QHBoxLayout()
@@ -64,23 +109,81 @@ class MainWindow(QMainWindow):
         button_layout.addWidget(brush_size_dropdown)
         button_layout.addWidget(brush_color_label)
         button_layout.addWidget(brush_color_dropdown)
+        button_layout.addWidget(tool_label)
+        button_layout.addWidget(tool_dropdown)
+        button_layout.addWidget(fill_tolerance_dropdown)
+        button_layout.addWidget(self.window_dropdown)
         button_layout.addWidget(clear_all_button)
 
+        # Frame controls of a 4D series, hidden for 3D volumes
+        self.frame_slider = QSlider(Qt.Horizontal)
+        self.frame_slider.setMinimum(0)
+        self.frame_slider.valueChanged.connect(self.canvas.frame_controller.go_to_frame)  # Decoded in the background
+        self.frame_label = QLabel()
+        self.play_button = QPushButton("Play")
+        self.play_button.setCheckable(True)
+        self.play_button.toggled.connect(self.play_cine)
+        self.fps_spin_box = QSpinBox()
+        self.fps_spin_box.setRange(1, 60)
+        self.fps_spin_box.setValue(DEFAULT_CINE_FPS)
+        self.fps_spin_box.setSuffix(" fps")
+        self.fps_spin_box.valueChanged.connect(self.change_cine_rate)
+        annotate_frame_button = QPushButton("Annotate This Frame")
+        annotate_frame_button.setToolTip("Labels belong to one frame; they are drawn and saved for it")
+        annotate_frame_button.clicked.connect(self.annotate_frame)
+        self.annotation_frame_label = QLabel()
+
+        frame_layout = QHBoxLayout()
+        frame_layout.addWidget(QLabel("Frame:"))
+        frame_layout.addWidget(self.frame_slider)
+        frame_layout.addWidget(self.frame_label)
+        frame_layout.addWidget(self.play_button)
+        frame_layout.addWidget(self.fps_spin_box)
+        frame_layout.addWidget(annotate_frame_button)
+        frame_layout.addWidget(self.annotation_frame_label)
+        self.frame_controls = QWidget()
+        self.frame_controls.setLayout(frame_layout)
+        self.frame_controls.hide()
+
         # Layout for Canvas and Scrollbar
         image_and_scroll_layout = QHBoxLayout()
         image_and_scroll_layout.addWidget(self.canvas)
         image_and_scroll_layout.addWidget(self.scroll_bar)
+        image_and_scroll_layout.addWidget(self.multi_planar_view)
+
+        # Table: Per-label statistics
+        self.statistics_table = QTableWidget(0, 4)
+        self.statistics_table.setHorizontalHeaderLabels(['Label', 'Voxels', 'Volume (mm³)', 'On Slice'])
+        self.statistics_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.statistics_table.verticalHeader().hide()
+        self.statistics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.statistics_table.setMaximumHeight(120)
+        self.statistics_timer = QTimer(self)
+        self.statistics_timer.setSingleShot(True)
+        self.statistics_timer.setInterval(STATISTICS_REFRESH_MS)
+        self.statistics_timer.timeout.connect(self.update_statistics_table)
 
         # Layout for buttons over the image and scroll layout
         layout = QVBoxLayout()
         layout.addLayout(button_layout)
+        layout.addWidget(self.frame_controls)
         layout.addLayout(image_and_scroll_layout)
+        layout.addWidget(self.statistics_table)
 
         # Set the central widget
         central_widget = QWidget()
         central_widget.setLayout(layout)
         self.setCentralWidget(central_widget)
 
+        # Status bar: background loading progress
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+
+        if nifti_file_path:
+            self.canvas.set_background_image_from_nifti(nifti_file_path)
+
     def create_menu(self):
         file_menu = self.menu_bar.addMenu('File')
 
@@ -96,10 +199,119 @@ class MainWindow(QMainWindow):
         save_nifti_action.triggered.connect(self.save_nifti_file)
         file_menu.addAction(save_nifti_action)
 
+        self.session_action = QAction('Session Mode (Autosave)', self, checkable=True)
+        self.session_action.setChecked(self.canvas.session_mode)
+        self.session_action.toggled.connect(self.canvas.set_session_mode)
+        file_menu.addAction(self.session_action)
+
+        # Compression level of saved segmentations
+        compression_menu = file_menu.addMenu('Compression Level')
+        compression_group = QActionGroup(self)
+        for name, level in [('Fastest', 1), ('Balanced', 6), ('Smallest', 9)]:
+            compression_action = QAction(name, self, checkable=True)
+            compression_action.setChecked(level == self.compresslevel)
+            compression_action.triggered.connect(lambda _, level=level: self.set_compresslevel(level))
+            compression_group.addAction(compression_action)
+            compression_menu.addAction(compression_action)
+
+        edit_menu = self.menu_bar.addMenu('Edit')
+
+        self.undo_action = QAction('Undo', self)
+        self.undo_action.setShortcut(QKeySequence.Undo)
+        self.undo_action.setEnabled(False)
+        self.undo_action.triggered.connect(self.canvas.undo)
+        edit_menu.addAction(self.undo_action)
+
+        self.redo_action = QAction('Redo', self)
+        self.redo_action.setShortcuts([QKeySequence.Redo, QKeySequence('Ctrl+Y')])
+        self.redo_action.setEnabled(False)
+        self.redo_action.triggered.connect(self.canvas.redo)
+        edit_menu.addAction(self.redo_action)
+
+        edit_menu.addSeparator()
+        interpolate_action = QAction('Interpolate Labels', self)
+        interpolate_action.triggered.connect(self.canvas.interpolate_labels)
+        edit_menu.addAction(interpolate_action)
+
+        view_menu = self.menu_bar.addMenu('View')
+
+        multi_planar_action = QAction('Coronal and Sagittal Views', self, checkable=True)
+        multi_planar_action.setToolTip("Middle-click a voxel to move every view to it")
+        multi_planar_action.toggled.connect(self.multi_planar_view.setVisible)
+        view_menu.addAction(multi_planar_action)
+
+        view_menu.addSeparator()
+        zoom_in_action = QAction('Zoom In', self)
+        zoom_in_action.setShortcut(QKeySequence.ZoomIn)
+        zoom_in_action.setToolTip("Ctrl+wheel zooms at the cursor, middle-drag pans")
+        zoom_in_action.triggered.connect(lambda: self.canvas.zoom_by(ZOOM_STEP))
+        view_menu.addAction(zoom_in_action)
+
+        zoom_out_action = QAction('Zoom Out', self)
+        zoom_out_action.setShortcut(QKeySequence.ZoomOut)
+        zoom_out_action.triggered.connect(lambda: self.canvas.zoom_by(1 / ZOOM_STEP))
+        view_menu.addAction(zoom_out_action)
+
+        reset_zoom_action = QAction('Reset Zoom', self)
+        reset_zoom_action.setShortcut(QKeySequence('Ctrl+0'))
+        reset_zoom_action.triggered.connect(self.reset_zoom)
+        view_menu.addAction(reset_zoom_action)
+
+        # Profiling, also enabled with --profile or the PASCAL_PROFILE environment variable
+        view_menu.addSeparator()
+        self.profile_action = QAction('Record Profile', self, checkable=True)
+        self.profile_action.setChecked(profiler.enabled)
+        self.profile_action.toggled.connect(self.set_profiling)
+        view_menu.addAction(self.profile_action)
+
+        profile_overlay_action = QAction('Profiling Overlay', self, checkable=True)
+        profile_overlay_action.setToolTip("Frame times and cache hit rates of each view")
+        profile_overlay_action.toggled.connect(self.set_profile_overlay)
+        view_menu.addAction(profile_overlay_action)
+
+        export_trace_action = QAction('Export Profiling Trace', self)
+        export_trace_action.triggered.connect(self.export_trace)
+        view_menu.addAction(export_trace_action)
+
+    def closeEvent(self, event):
+        self.canvas.close_session()  # Flush the working file, it is recovered on the next launch
+        super().closeEvent(event)
+
     def resizeEvent(self, event):
         self.scroll_bar.setFixedHeight(self.canvas.height())  # Set scrollbar height to canvas height
         super().resizeEvent(event)
 
+    def reset_zoom(self):
+        for canvas in self.multi_planar_view.canvases:
+            canvas.reset_view()
+
+    def set_profiling(self, enabled):
+        if enabled:
+            profiler.enable()
+        else:
+            profiler.disable()
+
+    def set_profile_overlay(self, enabled):
+        for canvas in self.multi_planar_view.canvases:
+            canvas.set_profile_overlay(enabled)
+
+    def export_trace(self):
+        """
+        Write the recorded profiling events as a Chrome trace (chrome://tracing or Perfetto).
+        """
+        if not profiler.events:
+            self.statusBar().showMessage("Nothing recorded, enable View > Record Profile first")
+            return
+        file_path = save_trace(self)
+        if not file_path:
+            return
+        try:
+            profiler.export_chrome_trace(file_path)
+        except OSError as error:
+            self.statusBar().showMessage(f"Could not export the trace: {error}")
+            return
+        self.statusBar().showMessage(f"Profiling trace exported to {file_path}")
+
     def change_brush_size(self, index):
         brush_sizes = [1, 2, 4, 8, 16, 32]
         brush_size = brush_sizes[index]
@@ -110,39 +322,196 @@ class MainWindow(QMainWindow):
         brush_color_value = brush_color_values[index]
         self.canvas.set_brush_color_value(brush_color_value)
 
+    def change_tool(self, index):
+        tools = ['brush', 'fill_2d', 'fill_3d']
+        self.canvas.set_tool(tools[index])
+
+    def change_fill_tolerance(self, index):
+        fill_tolerances = [0.05, 0.1, 0.2, 0.3]
+        self.canvas.set_fill_tolerance(fill_tolerances[index])
+
     def clear_all_segmentations(self):
         self.canvas.clear_all_segmentations()
 
+    def on_session_status(self, message):
+        self.session_action.blockSignals(True)  # Recovery switches session mode on by itself
+        self.session_action.setChecked(self.canvas.session is not None)
+        self.session_action.blockSignals(False)
+        self.statusBar().showMessage(message)
+
+    def schedule_statistics_update(self):
+        if not self.statistics_timer.isActive():
+            self.statistics_timer.start()
+
+    def update_statistics_table(self):
+        """
+        Show the voxel count and volume of every label, plus its count on the current slice.
+        """
+        rows = self.canvas.statistics.summary(self.canvas.current_slice_index)
+        self.statistics_table.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            label = row['label']
+            name = self.label_names[label] if label < len(self.label_names) else str(label)
+            values = [name, f"{row['voxels']:,}", f"{row['volume_mm3']:,.1f}", f"{row['slice_voxels']:,}"]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.statistics_table.setItem(row_index, column, item)
+
+    def on_history_changed(self, can_undo, can_redo):
+        self.undo_action.setEnabled(can_undo)
+        self.redo_action.setEnabled(can_redo)
+
     def scroll_to_slice(self, value):
         if self.canvas.nifti_data is not None:
             max_index = self.canvas.nifti_data.shape[2] - 1
-            new_index = max_index - value
-            self.canvas.current_slice_index = min(max(0, new_index), max_index)
-            self.canvas.update_slice()
+            self.canvas.go_to_slice(max_index - value)  # Dragging the bar renders at most one slice per frame
+            self.multi_planar_view.sync_crosshairs()
+            self.schedule_statistics_update()  # Per-slice counts follow the slice
 
     def update_scroll_bar(self, new_index):
         max_index = self.canvas.nifti_data.shape[2] - 1
+        self.scroll_bar.blockSignals(True)  # The canvas is already on this slice, do not send it back
         self.scroll_bar.setValue(max_index - new_index)
+        self.scroll_bar.blockSignals(False)
+        self.schedule_statistics_update()  # Per-slice counts follow the slice
+
+    def set_compresslevel(self, level):
+        self.compresslevel = level
 
     def save_nifti_file(self):
-        save_segmentation(self, self.canvas.segmentation_matrix, self.canvas.nifti_affine, self.canvas.nifti_header)
+        """
+        Save a snapshot of the segmentation in the background.
+        """
+        if self.canvas.segmentation_matrix is None:
+            return
+        if self.saver is not None:
+            self.statusBar().showMessage("A segmentation is still being saved")
+            return
+
+        file_path = save_segmentation(self)
+        if not file_path:
+            return
+
+        snapshot = self.canvas.segmentation_matrix.copy(order='K')  # Later strokes do not leak into the file
+        self.saver = SegmentationSaveWorker(
+            snapshot,
+            self.canvas.nifti_affine,
+            self.canvas.annotation_header(),  # Names the annotated frame of a 4D series
+            file_path,
+            self.compresslevel
+        )
+        self.saver.progress.connect(self.on_loading_progress)
+        self.saver.saved.connect(self.on_segmentation_saved)
+        self.saver.failed.connect(self.on_loading_failed)
+        self.saver.stopped.connect(self.on_saver_stopped)
+        start_worker(self.saver)
+        self.statusBar().showMessage(f"Saving {file_path}")
+
+    def on_segmentation_saved(self, file_path):
+        self.statusBar().showMessage(f"Saved {file_path}")
+
+    def on_saver_stopped(self):
+        self.progress_bar.hide()
+        self.saver = None
 
     def load_nifti_file(self):
         file_path = load_nifti(self)
         if file_path:
-            self.canvas.set_background_image_from_nifti(file_path)
-            self.scroll_bar.setMaximum(self.canvas.nifti_data.shape[2] - 1)
-            self.canvas.current_slice_index = min(self.canvas.current_slice_index, self.canvas.nifti_data.shape[2] - 1)
-            self.scroll_bar.setValue(self.canvas.current_slice_index)  # Sync scrollbar value
+            self.canvas.set_background_image_from_nifti(file_path)  # Scroll bar follows in on_volume_ready
+
+    def on_volume_ready(self):
+        """
+        The first slice of a new volume is shown, while the rest may still be loading.
+        """
+        self.scroll_bar.setMaximum(self.canvas.nifti_data.shape[2] - 1)
+        self.update_scroll_bar(self.canvas.current_slice_index)  # Sync scrollbar value
+
+        series = self.canvas.series()
+        self.play_button.blockSignals(True)  # set_volume has stopped the playback already
+        self.play_button.setChecked(False)
+        self.play_button.setText("Play")
+        self.play_button.blockSignals(False)
+        self.frame_controls.setVisible(series is not None)
+        self.frame_controls.setEnabled(False)  # Until the first frame has loaded
+        if series is not None:
+            self.frame_slider.blockSignals(True)
+            self.frame_slider.setMaximum(series.num_frames - 1)
+            self.frame_slider.blockSignals(False)
+            self.update_frame_controls(self.canvas.nifti_data.frame_index)
+
+    def update_frame_controls(self, frame_index):
+        """
+        Follow the frame shown by the canvas, e.g. during cine playback.
+        """
+        series = self.canvas.series()
+        self.frame_slider.blockSignals(True)  # The canvas is already on this frame
+        self.frame_slider.setValue(frame_index)
+        self.frame_slider.blockSignals(False)
+        self.frame_label.setText(f"{frame_index + 1} / {series.num_frames}")
+        self.annotation_frame_label.setText(f"Labels: frame {self.canvas.labels_frame() + 1}")
+
+    def play_cine(self, playing):
+        if playing:
+            self.canvas.frame_controller.play_cine(self.fps_spin_box.value())
+        else:
+            self.canvas.frame_controller.stop_cine()
+        self.play_button.setText("Pause" if playing else "Play")
+
+    def change_cine_rate(self, fps):
+        if self.canvas.frame_controller.is_playing():
+            self.canvas.frame_controller.play_cine(fps)
+
+    def annotate_frame(self):
+        """
+        Draw the labels on the shown frame instead, after confirming that the labels
+        of the previous frame are discarded.
+        """
+        if self.canvas.series() is None:
+            return
+        frame_index = self.canvas.nifti_data.frame_index
+        labels_frame = self.canvas.labels_frame()
+        if frame_index == labels_frame:
+            return
+        if self.canvas.statistics.labels():
+            answer = QMessageBox.question(
+                self, "Annotate This Frame",
+                f"The labels were drawn on frame {labels_frame + 1}. "
+                f"Discard them and annotate frame {frame_index + 1} instead?",
+                QMessageBox.Discard | QMessageBox.Cancel, QMessageBox.Cancel
+            )
+            if answer != QMessageBox.Discard:
+                return
+        self.canvas.annotate_shown_frame()
+        self.update_frame_controls(frame_index)
+
+    def on_loading_progress(self, percent):
+        self.progress_bar.setValue(percent)
+        self.progress_bar.show()
+
+    def on_volume_loaded(self):
+        self.progress_bar.hide()
+        self.frame_controls.setEnabled(True)
+
+    def on_window_changed(self, low, high):
+        width, level = window_to_width_level(low, high)
+        self.statusBar().showMessage(f"Window W {width:.0f} L {level:.0f}")
+
+    def on_interpolation_finished(self):
+        self.progress_bar.hide()
+
+    def on_loading_failed(self, message):
+        self.progress_bar.hide()
+        self.statusBar().showMessage(message)
 
     def load_segmentation(self):
         """
         Load a segmentation NIfTI file.
         """
-        segmentation_data = load_segmentation(self)
-        if segmentation_data is not None:
-            if segmentation_data.shape == self.canvas.segmentation_matrix.shape:  # Check dimensions.
-                self.canvas.segmentation_matrix = segmentation_data.astype(np.int32)
-                self.canvas.update_slice()
-            else:
-                print("Error: The dimensions of the segmentation file do not match the current NIfTI Image.")
+        if self.canvas.segmentation_matrix is None:
+            return
+
+        file_path = load_segmentation(self)
+        if file_path:
+            self.canvas.load_segmentation_from_nifti(file_path)  # Reoriented like the image, in a worker
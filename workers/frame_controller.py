@@ -0,0 +1,97 @@
+# workers/frame_controller.py
+from workers.frame_prefetcher import FramePrefetcher
+from PyQt5.QtCore import QObject, QTimer
+
+FRAME_PREFETCH_DEPTH = 2  # Frames of a 4D series decoded ahead of the shown one
+DEFAULT_CINE_FPS = 10
+
+class FrameController(QObject):
+    """
+    Frame navigation, cine playback and the annotated frame of a 4D series.
+
+    Frames are asked for by index; cached ones are handed to the canvas' show_frame
+    at once, others once the FramePrefetcher has decoded them. Only the latest frame
+    asked for is ever shown, so a fast slider drag skips the frames passed over.
+    """
+
+    def __init__(self, canvas, prefetch_depth=FRAME_PREFETCH_DEPTH):
+        """
+        :param canvas: Canvas providing series(), show_frame and the shown volume
+        :param prefetch_depth: Number of frames to decode ahead
+        """
+        super().__init__(canvas)
+        self.canvas = canvas
+        self.prefetcher = FramePrefetcher(prefetch_depth, parent=self)
+        self.prefetcher.frame_decoded.connect(self.on_frame_decoded)
+        self.wanted_frame = None  # Frame asked for, shown once decoded
+        self.annotation_frame = None  # Frame the labels are drawn on
+        self.cine_timer = QTimer(self)
+        self.cine_timer.timeout.connect(self.advance_cine)
+
+    def reset(self, volume):
+        """
+        Start over for a newly shown volume, closing the previous series' file.
+        """
+        self.stop_cine()
+        self.prefetcher.cancel_all()
+        series = self.canvas.series()
+        if series is not None and series is not volume.series:
+            series.close()
+        self.wanted_frame = self.annotation_frame = volume.frame_index
+
+    def go_to_frame(self, frame_index):
+        """
+        Show another frame of the series. A frame in the frame cache is shown at the
+        next slice update; others are decoded in the background first. The frames
+        after it are decoded ahead either way.
+        :return: True if the frame was shown or is on its way
+        """
+        series = self.canvas.series()
+        if series is None or self.canvas.loader is not None:
+            return False  # Frames share the first frame's window, known once it has loaded
+        frame_index = frame_index % series.num_frames
+        self.wanted_frame = frame_index
+        self.prefetcher.schedule(series, frame_index)
+        volume = series.cached_frame(frame_index)
+        if volume is not None:
+            self.canvas.show_frame(volume)
+        return True
+
+    def on_frame_decoded(self, series, frame_index):
+        if series is not self.canvas.series() or frame_index != self.wanted_frame \
+                or frame_index == self.canvas.nifti_data.frame_index:
+            return
+        volume = series.cached_frame(frame_index)
+        if volume is None:
+            volume = series.frame(frame_index)  # Evicted meanwhile by a small frame budget
+        self.canvas.show_frame(volume)
+
+    def play_cine(self, fps=DEFAULT_CINE_FPS):
+        """
+        Loop through the frames at up to fps frames per second. A frame that is not
+        decoded in time holds the playback instead of being skipped.
+        """
+        if self.canvas.series() is None:
+            return
+        self.cine_timer.start(max(1, round(1000 / fps)))
+
+    def stop_cine(self):
+        self.cine_timer.stop()
+
+    def is_playing(self):
+        return self.cine_timer.isActive()
+
+    def advance_cine(self):
+        if self.canvas.series() is None:
+            self.stop_cine()
+            return
+        shown_frame = self.canvas.nifti_data.frame_index
+        if self.wanted_frame != shown_frame:
+            return  # Still decoding the previous step
+        self.go_to_frame(shown_frame + 1)
+
+    def set_annotation_frame(self, frame_index):
+        """
+        :param frame_index: Frame the labels belong to from now on, see Canvas.annotate_shown_frame
+        """
+        self.annotation_frame = frame_index
@@ -0,0 +1,95 @@
+# workers/frame_prefetcher.py
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+import threading
+
+class FrameDecodeTask(QRunnable):
+    """
+    Decode one frame of a FrameSeries into its frame cache.
+    """
+
+    def __init__(self, prefetcher, series, frame_index):
+        super().__init__()
+        self.prefetcher = prefetcher
+        self.series = series
+        self.frame_index = frame_index
+        self.cancelled = False
+
+    def run(self):
+        self.prefetcher.run_task(self)
+
+class FramePrefetcher(QObject):
+    """
+    Decode frames of a 4D series in a background thread.
+
+    The frame asked for is decoded first, then the `depth` frames after it in the
+    playback direction (wrapping around, as cine playback does). Pending frames that
+    fall out of that window are cancelled. Every decoded frame is announced through
+    frame_decoded, delivered in the GUI thread.
+    """
+    frame_decoded = pyqtSignal(object, int)  # FrameSeries, frame index
+
+    def __init__(self, depth=2, parent=None):
+        """
+        :param depth: Number of frames to decode ahead of the wanted one
+        """
+        super().__init__(parent)
+        self.depth = depth
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)  # Compressed frames are decoded from one stream
+        self.lock = threading.Lock()
+        self.pending = {}  # frame_index -> FrameDecodeTask
+        self.last_index = None
+        self.direction = 1
+
+    def set_depth(self, depth):
+        self.depth = max(0, int(depth))
+
+    def schedule(self, series, frame_index):
+        """
+        Decode a frame and the ones after it, cancelling everything else.
+        :param series: FrameSeries to decode from
+        :param frame_index: Frame that is wanted now
+        """
+        if self.last_index is not None and frame_index != self.last_index:
+            self.direction = 1 if (frame_index - self.last_index) % series.num_frames <= series.num_frames // 2 else -1
+        self.last_index = frame_index
+
+        wanted = []
+        for step in range(self.depth + 1):
+            index = (frame_index + self.direction * step) % series.num_frames
+            if index not in wanted:
+                wanted.append(index)
+
+        with self.lock:
+            for index in list(self.pending):
+                if index not in wanted or self.pending[index].series is not series:
+                    self.pending.pop(index).cancelled = True  # Becomes a no-op when its turn comes
+
+            for priority, index in enumerate(wanted):
+                if index in self.pending or series.cached_frame(index) is not None:
+                    continue
+                task = FrameDecodeTask(self, series, index)
+                self.pending[index] = task
+                self.pool.start(task, -priority)  # The wanted frame first
+
+    def run_task(self, task):
+        if not task.cancelled:
+            task.series.frame(task.frame_index)
+
+        with self.lock:
+            if self.pending.get(task.frame_index) is task:
+                del self.pending[task.frame_index]
+        if not task.cancelled:
+            self.frame_decoded.emit(task.series, task.frame_index)
+
+    def cancel_all(self):
+        """
+        Cancel pending work and wait for the running task.
+        """
+        with self.lock:
+            for task in self.pending.values():
+                task.cancelled = True
+            self.pending.clear()
+        self.pool.clear()  # Drop tasks that have not started
+        self.pool.waitForDone()
+        self.last_index = None
@@ -0,0 +1,60 @@
+# workers/label_interpolator.py
+from utils.segmentation_utils.interpolation import interpolate_gap_task
+from PyQt5.QtCore import QObject, pyqtSignal
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+import os
+
+class LabelInterpolateWorker(QObject):
+    """
+    Interpolate the labels of every gap between key slices in a process pool.
+    The key slices are copies taken when the worker is created, so the canvas stays
+    free to draw; the results are written by the canvas.
+    """
+    progress = pyqtSignal(int)  # Percentage of gaps done
+    interpolated = pyqtSignal(object)  # List of (start_index, end_index, (bounds, labels))
+    failed = pyqtSignal(str)
+    stopped = pyqtSignal()  # Always emitted last, also after cancel or failure
+
+    def __init__(self, key_slices, gaps, max_workers=None):
+        """
+        :param key_slices: Dict slice_index -> 2D label array copy
+        :param gaps: (start, end) pairs of key slices to interpolate between
+        :param max_workers: Pool size, defaults to the CPU count
+        """
+        super().__init__()
+        self.key_slices = key_slices
+        self.gaps = gaps
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            results = []
+            context = multiprocessing.get_context('spawn')  # Never fork a process running Qt threads
+            with ProcessPoolExecutor(min(self.max_workers, len(self.gaps)), mp_context=context) as pool:
+                pending = {
+                    pool.submit(interpolate_gap_task, start, end, self.key_slices[start], self.key_slices[end])
+                    for start, end in self.gaps
+                }
+                while pending:
+                    done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                    if self.cancelled:
+                        for future in pending:
+                            future.cancel()
+                        return
+                    for future in done:
+                        start, end, result = future.result()
+                        if result is not None:
+                            results.append((start, end, result))
+                    self.progress.emit(int(100 * (len(self.gaps) - len(pending)) / len(self.gaps)))
+
+            self.interpolated.emit(results)
+        except Exception as error:
+            self.failed.emit(f"Interpolation failed: {error}")
+        finally:
+            self.key_slices = None
+            self.stopped.emit()
@@ -0,0 +1,55 @@
+# workers/nifti_loader.py
+from utils.image_utils.frame_series import FrameSeries, is_series
+from utils.image_utils.lazy_volume import LazyVolume
+from PyQt5.QtCore import QObject, pyqtSignal
+import nibabel as nib
+
+class NiftiLoadWorker(QObject):
+    """
+    Open and stream a NIfTI off the GUI thread.
+    The middle slice is announced as soon as its voxels are decoded, while the rest
+    of the volume keeps streaming in. A 4D file is opened as a FrameSeries and its
+    first frame is loaded; the window of that frame is used for every frame.
+    """
+    first_slice_ready = pyqtSignal(object)  # LazyVolume whose middle slice can be shown
+    progress = pyqtSignal(int)  # Loaded percentage
+    loaded = pyqtSignal(object)  # Fully decoded LazyVolume
+    failed = pyqtSignal(str)
+    stopped = pyqtSignal()  # Always emitted last, also after cancel or failure
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Ask the worker to stop after the current slab. Safe to call from the GUI thread.
+        """
+        self.cancelled = True
+
+    def run(self):
+        try:
+            nifti_img = nib.load(self.file_path)  # Header only
+            series = FrameSeries(nifti_img) if is_series(nifti_img) else None
+            volume = series.frame(0) if series is not None else LazyVolume(nifti_img)
+            first_slice_index = volume.shape[2] // 2
+            first_slice_sent = False
+
+            for fraction in volume.iter_load():
+                if self.cancelled:
+                    return
+                if not first_slice_sent and volume.is_slice_loaded(first_slice_index):
+                    self.first_slice_ready.emit(volume)
+                    first_slice_sent = True
+                self.progress.emit(int(fraction * 100))
+
+            if series is not None:
+                series.set_reference(volume)
+            if not first_slice_sent:
+                self.first_slice_ready.emit(volume)
+            self.loaded.emit(volume)
+        except Exception as error:
+            self.failed.emit(f"Could not load {self.file_path}: {error}")
+        finally:
+            self.stopped.emit()
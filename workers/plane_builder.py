@@ -0,0 +1,14 @@
+# workers/plane_builder.py
+from PyQt5.QtCore import QRunnable
+
+class PlaneCopyTask(QRunnable):
+    """
+    Build the contiguous slice copy of a PlaneVolume off the GUI thread.
+    """
+
+    def __init__(self, plane_volume):
+        super().__init__()
+        self.plane_volume = plane_volume
+
+    def run(self):
+        self.plane_volume.build_slices()
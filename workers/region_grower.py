@@ -0,0 +1,42 @@
+# workers/region_grower.py
+from utils.segmentation_utils.region_growing import grow_region, intensity_limits
+from PyQt5.QtCore import QObject, pyqtSignal
+
+class RegionGrowWorker(QObject):
+    """
+    Search the region of a fill off the GUI thread.
+    Only intensities are read here; the labels are written by the canvas when the
+    region arrives, so a fill never races with strokes.
+    """
+    grown = pyqtSignal(object)  # (bounds, mask), or None if nothing matched
+    failed = pyqtSignal(str)
+    stopped = pyqtSignal()  # Always emitted last, also after cancel or failure
+
+    def __init__(self, volume, seed, tolerance, three_d):
+        super().__init__()
+        self.volume = volume
+        self.seed = seed
+        self.tolerance = tolerance
+        self.three_d = three_d
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            lower, upper = intensity_limits(self.volume, self.seed, self.tolerance)
+            region = grow_region(
+                self.volume,
+                self.seed,
+                lower,
+                upper,
+                three_d=self.three_d,
+                is_cancelled=lambda: self.cancelled
+            )
+            if not self.cancelled:
+                self.grown.emit(region)
+        except Exception as error:
+            self.failed.emit(f"Fill failed: {error}")
+        finally:
+            self.stopped.emit()
@@ -0,0 +1,39 @@
+# workers/segmentation_loader.py
+from utils.segmentation_utils.label_volume import read_label_volume
+from PyQt5.QtCore import QObject, pyqtSignal
+import nibabel as nib
+
+class SegmentationLoadWorker(QObject):
+    """
+    Read and reorient a segmentation NIfTI off the GUI thread, see read_label_volume.
+    """
+    loaded = pyqtSignal(object)  # Label volume in display orientation
+    failed = pyqtSignal(str)
+    stopped = pyqtSignal()  # Always emitted last, also after cancel or failure
+
+    def __init__(self, file_path, image_affine, image_shape):
+        """
+        :param image_affine: Affine matrix of the image shown
+        :param image_shape: Stored shape of the image shown
+        """
+        super().__init__()
+        self.file_path = file_path
+        self.image_affine = image_affine
+        self.image_shape = image_shape
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Drop the result; the read itself is not interrupted.
+        """
+        self.cancelled = True
+
+    def run(self):
+        try:
+            labels = read_label_volume(nib.load(self.file_path), self.image_affine, self.image_shape)
+            if not self.cancelled:
+                self.loaded.emit(labels)
+        except Exception as error:
+            self.failed.emit(f"Could not load {self.file_path}: {error}")
+        finally:
+            self.stopped.emit()
@@ -0,0 +1,47 @@
+# workers/segmentation_saver.py
+from utils.segmentation_utils.convert_matrix_for_save import DEFAULT_COMPRESSLEVEL, write_segmentation_nifti
+from PyQt5.QtCore import QObject, pyqtSignal
+
+class SegmentationSaveWorker(QObject):
+    """
+    Compress and write a segmentation off the GUI thread.
+    The worker owns a snapshot of the labels, so painting can go on while it saves.
+    """
+    progress = pyqtSignal(int)  # Written percentage
+    saved = pyqtSignal(str)  # Final file path
+    failed = pyqtSignal(str)
+    stopped = pyqtSignal()  # Always emitted last, also after cancel or failure
+
+    def __init__(self, segmentation_snapshot, affine, header, file_path, compresslevel=DEFAULT_COMPRESSLEVEL):
+        super().__init__()
+        self.segmentation_snapshot = segmentation_snapshot
+        self.affine = affine
+        self.header = header
+        self.file_path = file_path
+        self.compresslevel = compresslevel
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Ask the worker to stop after the current block. The target file is left untouched.
+        """
+        self.cancelled = True
+
+    def run(self):
+        try:
+            file_path = write_segmentation_nifti(
+                self.segmentation_snapshot,
+                self.affine,
+                self.header,
+                self.file_path,
+                compresslevel=self.compresslevel,
+                progress_callback=lambda fraction: self.progress.emit(int(fraction * 100)),
+                is_cancelled=lambda: self.cancelled
+            )
+            if file_path is not None:
+                self.saved.emit(file_path)
+        except Exception as error:
+            self.failed.emit(f"Could not save {self.file_path}: {error}")
+        finally:
+            self.segmentation_snapshot = None  # Release the copy before the thread is reaped
+            self.stopped.emit()
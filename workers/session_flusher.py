@@ -0,0 +1,14 @@
+# workers/session_flusher.py
+from PyQt5.QtCore import QRunnable
+
+class SessionFlushTask(QRunnable):
+    """
+    Sync the dirty slices of a SessionVolume to disk off the GUI thread.
+    """
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def run(self):
+        self.session.flush_dirty()
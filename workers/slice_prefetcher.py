@@ -0,0 +1,137 @@
+# workers/slice_prefetcher.py
+from PyQt5.QtCore import QRunnable, QThreadPool
+import threading
+
+class PrefetchTask(QRunnable):
+    """
+    Render one slice (background and segmentation) into the canvas caches.
+    """
+
+    def __init__(self, prefetcher, slice_index):
+        super().__init__()
+        self.prefetcher = prefetcher
+        self.slice_index = slice_index
+        self.cancelled = False
+
+    def run(self):
+        self.prefetcher.run_task(self)
+
+class SlicePrefetcher:
+    """
+    Predict the scroll direction and render the next slices in a thread pool.
+
+    After every displayed slice the `depth` slices ahead in the last scroll direction
+    (plus the one behind) are rendered through the canvas' prefetch_slice. Pending work that falls outside that window is cancelled.
+    """
+
+    def __init__(self, canvas, depth=4, max_threads=2):
+        """
+        :param canvas: Canvas providing prefetch_slice
+        :param depth: Number of slices to render ahead, 0 disables prefetching
+        :param max_threads: Size of the worker pool
+        """
+        self.canvas = canvas
+        self.depth = depth
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        self.lock = threading.Lock()
+        self.pending = {}  # slice_index -> PrefetchTask
+        self.completed = set()  # slice indices rendered by a task
+        self.last_index = None
+        self.direction = 1
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+
+    def set_depth(self, depth):
+        self.depth = max(0, int(depth))
+
+    def record_request(self, slice_index):
+        """
+        Count whether a displayed slice had been prefetched in time.
+        """
+        with self.lock:
+            if slice_index in self.completed:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def schedule(self, slice_index, num_slices):
+        """
+        Queue the slices around the displayed one and cancel everything else.
+        :param slice_index: Slice that is displayed now
+        :param num_slices: Number of slices in the volume
+        """
+        if self.last_index is not None and slice_index != self.last_index:
+            self.direction = 1 if slice_index > self.last_index else -1
+        self.last_index = slice_index
+
+        wanted = [slice_index + self.direction * step for step in range(1, self.depth + 1)]
+        if self.depth:
+            wanted.append(slice_index - self.direction)
+        wanted = [index for index in wanted if 0 <= index < num_slices]
+
+        with self.lock:
+            for index in list(self.pending):
+                if index not in wanted:
+                    self.pending.pop(index).cancelled = True  # Becomes a no-op when its turn comes
+            self.completed &= set(wanted) | {slice_index}  # Older entries may be evicted by now
+
+            for index in wanted:
+                if index in self.pending or index in self.completed:
+                    continue
+                task = PrefetchTask(self, index)
+                self.pending[index] = task
+                self.pool.start(task)
+
+    def run_task(self, task):
+        if not task.cancelled:
+            self.canvas.prefetch_slice(task.slice_index, lambda: task.cancelled)
+
+        with self.lock:
+            if self.pending.get(task.slice_index) is task:
+                del self.pending[task.slice_index]
+            if task.cancelled:
+                self.cancelled += 1
+            else:
+                self.completed.add(task.slice_index)
+
+    def forget(self, slice_index=None):
+        """
+        Mark slices as no longer prefetched, e.g. after their cache entries were dropped.
+        :param slice_index: Slice to forget, or None for all of them
+        """
+        with self.lock:
+            if slice_index is None:
+                self.completed.clear()
+            else:
+                self.completed.discard(slice_index)
+
+    def cancel_all(self):
+        """
+        Cancel pending work and wait for running tasks, so no stale entry lands in a cache
+        after it has been cleared.
+        """
+        with self.lock:
+            for task in self.pending.values():
+                task.cancelled = True
+            self.pending.clear()
+        self.pool.clear()  # Drop tasks that have not started
+        self.pool.waitForDone()
+        self.forget()
+        self.last_index = None
+
+    def stats(self):
+        """
+        :return: Dict with hit, miss and cancel counters plus the current queue state
+        """
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'depth': self.depth,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'cancelled': self.cancelled,
+                'pending': len(self.pending),
+            }
@@ -0,0 +1,29 @@
+# workers/worker_thread.py
+from PyQt5.QtCore import QThread
+
+_running_workers = {}  # QThread -> worker, keeps both alive until the thread finishes
+
+def start_worker(worker):
+    """
+    Run worker.run() in a new QThread that is released when the worker stops.
+    :param worker: QObject with a run() slot, a stopped signal and a cancel() method
+    :return: The started QThread
+    """
+    thread = QThread()
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    worker.stopped.connect(thread.quit)
+    thread.finished.connect(lambda: _running_workers.pop(thread, None))
+    _running_workers[thread] = worker
+    thread.start()
+    return thread
+
+def shutdown_workers():
+    """
+    Cancel every running worker and wait for its thread. Call before the application quits.
+    """
+    for thread, worker in list(_running_workers.items()):
+        worker.cancel()
+        thread.quit()
+        thread.wait()
+    _running_workers.clear()